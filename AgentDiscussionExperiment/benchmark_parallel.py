@@ -0,0 +1,66 @@
+"""
+Compares the wall clock time of the user story workflow with a mocked model that answers after a fixed delay:
+- coordinate: the team leader decides on every delegation and writes the final answer, members run one at a time
+  (what the coordinate-mode Team does)
+- sequential: the same steps one at a time, without the leader's turns
+- parallel: parallel_team.run_steps, the UI and Python developers run at the same time
+
+python benchmark_parallel.py --latency 1.0 --leader-latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from parallel_team import check_order, run_sequentially, run_step, run_steps, story_steps
+
+
+class MockAgent:
+    """Stands in for an agno Agent: arun answers after `latency` seconds, like a model call."""
+
+    def __init__(self, name: str, latency: float):
+        self.name = name
+        self.latency = latency
+        self.calls = 0
+
+    async def arun(self, message: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(content=f"{self.name} answer to a {len(message)} character task")
+
+
+async def coordinate(steps: list, story: str, leader: MockAgent) -> dict:
+    """The coordinate-mode Team: a leader turn before every member, one member at a time, and a final leader turn."""
+    outputs = {}
+    for step in check_order(steps):
+        await leader.arun(story)
+        outputs[step.name] = await run_step(step, story, {name: outputs[name] for name in step.depends_on})
+    await leader.arun(story)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel member execution with a mocked model")
+    parser.add_argument('--latency', type=float, default=1.0, help="Seconds per member answer")
+    parser.add_argument('--leader-latency', type=float, default=0.5, help="Seconds per team leader turn")
+    args = parser.parse_args()
+
+    agents = [MockAgent(name, args.latency) for name in ("Project Manager", "UI Developer", "Python Developer", "Technical Lead")]
+    steps = story_steps(*agents)
+    story = "Title: Unification of embeddings into a single table"
+
+    modes = {
+        "coordinate": lambda: coordinate(steps, story, MockAgent("Team Leader", args.leader_latency)),
+        "sequential": lambda: run_sequentially(steps, story),
+        "parallel": lambda: run_steps(steps, story),
+    }
+    print(f"{'mode':>12} {'seconds':>8}")
+    for mode, run in modes.items():
+        start = time.perf_counter()
+        asyncio.run(run())
+        print(f"{mode:>12} {time.perf_counter() - start:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
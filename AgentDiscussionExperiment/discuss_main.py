@@ -1,43 +1,52 @@
 # Idea is to create two agents that will discuss on a topic and debate / reach to a conclusion with each other.
 
 
+import asyncio
+import sys
+from pathlib import Path
+
 from agno.agent import Agent
 from agno.models.google import Gemini
 from agno.team.team import Team
 from dotenv import load_dotenv
 
+from parallel_team import print_result, run_steps, story_steps
+# model_cache.py is shared by the experiments, it lives in the repository root.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from model_cache import cached
+
 gemini_model = "gemini-2.0-flash"
 load_dotenv()
 
 ui_developer_agent = Agent(
     name = "UI Developer Agent",
     role="You act like Angular UI Developer.. You can help with writing technical description of how you can complete a UI Tasks, estimate the story point and time required to complete the task.",
-    model=Gemini(id=gemini_model)
+    model=cached(Gemini(id=gemini_model))
 )
 
 python_developer_agent = Agent(
     name= "Python Developer Agent",
     role="You act like Senior Python Developer. You can help with writing technical description of how you can complete a Python Tasks, estimate the story point and time required to complete the task.",
-    model=Gemini(id=gemini_model)
+    model=cached(Gemini(id=gemini_model))
 )
 
 technical_lead_agent = Agent(
     name= "Technical Lead Agent",
     role="You act like Technical Lead. You can help with dividing a user story in tasks. Based on the estimation of the tasks, you can also help with estimating the story point and time required to complete the user story.",
-    model=Gemini(id=gemini_model)
+    model=cached(Gemini(id=gemini_model))
 )
 
 project_manager_agent = Agent(
     name= "Project Manager Agent",
     role="You act like Project Manager. You have to define tasks for Angular Developer and Python Developer .You can help with writing description and acceptance criteria for a user story.",
-    model=Gemini(id=gemini_model)
+    model=cached(Gemini(id=gemini_model))
 )
 
 
 multi_skills_team = Team(
     name="Multi Skills Team",
     mode="coordinate",
-    model=Gemini(id="gemini-2.0-flash"),
+    model=cached(Gemini(id="gemini-2.0-flash")),
     members=[ui_developer_agent, python_developer_agent, technical_lead_agent, project_manager_agent],
     markdown=True,
     description="You are a task router that directs certain tasks to the appropriate agent.",
@@ -63,7 +72,7 @@ multi_skills_team = Team(
 )
 
 
-multi_skills_team.print_response("""
+USER_STORY = """
 Complete the task for following user story:
 
 Title: Unification of embeddings into a single table
@@ -87,4 +96,12 @@ Description about the user story:
     The disadvantage of the current approach, is that we tied a metadata value (which by definition can be dynamically defined by users) to be matched to a specific table of embeddings (Like Table Name / Column Name). These fields should not be hardcoded to match an embedding, a domain might not even require embeddings.
     The advantage of the new approach, will let us to create new embeddings for future implementations, that might require different structures than just Table, Column or whatever. 
     In the current world, we are having a problem now, that we need to rename the column name, and by doing that, we will introduce a problem in the current code, so either the embedding works with property names (causing it to potentially be inaccurate) or 
-""")
\ No newline at end of file
+"""
+
+# python discuss_main.py --parallel: the developers estimate at the same time, see parallel_team.
+if "--parallel" in sys.argv:
+    asyncio.run(run_steps(
+        story_steps(project_manager_agent, ui_developer_agent, python_developer_agent, technical_lead_agent),
+        USER_STORY, on_result=print_result))
+else:
+    multi_skills_team.print_response(USER_STORY)
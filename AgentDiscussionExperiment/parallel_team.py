@@ -0,0 +1,117 @@
+"""
+Dependency aware execution of member tasks, as an alternative to a coordinate-mode Team that calls its members one
+after the other. Every step names the steps it needs: steps without pending dependencies run concurrently, a step
+starts as soon as the outputs it needs are ready, and every output is reported as soon as it is done.
+"""
+
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class Step:
+    """One member task. prompt is formatted with the story and the outputs of the steps in depends_on, by name."""
+
+    def __init__(self, name: str, agent, prompt: str, depends_on: tuple = ()):
+        self.name = name
+        self.agent = agent
+        self.prompt = prompt
+        self.depends_on = tuple(depends_on)
+
+
+def check_order(steps: list) -> list:
+    """Returns the steps in an order where every step comes after its dependencies. Raises ValueError on cycles."""
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        missing = [name for name in step.depends_on if name not in by_name]
+        if missing:
+            raise ValueError(f"Step {step.name} depends on unknown steps: {', '.join(missing)}")
+    ordered, done, visiting = [], set(), set()
+
+    def visit(step):
+        if step.name in done:
+            return
+        if step.name in visiting:
+            raise ValueError(f"Steps depend on each other in a cycle through {step.name}")
+        visiting.add(step.name)
+        for name in step.depends_on:
+            visit(by_name[name])
+        visiting.discard(step.name)
+        done.add(step.name)
+        ordered.append(step)
+
+    for step in steps:
+        visit(step)
+    return ordered
+
+
+async def run_step(step: Step, story: str, inputs: dict) -> str:
+    """Runs one step with the outputs of its dependencies, by name. Returns the member's answer."""
+    response = await step.agent.arun(step.prompt.format(story=story, **inputs))
+    return response.content
+
+
+async def run_steps(steps: list, story: str, on_result: Optional[Callable[[str, str, float], None]] = None) -> dict:
+    """
+    Runs the steps concurrently as far as their dependencies allow.
+    :param on_result: Called with (step name, output, seconds since start) as soon as each step is done.
+    :return: The output of every step, by name.
+    """
+    start = time.perf_counter()
+    tasks = {}
+
+    async def run(step: Step) -> str:
+        inputs = {name: await tasks[name] for name in step.depends_on}
+        output = await run_step(step, story, inputs)
+        if on_result:
+            on_result(step.name, output, time.perf_counter() - start)
+        return output
+
+    # All tasks exist before any of them runs, so a step can wait for any other one.
+    for step in check_order(steps):
+        tasks[step.name] = asyncio.create_task(run(step))
+    outputs = await asyncio.gather(*tasks.values())
+    return dict(zip(tasks, outputs))
+
+
+async def run_sequentially(steps: list, story: str, on_result: Optional[Callable[[str, str, float], None]] = None) -> dict:
+    """Same as run_steps, one step at a time, to compare with."""
+    start = time.perf_counter()
+    outputs = {}
+    for step in check_order(steps):
+        outputs[step.name] = await run_step(step, story, {name: outputs[name] for name in step.depends_on})
+        if on_result:
+            on_result(step.name, outputs[step.name], time.perf_counter() - start)
+    return outputs
+
+
+def story_steps(project_manager, ui_developer, python_developer, technical_lead) -> list:
+    """
+    The user story workflow of discuss_main: the Project Manager writes the description, acceptance criteria and
+    tasks, the UI and Python developers describe and estimate their tasks at the same time, and the Technical Lead
+    rolls their estimates up into the story estimate.
+    """
+    return [
+        Step("Project Manager", project_manager,
+             "Write a proper description and acceptance criteria for the following user story, and divide it into "
+             "tasks for the Angular Developer and for the Python Developer.\n\n{story}"),
+        Step("UI Developer", ui_developer,
+             "For each Angular task of this user story, provide a technical description of how you would complete "
+             "it and estimate its story points and time.\n\nUser story:\n{story}\n\nProject Manager's breakdown:\n"
+             "{Project Manager}",
+             depends_on=("Project Manager",)),
+        Step("Python Developer", python_developer,
+             "For each Python task of this user story, provide a technical description of how you would complete "
+             "it and estimate its story points and time.\n\nUser story:\n{story}\n\nProject Manager's breakdown:\n"
+             "{Project Manager}",
+             depends_on=("Project Manager",)),
+        Step("Technical Lead", technical_lead,
+             "Review the task estimates below and estimate the story points and time required for the whole user "
+             "story.\n\nUser story:\n{story}\n\nProject Manager's breakdown:\n{Project Manager}\n\n"
+             "UI Developer's estimates:\n{UI Developer}\n\nPython Developer's estimates:\n{Python Developer}",
+             depends_on=("Project Manager", "UI Developer", "Python Developer")),
+    ]
+
+
+def print_result(name: str, output: str, elapsed: float):
+    print(f"\n===== {name} (done after {elapsed:.1f}s) =====\n{output}\n")
@@ -1,10 +1,17 @@
 
+import sys
+from pathlib import Path
+
 from agno.agent import Agent
 from agno.models.google import Gemini
 from agno.team import Team
 from dotenv import load_dotenv
 from fontTools.ttLib.tables.ttProgram import instructions
 
+# model_cache.py is shared by the experiments, it lives in the repository root.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from model_cache import cached
+
 gemini_model = "gemini-2.0-flash"
 load_dotenv()
 
@@ -14,12 +21,12 @@ from agno.team.team import Team
 english_agent = Agent(
     name="English Agent",
     role="You only answer in English",
-    model=Gemini(id=gemini_model),
+    model=cached(Gemini(id=gemini_model)),
 )
 hindi_agent = Agent(
     name="Hindi Agent",
     role="You only answer in Hindi",
-    model=Gemini(id=gemini_model),
+    model=cached(Gemini(id=gemini_model)),
 
 )
 
@@ -27,7 +34,7 @@ hindi_agent = Agent(
 multi_language_team = Team(
     name="Multi Language Team",
     mode="route",
-    model=Gemini(id=gemini_model),
+    model=cached(Gemini(id=gemini_model)),
     members=[english_agent, hindi_agent],
     show_tool_calls=True,
     markdown=True,
@@ -0,0 +1,289 @@
+import os
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+import pyperclip
+
+# Larger clipboard contents are not read (the X11 selection is transferred in chunks up to this size).
+MAX_CLIPBOARD_BYTES = int(os.getenv("CLIPBOARD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Seconds to wait for the clipboard owner to answer, a hung application must not freeze the watcher.
+READ_TIMEOUT = float(os.getenv("CLIPBOARD_READ_TIMEOUT", "3"))
+
+
+class BackendUnavailable(Exception):
+    """The backend can not run on this system, create_backend falls back to the next one."""
+
+
+class XFixesBackend:
+    """
+    X11: waits for XFixes SetSelectionOwnerNotify events on CLIPBOARD, sent by the X server every time an application
+    takes ownership of the clipboard (i.e. on every copy), and then reads the new content directly over the
+    X connection. Nothing runs between copies, and no xclip/xsel process is started.
+    """
+
+    name = "X11 XFixes events"
+
+    def __init__(self, display_name: Optional[str] = None, read_timeout: float = READ_TIMEOUT):
+        try:
+            from Xlib import X, Xatom, display
+            from Xlib.ext import xfixes
+            from Xlib.error import DisplayError
+        except ImportError:
+            raise BackendUnavailable("python-xlib is not installed")
+        self.X = X
+        self.read_timeout = read_timeout
+        try:
+            self.display = display.Display(display_name)
+        except DisplayError as e:
+            raise BackendUnavailable(f"no X display: {e}")
+        if not self.display.has_extension('XFIXES'):
+            raise BackendUnavailable("the X server has no XFIXES extension")
+        self.display.xfixes_query_version()
+        self.clipboard = self.display.intern_atom('CLIPBOARD')
+        # Text as UTF-8, or Latin-1 from old applications.
+        self.targets = (self.display.intern_atom('UTF8_STRING'), Xatom.STRING)
+        self.incr = self.display.intern_atom('INCR')
+        self.property = self.display.intern_atom('SMART_CLIPBOARD_DATA')
+        self.window = self.display.screen().root.create_window(0, 0, 1, 1, 0, X.CopyFromParent,
+                                                               event_mask=X.PropertyChangeMask)
+        self.display.xfixes_select_selection_input(self.window, self.clipboard,
+                                                   xfixes.XFixesSetSelectionOwnerNotifyMask)
+        self.display.flush()
+        self._wake_read, self._wake_write = os.pipe()
+        self._stopped = False
+        self._owner_changed = False
+
+    def _is_owner_change(self, event) -> bool:
+        return (event.type, getattr(event, 'sub_code', None)) == self.display.extension_event.SetSelectionOwnerNotify
+
+    def _next_event(self, deadline: Optional[float] = None):
+        """
+        Next X event. Owner changes that arrive while a selection is being read are remembered, not lost.
+        :param deadline: time.monotonic() to wait until, None waits forever.
+        :return: The event, or None if the deadline passed or stop() was called before one arrived.
+        """
+        while deadline is not None and not self.display.pending_events():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopped:
+                return None
+            readable, _, _ = select.select([self.display.fileno(), self._wake_read], [], [], remaining)
+            if self._wake_read in readable:
+                return None
+        event = self.display.next_event()
+        if self._is_owner_change(event):
+            self._owner_changed = True
+        return event
+
+    def read(self) -> Optional[str]:
+        """
+        Returns the current clipboard text, or None if there is no text on the clipboard
+        or its owner did not answer within read_timeout seconds.
+        """
+        X = self.X
+        for target in self.targets:
+            self.window.convert_selection(self.clipboard, target, self.property, X.CurrentTime)
+            self.display.flush()
+            deadline = time.monotonic() + self.read_timeout
+            while True:
+                event = self._next_event(deadline)
+                if event is None:
+                    print(f"The clipboard owner did not answer within {self.read_timeout:g}s, copy skipped")
+                    return None
+                if event.type == X.SelectionNotify:
+                    break
+            if event.property == X.NONE:
+                continue
+            prop = self.window.get_full_property(self.property, X.AnyPropertyType, sizehint=MAX_CLIPBOARD_BYTES // 4)
+            self.window.delete_property(self.property)
+            self.display.flush()
+            if prop is None:
+                return None
+            if prop.property_type == self.incr:
+                data = self._read_incremental()
+            else:
+                data = prop.value
+            if data is None:
+                return None
+            if isinstance(data, str):
+                return data
+            return bytes(data).decode('utf-8' if target == self.targets[0] else 'latin-1', errors='replace')
+        return None
+
+    def _read_incremental(self) -> Optional[bytes]:
+        """
+        Large selections come in chunks (INCR protocol): every deleted property is refilled with the next chunk.
+        Returns None if the owner stops sending chunks for read_timeout seconds.
+        """
+        X = self.X
+        chunks, total = [], 0
+        deadline = time.monotonic() + self.read_timeout
+        while True:
+            event = self._next_event(deadline)
+            if event is None:
+                print(f"The clipboard owner stopped sending after {total} bytes, copy skipped")
+                return None
+            if event.type != X.PropertyNotify or event.state != X.PropertyNewValue or event.atom != self.property:
+                continue
+            prop = self.window.get_full_property(self.property, X.AnyPropertyType, sizehint=MAX_CLIPBOARD_BYTES // 4)
+            self.window.delete_property(self.property)
+            self.display.flush()
+            if prop is None or not prop.value:
+                break
+            chunks.append(bytes(prop.value))
+            total += len(prop.value)
+            deadline = time.monotonic() + self.read_timeout
+            if total > MAX_CLIPBOARD_BYTES:
+                return None
+        return b"".join(chunks)
+
+    def run(self, callback: Callable[[str], None]):
+        """Calls callback with the clipboard text at start and after every copy, until stop()."""
+        text = self.read()
+        if text:
+            callback(text)
+        connection = self.display.fileno()
+        while not self._stopped:
+            if not self._owner_changed and not self.display.pending_events():
+                # Sleeps until the X server sends something or stop() is called.
+                readable, _, _ = select.select([connection, self._wake_read], [], [])
+                if self._wake_read in readable:
+                    break
+            while self.display.pending_events() and not self._owner_changed:
+                self._next_event()
+            if self._owner_changed:
+                self._owner_changed = False
+                text = self.read()
+                if text:
+                    callback(text)
+
+    def stop(self):
+        self._stopped = True
+        os.write(self._wake_write, b"x")
+
+
+class WaylandBackend:
+    """
+    Wayland: `wl-paste --watch` (wl-clipboard) runs a command on every clipboard change through the data-control
+    protocol of wlroots based compositors and KDE. The command prints the text followed by a NUL separator.
+    """
+
+    name = "Wayland data-control (wl-paste --watch)"
+
+    def __init__(self):
+        if not os.getenv("WAYLAND_DISPLAY"):
+            raise BackendUnavailable("not a Wayland session")
+        if not shutil.which("wl-paste"):
+            raise BackendUnavailable("wl-paste (wl-clipboard) is not installed")
+        self.process = None
+
+    def run(self, callback: Callable[[str], None]):
+        self.process = subprocess.Popen(
+            ["wl-paste", "--no-newline", "--type", "text", "--watch", "sh", "-c", "cat; printf '\\0'"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        buffer = b""
+        for chunk in iter(lambda: self.process.stdout.read1(65536), b""):
+            buffer += chunk
+            *values, buffer = buffer.split(b"\0")
+            for value in values:
+                if value:
+                    callback(value[:MAX_CLIPBOARD_BYTES].decode('utf-8', errors='replace'))
+        if self.process.wait() > 0:
+            # GNOME has no data-control protocol, wl-paste exits right away.
+            raise BackendUnavailable(self.process.stderr.read().decode(errors='replace').strip())
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+
+def _change_counter() -> Optional[Callable[[], int]]:
+    """A cheap counter that changes on every copy: NSPasteboard.changeCount on macOS, the clipboard sequence on Windows."""
+    if sys.platform == "darwin":
+        try:
+            from AppKit import NSPasteboard
+            pasteboard = NSPasteboard.generalPasteboard()
+            return pasteboard.changeCount
+        except ImportError:
+            return None
+    if sys.platform == "win32":
+        import ctypes
+        return ctypes.windll.user32.GetClipboardSequenceNumber
+    return None
+
+
+class PollingBackend:
+    """
+    Fallback: checks the clipboard periodically.
+    With a change counter (macOS, Windows) only the counter is checked, which costs nothing, so it is checked often.
+    Otherwise pyperclip.paste() is called, which may start a process, so the interval grows from min_interval
+    to max_interval while the clipboard does not change and is reset on every change.
+    """
+
+    name = "polling"
+
+    def __init__(self, paste: Callable[[], str] = pyperclip.paste, change_counter: Optional[Callable[[], int]] = None,
+                 min_interval: float = 0.1, max_interval: float = 2.0):
+        self.paste = paste
+        self.change_counter = change_counter
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._stop = threading.Event()
+
+    def run(self, callback: Callable[[str], None]):
+        recent_value = self.paste()
+        if recent_value:
+            callback(recent_value)
+        counter = self.change_counter() if self.change_counter else None
+        interval = self.min_interval
+        while not self._stop.wait(interval):
+            if self.change_counter:
+                current = self.change_counter()
+                if current == counter:
+                    continue
+                counter = current
+            value = self.paste()
+            if value != recent_value:
+                recent_value = value
+                callback(value)
+                interval = self.min_interval
+            elif not self.change_counter:
+                interval = min(self.max_interval, interval * 1.5)
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_backend(preferred: Optional[str] = None):
+    """
+    Returns the best clipboard backend for this system: X11 XFixes events, Wayland data-control, or polling.
+    :param preferred: "x11", "wayland" or "poll" to force one.
+    """
+    candidates = {"x11": XFixesBackend, "wayland": WaylandBackend}
+    order = [preferred] if preferred in candidates else []
+    if preferred != "poll":
+        if os.getenv("WAYLAND_DISPLAY"):
+            order += ["wayland", "x11"]
+        elif os.getenv("DISPLAY"):
+            order += ["x11"]
+    for name in order:
+        try:
+            return candidates[name]()
+        except BackendUnavailable as e:
+            print(f"Clipboard backend {name} not available: {e}")
+    return PollingBackend(change_counter=_change_counter())
+
+
+def watch_clipboard(callback: Callable[[str], None], preferred: Optional[str] = None):
+    """Runs the best backend until it is stopped, falling back to polling if an event backend fails at runtime."""
+    backend = create_backend(preferred)
+    print(f"Clipboard backend: {backend.name}")
+    try:
+        backend.run(callback)
+    except BackendUnavailable as e:
+        print(f"Clipboard backend {backend.name} stopped: {e}, falling back to polling")
+        PollingBackend(change_counter=_change_counter()).run(callback)
@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_HISTORY_PATH = os.getenv("CLIPBOARD_HISTORY_PATH", str(Path.home() / ".smart_clipboard_history.sqlite"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("CLIPBOARD_HISTORY_MAX_ENTRIES", "200000"))
+DEFAULT_MAX_BYTES = int(os.getenv("CLIPBOARD_HISTORY_MAX_BYTES", str(256 * 1024 * 1024)))
+# Entries larger than this are stored zlib compressed.
+COMPRESS_OVER_BYTES = 4096
+# Only the start of very large entries is indexed for search, the full text is still stored.
+INDEX_CHARS = 20000
+
+
+class ClipboardHistory:
+    """
+    Clipboard history in SQLite. Every distinct value is stored once (keyed by its SHA-256): copying it again only
+    updates its last copy time and count. Large values are compressed, and the least recently copied entries are
+    evicted once there are more than max_entries or they take more than max_bytes.
+    Text is searchable through an FTS5 index.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL UNIQUE,
+                content BLOB NOT NULL,
+                compressed INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                first_copied REAL NOT NULL,
+                last_copied REAL NOT NULL,
+                copy_count INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_copied ON entries (last_copied)")
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(text, tokenize='unicode61')")
+        self._conn.commit()
+        self._count, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(stored_size), 0) FROM entries").fetchone()
+
+    def add(self, text: str, copied_at: Optional[float] = None) -> int:
+        """Stores a copied value, or refreshes it if it is already in the history. Returns its id."""
+        return self.add_many([(text, copied_at or time.time())])[0]
+
+    def add_many(self, values: list) -> list:
+        """Stores several (text, copied_at) values in one transaction. Returns their ids."""
+        with self._lock:
+            ids = [self._add(text, copied_at) for text, copied_at in values]
+            if self._count > self.max_entries or self._bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+        return ids
+
+    def _add(self, text: str, copied_at: float) -> int:
+        # Clipboard text can hold lone surrogates (e.g. half an emoji from a Windows app), they are stored as they are.
+        data = text.encode('utf-8', 'surrogatepass')
+        content_hash = hashlib.sha256(data).hexdigest()
+        row = self._conn.execute("SELECT id FROM entries WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row:
+            self._conn.execute(
+                "UPDATE entries SET last_copied = ?, copy_count = copy_count + 1 WHERE id = ?", (copied_at, row[0]))
+            return row[0]
+
+        compressed = len(data) > COMPRESS_OVER_BYTES
+        content = zlib.compress(data, 6) if compressed else data
+        cursor = self._conn.execute(
+            "INSERT INTO entries (content_hash, content, compressed, size, stored_size, first_copied, last_copied, "
+            "copy_count) VALUES (?, ?, ?, ?, ?, ?, ?, 1)",
+            (content_hash, content, int(compressed), len(data), len(content), copied_at, copied_at))
+        entry_id = cursor.lastrowid
+        # SQLite only takes valid UTF-8, lone surrogates are indexed as U+FFFD.
+        indexed = text[:INDEX_CHARS].encode('utf-8', 'replace').decode('utf-8')
+        self._conn.execute("INSERT INTO entries_fts (rowid, text) VALUES (?, ?)", (entry_id, indexed))
+        self._count += 1
+        self._bytes += len(content)
+        return entry_id
+
+    def _evict(self):
+        """Deletes the least recently copied entries down to 90% of the limits, so this does not run on every add."""
+        target_entries, target_bytes = int(self.max_entries * 0.9), int(self.max_bytes * 0.9)
+        doomed, count, total = [], self._count, self._bytes
+        for entry_id, stored_size in self._conn.execute("SELECT id, stored_size FROM entries ORDER BY last_copied"):
+            if count <= target_entries and total <= target_bytes:
+                break
+            doomed.append((entry_id,))
+            count -= 1
+            total -= stored_size
+        self._conn.executemany("DELETE FROM entries WHERE id = ?", doomed)
+        self._conn.executemany("DELETE FROM entries_fts WHERE rowid = ?", doomed)
+        self._count, self._bytes = count, total
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Turns plain words into an FTS5 query: every word must match, as a prefix, special characters are literal."""
+        words = [word.replace('"', '""') for word in query.split()]
+        return " ".join(f'"{word}"*' for word in words)
+
+    @staticmethod
+    def _snippet(text: str, words: list, width: int = 100) -> str:
+        """The part of text around the first matching word. Cheaper than FTS5 snippet() on large entries."""
+        lowered = text.lower()
+        found = [position for position in (lowered.find(word.lower()) for word in words) if position >= 0]
+        start = max(0, min(found) - width // 4) if found else 0
+        snippet = text[start:start + width]
+        return ("…" if start else "") + snippet + ("…" if start + width < len(text) else "")
+
+    def search(self, query: str, limit: int = 20, raw: bool = False) -> list:
+        """
+        Full text search, best matches (BM25) first.
+        :param raw: Pass the query to FTS5 as is (AND/OR/NOT, "phrases", NEAR(...)).
+        :return: Dicts with id, last_copied, copy_count, size and a snippet around the match.
+            Raises ValueError if a raw query is not valid FTS5 syntax.
+        """
+        match = query if raw else self._fts_query(query)
+        if not match:
+            return []
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT e.id, e.last_copied, e.copy_count, e.size, f.text FROM "
+                    "(SELECT rowid, text FROM entries_fts WHERE entries_fts MATCH ? ORDER BY rank LIMIT ?) f "
+                    "JOIN entries e ON e.id = f.rowid", (match, limit)).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid search syntax: {e}") from e
+        words = [word.strip('"*()') for word in query.split()]
+        return [{"id": r[0], "last_copied": r[1], "copy_count": r[2], "size": r[3], "snippet": self._snippet(r[4], words)}
+                for r in rows]
+
+    def recent(self, limit: int = 20) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, last_copied, copy_count, size, substr(f.text, 1, 80) FROM entries "
+                "JOIN entries_fts f ON f.rowid = entries.id ORDER BY last_copied DESC LIMIT ?", (limit,)).fetchall()
+        return [{"id": r[0], "last_copied": r[1], "copy_count": r[2], "size": r[3], "snippet": r[4]} for r in rows]
+
+    def get(self, entry_id: int) -> Optional[str]:
+        """Returns the full text of an entry."""
+        with self._lock:
+            row = self._conn.execute("SELECT content, compressed FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        content, compressed = row
+        return (zlib.decompress(content) if compressed else content).decode('utf-8', 'surrogatepass')
+
+    def stats(self) -> str:
+        with self._lock:
+            count, size, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM entries").fetchone()
+        return (f"History: {count} entries, {size / 1024 / 1024:.1f} MiB of text stored in {stored / 1024 / 1024:.1f} MiB "
+                f"(limits {self.max_entries} entries, {self.max_bytes / 1024 / 1024:.0f} MiB) in {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _print_entries(entries: list):
+    for entry in entries:
+        copied = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry["last_copied"]))
+        times = f" x{entry['copy_count']}" if entry["copy_count"] > 1 else ""
+        snippet = " ".join(entry["snippet"].split())
+        print(f"{entry['id']:>7}  {copied}{times:<5} {snippet}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the clipboard history")
+    parser.add_argument('--db', default=DEFAULT_HISTORY_PATH, help="History database (default: CLIPBOARD_HISTORY_PATH)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    search = commands.add_parser('search', help="Full text search, e.g. search invoice march")
+    search.add_argument('query', nargs='+')
+    search.add_argument('--limit', type=int, default=20)
+    search.add_argument('--raw', action='store_true', help="Use FTS5 query syntax (OR, NOT, \"phrases\")")
+    recent = commands.add_parser('recent', help="Most recently copied entries")
+    recent.add_argument('--limit', type=int, default=20)
+    show = commands.add_parser('show', help="Print the full text of an entry")
+    show.add_argument('id', type=int)
+    commands.add_parser('stats', help="Size of the history")
+    args = parser.parse_args()
+
+    store = ClipboardHistory(args.db)
+    start = time.perf_counter()
+    if args.command == 'search':
+        try:
+            results = store.search(" ".join(args.query), limit=args.limit, raw=args.raw)
+        except ValueError as e:
+            print(f"{e} (see https://www.sqlite.org/fts5.html#full_text_query_syntax)")
+        else:
+            _print_entries(results)
+            print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.command == 'recent':
+        _print_entries(store.recent(args.limit))
+    elif args.command == 'show':
+        text = store.get(args.id)
+        print(text if text is not None else f"No entry {args.id}")
+    else:
+        print(store.stats())
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
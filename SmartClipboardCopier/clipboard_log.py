@@ -0,0 +1,143 @@
+import datetime
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Optional
+
+from clipboard_history import ClipboardHistory
+
+DEFAULT_LOG_DIR = os.getenv("CLIPBOARD_LOG_DIR", ".")
+DEFAULT_MAX_LOG_BYTES = int(os.getenv("CLIPBOARD_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+# Longer values are cut in the log, the full text is in the history under history_id.
+MAX_LOGGED_CHARS = int(os.getenv("CLIPBOARD_LOG_MAX_CHARS", "65536"))
+
+
+class ClipboardLogWriter:
+    """
+    Writes copied values from a background thread, so the clipboard watcher only puts them on a queue.
+
+    The thread wakes up for the first queued value and takes everything else already waiting with it (up to
+    batch_size), so a burst of copies is one write, one flush and one history transaction.
+    Every value is a JSON line (time, size, sha256, history_id, text) in copied_data_YYYYMMDD.log, named after the
+    local date of the copy, so a process running past midnight starts a new file. A file that would grow over
+    max_bytes is continued in copied_data_YYYYMMDD.1.log, .2.log, ...
+    """
+
+    def __init__(self, directory: str = DEFAULT_LOG_DIR, history: Optional[ClipboardHistory] = None,
+                 max_bytes: int = DEFAULT_MAX_LOG_BYTES, batch_size: int = 200, max_queued: int = 10000):
+        self.directory = directory
+        self.history = history
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self._file = None
+        self._file_key = None  # (date, part) of the open file
+        self._file_size = 0
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="clipboard-log-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, text: str, copied_at: Optional[float] = None):
+        """Queues a copied value. Never blocks: if the writer has fallen far behind, the value is dropped and counted."""
+        try:
+            self._queue.put_nowait((text, copied_at or time.time()))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Writes what is still queued and stops the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [entry for entry in batch if entry is not None]
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    # The watcher must keep running even if the disk is full or the history is locked.
+                    print(f"Clipboard log: could not write {len(batch)} entries: {e}")
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch: list):
+        ids = self.history.add_many(batch) if self.history else [None] * len(batch)
+        lines = []
+        for (text, copied_at), history_id in zip(batch, ids):
+            data = text.encode('utf-8', 'surrogatepass')  # the same bytes as in the history
+            entry = {
+                "time": datetime.datetime.fromtimestamp(copied_at).astimezone().isoformat(timespec='milliseconds'),
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "history_id": history_id,
+                "text": text[:MAX_LOGGED_CHARS],
+            }
+            if len(text) > MAX_LOGGED_CHARS:
+                entry["truncated"] = True
+            lines.append((time.strftime('%Y%m%d', time.localtime(copied_at)),
+                          (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8', 'replace')))
+
+        chunk = []
+        for date, line in lines:
+            if self._file is None or self._file_key[0] != date or self._file_size + len(line) > self.max_bytes:
+                self._flush(chunk)
+                chunk = []
+                self._open(date, len(line))
+            chunk.append(line)
+            self._file_size += len(line)
+        self._flush(chunk)
+        self.written += len(batch)
+
+    def _flush(self, chunk: list):
+        if chunk:
+            self._file.write(b"".join(chunk))
+            self._file.flush()
+
+    def _open(self, date: str, needed: int):
+        """Opens the log file for date: the current part, or the next one if this line does not fit any more."""
+        if self._file is not None and self._file_key[0] == date:
+            part = self._file_key[1] + 1
+        else:
+            # After a restart, continue with the last part written that day.
+            pattern = re.compile(rf"copied_data_{date}(?:\.(\d+))?\.log$")
+            parts = [int(match.group(1) or 0) for match in map(pattern.match, os.listdir(self.directory)) if match]
+            part = max(parts, default=0)
+        while True:
+            name = f"copied_data_{date}.log" if part == 0 else f"copied_data_{date}.{part}.log"
+            path = os.path.join(self.directory, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            # An empty file takes the line even if it is bigger than max_bytes on its own.
+            if size == 0 or size + needed <= self.max_bytes:
+                break
+            part += 1
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, 'ab')
+        self._file_key = (date, part)
+        self._file_size = size
+
+    def stats(self) -> str:
+        return f"Clipboard log: {self.written} entries written, {self.dropped} dropped, {self._queue.qsize()} queued"
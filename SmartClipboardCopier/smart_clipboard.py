@@ -11,23 +11,43 @@
 import sys
 # ========== Clipboard Logger ==========
 
-import time
-import pyperclip
 from loguru import logger
+from clipboard_backends import watch_clipboard
+from clipboard_history import ClipboardHistory
+from clipboard_log import ClipboardLogWriter
 
-history = []
-file_name = f"copied_data_{time.strftime('%Y%m%d')}.log"
-logger.add(sink=file_name, format="{time} {level} {message}", colorize=True)
-def clipboard_logger():
+# Deduplicated, size limited and searchable: python clipboard_history.py search <words>
+history = ClipboardHistory()
+# copied_data_YYYYMMDD.log, written in the background together with the history
+log_writer = ClipboardLogWriter(history=history)
+def clipboard_logger(backend=None):
+    """
+    Logs every copied value. The clipboard is watched through events where the system has them
+    (X11 XFixes, Wayland data-control), so nothing runs between copies; see clipboard_backends.
+    Copied values are queued for the log writer thread, which writes them to the daily log file and the
+    clipboard history, so no file I/O happens on the watcher thread; see clipboard_log and clipboard_history.
+    :param backend: "x11", "wayland" or "poll" to force a backend, the best available one by default.
+    """
     recent_value = ""
-    while True:
-        tmp_value = pyperclip.paste()
-        if tmp_value != recent_value:
-            recent_value = tmp_value
-            history.append(recent_value)
-            logger.info(f"Copied: {recent_value}")
-        time.sleep(1)
 
-clipboard_logger()
+    def on_copy(value):
+        nonlocal recent_value
+        if value != recent_value:
+            recent_value = value
+            log_writer.write(recent_value)
+            preview = " ".join(recent_value[:80].split())
+            logger.info(f"Copied: {preview}{'…' if len(recent_value) > 80 else ''}")
+
+    log_writer.start()
+    try:
+        watch_clipboard(on_copy, preferred=backend)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_writer.close()
+        print(log_writer.stats())
+
+if __name__ == "__main__":
+    clipboard_logger(sys.argv[1] if len(sys.argv) > 1 else None)
 
 
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The SmartClipboardCopier modules import each other as top-level modules, like when smart_clipboard.py is run.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
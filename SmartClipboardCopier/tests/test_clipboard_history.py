@@ -0,0 +1,26 @@
+import pytest
+
+from clipboard_history import ClipboardHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = ClipboardHistory(str(tmp_path / "history.sqlite"))
+    yield store
+    store.close()
+
+
+def test_malformed_raw_query_raises_value_error(history):
+    history.add("invoice march")
+    assert [entry["id"] for entry in history.search('invoice OR march', raw=True)]
+    for query in ['"unterminated', 'invoice AND', 'NEAR(']:
+        with pytest.raises(ValueError, match="Invalid search syntax"):
+            history.search(query, raw=True)
+
+
+def test_lone_surrogates_are_stored_and_returned(history):
+    text = "half an emoji \ud83d here"
+    entry_id = history.add(text)
+    assert history.add(text) == entry_id
+    assert history.get(entry_id) == text
+    assert [entry["id"] for entry in history.search("emoji")] == [entry_id]
@@ -0,0 +1,145 @@
+import os
+import queue
+import select
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("Xlib")
+pytest.importorskip("pyperclip")
+from Xlib import X, display
+from Xlib.protocol import event as xevent
+
+from clipboard_backends import XFixesBackend
+
+TIMEOUT = 10
+
+
+@pytest.fixture(scope="module")
+def xvfb():
+    """Starts a headless X server and returns its display name."""
+    if not shutil.which("Xvfb"):
+        pytest.skip("Xvfb is not installed")
+    # -displayfd makes Xvfb pick a free display number and print it once it accepts connections.
+    read_fd, write_fd = os.pipe()
+    server = subprocess.Popen(["Xvfb", "-displayfd", str(write_fd), "-nolisten", "tcp", "-screen", "0", "64x64x24"],
+                              pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    try:
+        readable, _, _ = select.select([read_fd], [], [], TIMEOUT)
+        if not readable:
+            pytest.fail("Xvfb did not start")
+        yield ":" + os.read(read_fd, 16).decode().strip()
+    finally:
+        os.close(read_fd)
+        server.terminate()
+        server.wait()
+
+
+class ClipboardOwner:
+    """
+    An application copying text: owns CLIPBOARD and answers UTF8_STRING requests, or never answers when hung.
+    All X calls happen in its own thread, copies are queued to it.
+    """
+
+    def __init__(self, display_name: str, hung: bool = False):
+        self.display = display.Display(display_name)
+        self.window = self.display.screen().root.create_window(0, 0, 1, 1, 0, X.CopyFromParent)
+        self.clipboard = self.display.intern_atom("CLIPBOARD")
+        self.utf8 = self.display.intern_atom("UTF8_STRING")
+        self.hung = hung
+        self.text = b""
+        self._copies = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def copy(self, text: str):
+        self._copies.put(text)
+
+    def _serve(self):
+        while not self._stopped:
+            while not self._copies.empty():
+                self.text = self._copies.get().encode("utf-8")
+                self.window.set_selection_owner(self.clipboard, X.CurrentTime)
+                self.display.flush()
+            while self.display.pending_events():
+                request = self.display.next_event()
+                if request.type == X.SelectionRequest and not self.hung:
+                    self._answer(request)
+            select.select([self.display.fileno()], [], [], 0.01)
+
+    def _answer(self, request):
+        prop = X.NONE
+        if request.target == self.utf8:
+            request.requestor.change_property(request.property, self.utf8, 8, self.text)
+            prop = request.property
+        notify = xevent.SelectionNotify(time=request.time, requestor=request.requestor, selection=request.selection,
+                                        target=request.target, property=prop)
+        request.requestor.send_event(notify)
+        self.display.flush()
+
+    def close(self):
+        self._stopped = True
+        self._thread.join(TIMEOUT)
+        self.display.close()
+
+
+def start_backend(backend: XFixesBackend) -> tuple:
+    """Runs the backend in a thread. Returns (recorded texts, thread)."""
+    recorded = []
+    thread = threading.Thread(target=backend.run, args=(recorded.append,), daemon=True)
+    thread.start()
+    return recorded, thread
+
+
+def wait_for(condition) -> bool:
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_rapid_copies_are_all_recorded(xvfb):
+    owner = ClipboardOwner(xvfb)
+    backend = XFixesBackend(xvfb)
+    recorded, thread = start_backend(backend)
+    try:
+        texts = [f"copy {index} ✓" for index in range(20)]
+        for text in texts:
+            owner.copy(text)
+            # A person copying fast, each copy arrives while the previous one may still be read.
+            time.sleep(0.05)
+        assert wait_for(lambda: len(recorded) >= len(texts)), recorded
+        assert recorded == texts
+    finally:
+        backend.stop()
+        thread.join(TIMEOUT)
+        owner.close()
+    assert not thread.is_alive()
+
+
+def test_hung_owner_does_not_freeze_the_watcher(xvfb):
+    owner = ClipboardOwner(xvfb, hung=True)
+    backend = XFixesBackend(xvfb, read_timeout=0.5)
+    try:
+        owner.copy("never delivered")
+        time.sleep(0.2)
+        start = time.monotonic()
+        assert backend.read() is None
+        assert time.monotonic() - start < 2
+
+        recorded, thread = start_backend(backend)
+        owner.copy("still never delivered")
+        time.sleep(0.2)
+        backend.stop()
+        thread.join(TIMEOUT)
+        assert not thread.is_alive()
+        assert recorded == []
+    finally:
+        owner.close()
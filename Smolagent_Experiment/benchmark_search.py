@@ -0,0 +1,134 @@
+"""
+Replays the search calls an agent makes on GAIA-style questions against a local fake search server that answers
+after a fixed delay, like s.jina.ai does:
+- uncached: one request per query, one query at a time (the previous wikipedia_query)
+- cached: CachedSearch, repeated queries come from the TTL cache
+- concurrent: CachedSearch.many, the queries of one step are searched at the same time
+- warm: concurrent again after a restart, with the cache file of the previous runs
+Each mode starts with an empty cache, except warm.
+
+python benchmark_search.py --latency 0.3 --workers 4
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tool_cache import CachedSearch, TTLCache
+
+# The search steps of an agent on each question, a step with several queries is one wikipedia_queries call.
+# Agents repeat lookups across steps (verifying a fact) and across questions (the same entity).
+QUESTIONS = {
+    "How many studio albums were published by Mercedes Sosa between 2000 and 2009 (included)?": [
+        ["Mercedes Sosa"],
+        ["Mercedes Sosa discography", "Mercedes Sosa studio albums"],
+        ["Mercedes Sosa discography"],
+        ["Cantora 1", "Cantora 2", "Corazón Libre"],
+    ],
+    "Who nominated the only Featured Article on English Wikipedia about a dinosaur promoted in November 2016?": [
+        ["Wikipedia featured articles promoted November 2016"],
+        ["Giganotosaurus", "Wikipedia featured article candidates Giganotosaurus"],
+        ["Giganotosaurus"],
+    ],
+    "What is the surname of the equine veterinarian mentioned in 1.E of the LibreTexts chemistry materials?": [
+        ["LibreTexts Introductory Chemistry 1.E exercises"],
+        ["LibreTexts Introductory Chemistry 1.E exercises", "equine veterinarian LibreTexts"],
+    ],
+    "Which country had the least number of athletes at the 1928 Summer Olympics?": [
+        ["1928 Summer Olympics"],
+        ["1928 Summer Olympics participating nations", "Cuba at the 1928 Summer Olympics",
+         "Panama at the 1928 Summer Olympics"],
+        ["1928 Summer Olympics participating nations"],
+    ],
+    "Who are the pitchers with the number before and after Taishō Tamai's number as of July 2023?": [
+        ["Taishō Tamai"],
+        ["Hokkaido Nippon-Ham Fighters roster 2023", "Taishō Tamai uniform number"],
+        ["Hokkaido Nippon-Ham Fighters roster 2023"],
+    ],
+    "What is the first name of the only Malko Competition recipient from the 20th century after 1977?": [
+        ["Malko Competition"],
+        ["Malko Competition winners", "Malko Competition 1983", "Malko Competition 1986"],
+        ["Malko Competition winners", "East Germany"],
+    ],
+}
+
+
+class FakeSearchHandler(BaseHTTPRequestHandler):
+    latency = 0.3
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with FakeSearchHandler.lock:
+            FakeSearchHandler.requests += 1
+        time.sleep(self.latency)
+        query = urllib.parse.unquote(self.path.lstrip("/"))
+        body = json.dumps({"data": [{"title": query, "content": f"Summary about {query}. " * 20}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_questions(search: CachedSearch, concurrent: bool):
+    for steps in QUESTIONS.values():
+        for queries in steps:
+            if concurrent:
+                search.many(queries)
+            else:
+                for query in queries:
+                    search(query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cached and concurrent search tool calls")
+    parser.add_argument('--latency', type=float, default=0.3, help="Seconds per fake search request")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent searches per tool call")
+    args = parser.parse_args()
+
+    FakeSearchHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/"
+
+    def fake_search(query: str) -> str:
+        with urllib.request.urlopen(base_url + urllib.parse.quote(query)) as response:
+            return response.read().decode("utf-8")
+
+    calls = sum(len(queries) for steps in QUESTIONS.values() for queries in steps)
+    print(f"{len(QUESTIONS)} questions, {calls} search calls, {args.latency}s per request")
+    print(f"{'mode':>12} {'seconds':>8} {'requests':>9}")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            # mode: (cache file, concurrent), warm reuses the file of concurrent
+            modes = {"uncached": (None, False), "cached": ("cached", False), "concurrent": ("concurrent", True),
+                     "warm": ("concurrent", True)}
+            for mode, (cache_name, concurrent) in modes.items():
+                FakeSearchHandler.requests = 0
+                start = time.perf_counter()
+                if cache_name is None:
+                    for steps in QUESTIONS.values():
+                        for queries in steps:
+                            for query in queries:
+                                fake_search(query)
+                else:
+                    cache = TTLCache(os.path.join(directory, f"{cache_name}.sqlite"))
+                    run_questions(CachedSearch(fake_search, cache, max_workers=args.workers), concurrent)
+                    cache.close()
+                print(f"{mode:>12} {time.perf_counter() - start:>8.2f} {FakeSearchHandler.requests:>9}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import sys
+from pathlib import Path
+
 from agno.agent import Agent
 from agno.models.google import Gemini
 from agno.team import Team
@@ -6,22 +9,49 @@ from langchain_community.tools.jina_search import JinaSearch
 from smolagents import CodeAgent, Model
 from agno.tools.python import PythonTools
 
+from tool_cache import CachedSearch
+
+# model_cache.py is shared by the experiments, it lives in the repository root.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from model_cache import cached
+
 load_dotenv()
 
+jina_search = None
+
+
+def search_jina(query: str) -> str:
+    global jina_search
+    if jina_search is None:
+        jina_search = JinaSearch()
+    return jina_search(query)
+
+
+search = CachedSearch(search_jina)
+
+
 def wikipedia_query(query:str) -> str:
     """
     Query Wikipedia for a specific term.
     :param query: The term to search for.
     :return: The summary of the Wikipedia page.
     """
-    search = JinaSearch()
-    result = search(query)
-    return result
+    return search(query)
+
+
+def wikipedia_queries(queries: list[str]) -> str:
+    """
+    Query Wikipedia for several terms at once, faster than one wikipedia_query call per term.
+    :param queries: The terms to search for.
+    :return: The summary of the Wikipedia page of every term, under a heading with the term.
+    """
+    results = search.many(queries)
+    return "\n\n".join(f"### {query}\n{result}" for query, result in results.items())
 
 HuggingFaceMainAgent = Agent(
     name="Main Agent",
-    model=Gemini(id="gemini-2.0-flash"),
-    tools=[PythonTools(pip_install=True),wikipedia_query],
+    model=cached(Gemini(id="gemini-2.0-flash")),
+    tools=[PythonTools(pip_install=True),wikipedia_query,wikipedia_queries],
     markdown=True,
     show_tool_calls=True
 )
@@ -29,7 +59,7 @@ HuggingFaceMainAgent = Agent(
 hugging_face_team = Team(
     name="Nimo007 Hugging Face Team",
     mode="coordinate",
-    model=Gemini(id="gemini-2.0-flash"),
+    model=cached(Gemini(id="gemini-2.0-flash")),
     markdown=True,
     show_tool_calls=True,
     description="You are a task router that directs certain tasks to the appropriate agent.",
@@ -1,5 +1,12 @@
+import sys
+from pathlib import Path
+
 from smolagents import LiteLLMModel, CodeAgent, tool, DuckDuckGoSearchTool
 
+# model_cache.py is shared by the experiments, it lives in the repository root.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from model_cache import cached
+
 @tool
 def suggest_menu(occasion: str) -> str:
     """Suggest a menu for a given occasion.
@@ -21,9 +28,9 @@ def suggest_menu(occasion: str) -> str:
         return "Custom menu for the butler"
 
 
-model = LiteLLMModel(
+model = cached(LiteLLMModel(
     model_id="ollama/gemma3"
-)
+))
 
 agent = CodeAgent(tools=[],model=model, additional_authorized_imports=["datetime"])
 
@@ -0,0 +1,134 @@
+"""
+Memoizing layer for the search tools of the agents. The agent often repeats the same lookup across reasoning steps
+and questions, so results are kept in a SQLite file with a time to live, and survive restarts:
+
+    search = CachedSearch(lambda query: JinaSearch()(query))
+    search(query)             # one query, from the cache when it was seen within the TTL
+    search.many(queries)      # several queries in one tool call, the missing ones are searched concurrently
+
+SEARCH_CACHE_PATH (default .search_cache.sqlite next to this file) and SEARCH_CACHE_TTL (seconds, default one day)
+configure the cache. Failed searches are not cached.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+DEFAULT_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".search_cache.sqlite"))
+DEFAULT_TTL = float(os.getenv("SEARCH_CACHE_TTL", 24 * 60 * 60))
+DEFAULT_WORKERS = int(os.getenv("SEARCH_WORKERS", 4))
+# Expired entries are deleted when the cache is opened and then every PURGE_EVERY puts, so the file does not only grow.
+PURGE_EVERY = 500
+
+
+def normalize_query(query: str) -> str:
+    """Queries that differ only in case and whitespace return the same results."""
+    return " ".join(query.split()).casefold()
+
+
+class TTLCache:
+    """String values by key in a SQLite file, expiring `ttl` seconds after they were stored."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        # Shared by the search threads, every use is under the lock.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+        self.connection.commit()
+        self.purge()
+
+    @staticmethod
+    def key(namespace: str, *args) -> str:
+        return hashlib.sha256(json.dumps([namespace, *args], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute("SELECT value, stored_at FROM tool_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self.connection.execute("INSERT OR REPLACE INTO tool_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                                    (key, value, time.time()))
+            self.connection.commit()
+            self._puts += 1
+            purge = self._puts % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def purge(self) -> int:
+        """Deletes the expired entries. Returns how many were deleted."""
+        with self._lock:
+            deleted = self.connection.execute("DELETE FROM tool_cache WHERE stored_at < ?", (time.time() - self.ttl,)).rowcount
+            self.connection.commit()
+            return deleted
+
+    def stats(self) -> str:
+        return f"Tool cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class CachedSearch:
+    """Wraps a search function (query -> text) with the TTL cache and concurrent multi-query lookups."""
+
+    def __init__(self, search: Callable[[str], str], cache: Optional[TTLCache] = None, namespace: str = "search",
+                 max_workers: int = DEFAULT_WORKERS):
+        self.search = search
+        self.cache = cache
+        self.namespace = namespace
+        self.max_workers = max_workers
+
+    def _cache(self) -> TTLCache:
+        # Opened on first use, so importing an agent script does not touch the disk.
+        if self.cache is None:
+            self.cache = TTLCache()
+        return self.cache
+
+    def __call__(self, query: str) -> str:
+        key = TTLCache.key(self.namespace, normalize_query(query))
+        result = self._cache().get(key)
+        if result is None:
+            result = str(self.search(query))
+            self.cache.put(key, result)
+        return result
+
+    def many(self, queries: list) -> dict:
+        """
+        Looks up several queries, the ones not in the cache are searched concurrently.
+        :param queries: The queries, repeated ones (also when they differ only in case and whitespace) are searched once.
+        :return: The result of every query, by query, a repeated query under the way it was first written.
+            A failed search gives an error text, the others still return.
+        """
+        first_written = {}
+        for query in queries:
+            first_written.setdefault(normalize_query(query), query)
+        unique = list(first_written.values())
+        if len(unique) <= 1 or self.max_workers <= 1:
+            return {query: self._safe_call(query) for query in unique}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique))) as executor:
+            return dict(zip(unique, executor.map(self._safe_call, unique)))
+
+    def _safe_call(self, query: str) -> str:
+        try:
+            return self(query)
+        except Exception as error:
+            return f"Search failed: {error}"
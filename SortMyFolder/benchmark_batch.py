@@ -0,0 +1,55 @@
+"""
+Measures files/second of smart categorization for different batch sizes, against the LM Studio server in LM_STUDIO_URL.
+The category cache is disabled so every run really calls the model.
+
+python benchmark_batch.py --files 64 --batch-sizes 1 4 8 16
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from sorter import SmartSorter
+
+SAMPLE_TEXTS = [
+    "INVOICE #{n}\nBill to: ACME Corp\nAmount due: ${n}.00\nPayment terms: 30 days",
+    "Meeting notes {n}\nAttendees: Priya, Tom\nAction items: ship the release, update the roadmap",
+    "def handler_{n}(event):\n    return {{'status': 200, 'body': event}}\n",
+    "Flight confirmation {n}\nDeparture: BOM 08:45\nArrival: BLR 10:30\nSeat 14C",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched smart categorization")
+    parser.add_argument('--files', type=int, default=32, help="Number of text files to categorize")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16], help="Batch sizes to compare")
+    args = parser.parse_args()
+
+    sorter = SmartSorter(use_cache=False)
+    if not sorter.client:
+        print("LM Studio is not reachable, nothing to benchmark.")
+        return
+
+    root = Path(tempfile.mkdtemp(prefix="batch_bench_"))
+    try:
+        files = []
+        for n in range(args.files):
+            file_path = root / f"file_{n}.txt"
+            file_path.write_text(SAMPLE_TEXTS[n % len(SAMPLE_TEXTS)].format(n=n))
+            files.append(file_path)
+
+        print(f"{'batch size':>10} {'seconds':>9} {'files/s':>9}")
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            for index in range(0, len(files), batch_size):
+                sorter.categorize_batch(files[index:index + batch_size], use_smart=True)
+            elapsed = time.perf_counter() - start
+            print(f"{batch_size:>10} {elapsed:>9.2f} {len(files) / elapsed:>9.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
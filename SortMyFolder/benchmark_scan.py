@@ -0,0 +1,73 @@
+"""
+Compares the scandir based SmartSorter.scan_directory with the Path.iterdir() + is_file() scanner it replaced.
+
+python benchmark_scan.py --files 200000 --dirs 200
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from sorter import SmartSorter
+
+
+def old_scan(path: Path, recursive: bool):
+    """The previous scanner, extended with rglob for the recursive case."""
+    entries = path.rglob('*') if recursive else path.iterdir()
+    for entry in entries:
+        if entry.is_file() and entry.name != '.DS_Store' and not entry.name.startswith('.'):
+            yield entry
+
+
+def build_tree(root: Path, files: int, dirs: int):
+    per_dir = max(1, files // max(1, dirs))
+    created = 0
+    for d in range(dirs):
+        directory = root / f"dir_{d}" / "nested"
+        directory.mkdir(parents=True)
+        for f in range(per_dir):
+            (directory / f"file_{f}.txt").touch()
+            created += 1
+    # Some files at the top level too, the non recursive scan only sees these.
+    for f in range(per_dir):
+        (root / f"top_{f}.txt").touch()
+    return created + per_dir
+
+
+def measure(name: str, scan):
+    start = time.perf_counter()
+    count = sum(1 for _ in scan())
+    elapsed = time.perf_counter() - start
+    # Memory is measured in a second pass, tracemalloc slows down the scan too much to time it at the same time.
+    tracemalloc.start()
+    sum(1 for _ in scan())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} {count:>9} files {elapsed:>8.3f}s {count / elapsed:>12.0f} files/s  peak {peak / 1024:>9.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the directory scanner")
+    parser.add_argument('--files', type=int, default=100000, help="Number of files to create")
+    parser.add_argument('--dirs', type=int, default=100, help="Number of directories to spread them over")
+    args = parser.parse_args()
+
+    sorter = SmartSorter(use_cache=False, connect=False)
+    root = Path(tempfile.mkdtemp(prefix="scan_bench_"))
+    try:
+        total = build_tree(root, args.files, args.dirs)
+        print(f"Created {total} files in {root}")
+        measure("old iterdir (top level)", lambda: old_scan(root, False))
+        measure("scandir (top level)", lambda: sorter.scan_directory(root))
+        measure("old rglob (recursive)", lambda: old_scan(root, True))
+        measure("scandir (recursive)", lambda: sorter.scan_directory(root, recursive=True))
+        measure("scandir (recursive, *.txt)", lambda: sorter.scan_directory(root, recursive=True, include=['*.txt'], min_size=0))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
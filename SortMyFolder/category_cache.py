@@ -0,0 +1,107 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.getenv("SORTER_CACHE_PATH", str(Path.home() / ".smart_sorter_cache.sqlite"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SORTER_CACHE_MAX_ENTRIES", "50000"))
+
+
+def hash_file(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Returns the SHA-256 of the file content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CategoryCache:
+    """
+    Persistent cache of the categories chosen by the LLM, keyed by file content hash, model name and prompt version.
+    The least recently used entries are evicted once the cache holds more than max_entries.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS categories (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                category TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, model, prompt_version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_categories_last_used ON categories (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+
+    def get(self, content_hash: str, model: str, prompt_version: str) -> Optional[str]:
+        """Returns the cached category, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT category FROM categories WHERE content_hash = ? AND model = ? AND prompt_version = ?",
+                (content_hash, model, prompt_version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE categories SET last_used = ? WHERE content_hash = ? AND model = ? AND prompt_version = ?",
+                (time.time(), content_hash, model, prompt_version)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, content_hash: str, model: str, prompt_version: str, category: str):
+        """Stores a category, evicting the least recently used entries if the cache is full."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO categories (content_hash, model, prompt_version, category, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, model, prompt_version, category, now, now)
+            )
+            # A replaced row is counted too, so the size is an upper bound which is re-counted before evicting.
+            self._size += max(cursor.rowcount, 0)
+            self.stores += 1
+            if self._size > self.max_entries:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+            if self._size > self.max_entries:
+                # Evict down to 90% so we do not have to evict again on the very next insert.
+                to_evict = self._size - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM categories WHERE rowid IN (SELECT rowid FROM categories ORDER BY last_used LIMIT ?)",
+                    (to_evict,)
+                )
+                self.evictions += to_evict
+                self._size -= to_evict
+            self._conn.commit()
+
+    def stats(self) -> str:
+        with self._lock:
+            self._size = self._conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return (f"Cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), "
+                f"{self.stores} stored, {self.evictions} evicted, {self._size} entries in {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+from category_cache import hash_file
+
+# Bytes hashed from the start and from the end of a file before deciding to read all of it.
+PARTIAL_BYTES = 64 * 1024
+
+
+class DuplicateFinder:
+    """
+    Finds files with identical content in stages, so most files are never read:
+    files are grouped by size first (a unique size can not have a duplicate), then by a hash of their first
+    and last PARTIAL_BYTES, and only files that still collide get a full SHA-256.
+    Hashes are remembered per (path, size, mtime), and the full hash is the same one the category cache uses,
+    so it is computed at most once per file. Empty files are never considered duplicates.
+    """
+
+    def __init__(self, partial_bytes: int = PARTIAL_BYTES):
+        self.partial_bytes = partial_bytes
+        self.files_seen = 0
+        self.folder_files_seen = 0  # files already in the destination folders, they can be hashed too
+        self.files_hashed = 0
+        self.bytes_read = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self._partial = {}
+        self._full = {}
+        self._folders = {}  # folder -> {size: [paths]}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(file_path: Path):
+        stat = os.stat(file_path)
+        return str(file_path), stat.st_size, stat.st_mtime_ns
+
+    def partial_hash(self, file_path: Path) -> str:
+        key = self._key(file_path)
+        if key in self._partial:
+            return self._partial[key]
+        size = key[1]
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            if size <= 2 * self.partial_bytes:
+                digest.update(f.read())
+            else:
+                digest.update(f.read(self.partial_bytes))
+                f.seek(-self.partial_bytes, os.SEEK_END)
+                digest.update(f.read(self.partial_bytes))
+        value = digest.hexdigest()
+        with self._lock:
+            self._partial[key] = value
+            self.files_hashed += 1
+            self.bytes_read += min(size, 2 * self.partial_bytes)
+            if size <= 2 * self.partial_bytes:
+                # The whole file was read, so this already is its full hash.
+                self._full[key] = value
+        return value
+
+    def full_hash(self, file_path: Path) -> str:
+        """SHA-256 of the whole file, as returned by category_cache.hash_file."""
+        key = self._key(file_path)
+        value = self._full.get(key)
+        if value is not None:
+            return value
+        value = hash_file(file_path)
+        with self._lock:
+            self._full[key] = value
+            self.bytes_read += key[1]
+        return value
+
+    def group(self, file_paths: list, earlier: Optional[dict] = None) -> dict:
+        """
+        Returns {original: [files identical to it]} for the groups of identical files in file_paths.
+        The original is the first of the group in file_paths order.
+        :param earlier: {size: [files]} of the previous calls, for files given in chunks. Files of file_paths identical
+            to one of them are returned as its copies, and the other files of file_paths are added to it.
+        """
+        by_size = defaultdict(list)
+        for file_path in file_paths:
+            try:
+                size = os.stat(file_path).st_size
+            except OSError:
+                continue
+            self.files_seen += 1
+            if size:
+                by_size[size].append(file_path)
+
+        copies = {}
+        for size, new in by_size.items():
+            same_size = new if earlier is None else earlier.get(size, []) + new
+            if earlier is not None:
+                earlier[size] = same_size
+            if len(same_size) < 2:
+                continue
+            is_copy = set()
+            by_partial = defaultdict(list)
+            for file_path in same_size:
+                try:
+                    by_partial[self.partial_hash(file_path)].append(file_path)
+                except OSError:
+                    continue
+            for same_partial in by_partial.values():
+                if len(same_partial) < 2:
+                    continue
+                by_content = defaultdict(list)
+                for file_path in same_partial:
+                    try:
+                        by_content[self.full_hash(file_path)].append(file_path)
+                    except OSError:
+                        continue
+                for identical in by_content.values():
+                    if len(identical) > 1:
+                        copies[identical[0]] = identical[1:]
+                        is_copy.update(identical[1:])
+                        self._count(len(identical) - 1, size)
+            if earlier is not None:
+                # Only the originals are kept, a later copy is found by its original.
+                earlier[size] = [file_path for file_path in same_size if file_path not in is_copy]
+        return copies
+
+    def forget_folders(self):
+        """Drops the folder listings, they are out of date once files have been moved."""
+        self._folders = {}
+
+    def _folder_sizes(self, folder: Path) -> dict:
+        sizes = self._folders.get(folder)
+        if sizes is None:
+            sizes = self._folders[folder] = defaultdict(list)
+            try:
+                with os.scandir(folder) as iterator:
+                    for entry in iterator:
+                        if not entry.name.startswith('.') and entry.is_file(follow_symlinks=False):
+                            sizes[entry.stat().st_size].append(Path(entry.path))
+                            self.folder_files_seen += 1
+            except OSError:
+                pass
+        return sizes
+
+    def find_identical(self, file_path: Path, folder: Path) -> Optional[Path]:
+        """Returns a file in the folder with the same content as file_path, or None. Only same size files are read."""
+        try:
+            size = os.stat(file_path).st_size
+        except OSError:
+            return None
+        candidates = [candidate for candidate in self._folder_sizes(folder).get(size, []) if candidate != file_path]
+        if not size or not candidates:
+            return None
+        try:
+            partial = self.partial_hash(file_path)
+            for candidate in candidates:
+                if self.partial_hash(candidate) == partial and self.full_hash(candidate) == self.full_hash(file_path):
+                    self._count(1, size)
+                    return candidate
+        except OSError:
+            pass
+        return None
+
+    def _count(self, files: int, size: int):
+        with self._lock:
+            self.duplicates += files
+            self.duplicate_bytes += files * size
+
+    def stats(self) -> str:
+        return (f"Duplicates: {self.duplicates} files ({self.duplicate_bytes / 1024 / 1024:.1f} MiB) identical to another file, "
+                f"{self.files_hashed} of {self.files_seen + self.folder_files_seen} files had to be compared "
+                f"({self.files_seen} to sort, {self.folder_files_seen} already in the destination folders, "
+                f"{self.bytes_read / 1024 / 1024:.1f} MiB hashed)")
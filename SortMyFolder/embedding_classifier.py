@@ -0,0 +1,96 @@
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+DEFAULT_EMBEDDING_MODEL = os.getenv("LM_STUDIO_EMBEDDING_MODEL", "text-embedding-nomic-embed-text-v1.5")
+
+
+def _normalize(vector: list) -> list:
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+
+def _dot(a: list, b: list) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class EmbeddingClassifier:
+    """
+    Nearest-centroid classifier over the existing folders, using an OpenAI compatible embeddings endpoint
+    (LM Studio's /v1/embeddings). Every folder gets the normalized mean embedding of a sample of the files already in it.
+    A new file is assigned to the closest folder only when the match is clearly better than the runner up,
+    everything else is left for the chat model.
+    """
+
+    def __init__(self, client, model: str = DEFAULT_EMBEDDING_MODEL, min_similarity: float = 0.75,
+                 min_margin: float = 0.05, samples_per_folder: int = 20, min_samples: int = 2,
+                 call: Optional[Callable[[Callable], object]] = None):
+        """
+        :param call: Sends a request (a function calling the client) and returns its response, e.g.
+            SmartSorter._call_with_retry so embeddings go through the same limiter, breaker and backoff as chat requests.
+            By default the request is sent as is.
+        """
+        self.client = client
+        self.call = call or (lambda request: request())
+        self.model = model
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.samples_per_folder = samples_per_folder
+        self.min_samples = min_samples
+        self.centroids = {}
+        self.fast_path = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list) -> list:
+        """Embeds the texts with one request and returns normalized vectors."""
+        response = self.call(lambda: self.client.embeddings.create(model=self.model, input=texts))
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [_normalize(item.embedding) for item in ordered]
+
+    def build(self, root: Path, folders: set, describe: Callable[[Path], str]) -> int:
+        """
+        Computes the centroid of every folder from up to samples_per_folder of the files inside it.
+        :param describe: Turns a file into the text to embed, e.g. its name and the start of its content.
+        :return: Number of folders with a centroid.
+        """
+        self.centroids = {}
+        for folder in sorted(folders):
+            samples = []
+            try:
+                with os.scandir(root / folder) as iterator:
+                    for entry in iterator:
+                        if entry.is_file() and not entry.name.startswith('.'):
+                            samples.append(describe(Path(entry.path)))
+                            if len(samples) >= self.samples_per_folder:
+                                break
+            except OSError:
+                continue
+            if len(samples) < self.min_samples:
+                continue
+            vectors = self.embed(samples)
+            centroid = [sum(values) / len(vectors) for values in zip(*vectors)]
+            self.centroids[folder] = _normalize(centroid)
+        return len(self.centroids)
+
+    def classify(self, text: str) -> Optional[Tuple[str, float]]:
+        """Returns (folder, similarity) for a confident match, or None to escalate to the chat model."""
+        if not self.centroids:
+            return None
+        vector = self.embed([text])[0]
+        scores = sorted(((_dot(vector, centroid), folder) for folder, centroid in self.centroids.items()), reverse=True)
+        best_score, best_folder = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else -1.0
+        confident = best_score >= self.min_similarity and best_score - runner_up >= self.min_margin
+        with self._lock:
+            if confident:
+                self.fast_path += 1
+            else:
+                self.escalated += 1
+        return (best_folder, best_score) if confident else None
+
+    def stats(self) -> str:
+        return (f"Embeddings: {len(self.centroids)} folder centroids, {self.fast_path} files matched directly, "
+                f"{self.escalated} escalated to the chat model")
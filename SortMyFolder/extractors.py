@@ -0,0 +1,182 @@
+"""
+Content extraction for SmartSorter. Everything here reads as little of the file as it can:
+images are decoded at reduced size and re-encoded as small JPEG thumbnails, PDFs only parse their first page,
+and Office files and text files read at most MAX_BYTES_PER_FILE of the parts they need.
+PDFs and images are not capped: PyPDF2 reads the cross-reference table and trailer at the end of the file besides
+the objects of the first page, and PIL reads all the compressed image data even when it decodes at reduced size.
+"""
+
+import base64
+import html
+import io
+import os
+import re
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import PyPDF2
+from PIL import Image, ExifTags
+
+IMAGE_MAX_EDGE = int(os.getenv("SORTER_IMAGE_MAX_EDGE", "768"))
+MAX_BYTES_PER_FILE = int(os.getenv("SORTER_MAX_BYTES_PER_FILE", str(256 * 1024)))
+TEXT_EXTENSIONS = ['.txt', '.md', '.py', '.json', '.csv', '.html', '.css', '.js', '.ipynb', '.sql']
+
+_EXIF_TAGS = {name: tag for tag, name in ExifTags.TAGS.items()}
+_DOCX_TEXT = re.compile(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>')
+_XLSX_SHARED_STRING = re.compile(r'<si>(.*?)</si>', re.DOTALL)
+_XLSX_TEXT = re.compile(r'<t(?:\s[^>]*)?>([^<]*)</t>')
+_XLSX_CELL = re.compile(r'<c\s([^>]*?)(?:/>|>(.*?)</c>)', re.DOTALL)
+_XLSX_SHEET_NAME = re.compile(r'<sheet\s[^>]*name="([^"]*)"')
+
+
+def encode_image(image_path: Path, max_edge: int = IMAGE_MAX_EDGE) -> Optional[str]:
+    """
+    Returns a base64 JPEG thumbnail whose longest edge is at most max_edge, or None if PIL can not read the image.
+    JPEGs are decoded at reduced scale (draft mode), so large photos are never fully decoded.
+    """
+    try:
+        with Image.open(image_path) as image:
+            image.draft('RGB', (max_edge, max_edge))
+            image.thumbnail((max_edge, max_edge))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=80)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    except Exception:
+        return None
+
+
+def image_hints(image_path: Path) -> str:
+    """Returns a short description from the image metadata, e.g. 'Taken 2023:05:01 10:00:00 with Apple iPhone 12, 4032x3024'."""
+    try:
+        with Image.open(image_path) as image:
+            width, height = image.size
+            exif = image.getexif()
+            taken = exif.get(_EXIF_TAGS['DateTime'])
+            # DateTimeOriginal lives in the Exif sub IFD.
+            taken = exif.get_ifd(0x8769).get(_EXIF_TAGS['DateTimeOriginal'], taken)
+            camera = " ".join(str(exif[_EXIF_TAGS[tag]]).strip() for tag in ('Make', 'Model') if _EXIF_TAGS[tag] in exif)
+            has_gps = 0x8825 in exif
+    except Exception:
+        return ""
+    hints = []
+    if taken:
+        hints.append(f"Taken {taken}")
+    if camera:
+        hints.append(f"with {camera}")
+    if has_gps:
+        hints.append("has GPS location")
+    hints.append(f"{width}x{height}")
+    return ", ".join(hints)
+
+
+def _first_pdf_page(reader: PyPDF2.PdfReader) -> Optional[PyPDF2.PageObject]:
+    """
+    Walks down the first /Kids of the page tree to page one, instead of reader.pages which flattens the whole tree.
+    Inheritable attributes of the parents are copied to the returned page like PdfReader does, the reader is not modified.
+    """
+    inheritable = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+    inherited = {}
+    node = reader.trailer['/Root'].get_object()['/Pages'].get_object()
+    reference = None
+    while node.get('/Type', '/Pages') == '/Pages':
+        for attribute in inheritable:
+            if attribute in node:
+                inherited[attribute] = node[attribute]
+        kids = node.get('/Kids')
+        if not kids:
+            return None
+        reference = kids[0]
+        node = reference.get_object()
+    # The inherited attributes go on a copy, the page object cached by the reader stays as it is in the file.
+    page = PyPDF2.PageObject(reader, reference)
+    page.update(node)
+    for attribute, value in inherited.items():
+        if attribute not in page:
+            page[PyPDF2.generic.NameObject(attribute)] = value
+    return page
+
+
+def extract_pdf_text(file_path: Path, max_chars: int = 1000) -> str:
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        try:
+            page = _first_pdf_page(reader)
+        except Exception:
+            page = reader.pages[0] if len(reader.pages) > 0 else None
+        return (page.extract_text() or "")[:max_chars] if page is not None else ""
+
+
+def _read_zip_member(archive: zipfile.ZipFile, name: str, stop_at: Optional[str] = None) -> str:
+    """Reads a member of the archive up to MAX_BYTES_PER_FILE, or until stop_at has been seen."""
+    chunks, total = [], 0
+    with archive.open(name) as member:
+        while total < MAX_BYTES_PER_FILE:
+            chunk = member.read(min(64 * 1024, MAX_BYTES_PER_FILE - total))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            total += len(chunk)
+            if stop_at and stop_at.encode() in b"".join(chunks[-2:]):
+                break
+    return b"".join(chunks).decode('utf-8', errors='ignore')
+
+
+def extract_docx_text(file_path: Path, max_chars: int = 1000) -> str:
+    with zipfile.ZipFile(file_path) as archive:
+        xml = _read_zip_member(archive, 'word/document.xml')
+    text, length = [], 0
+    for paragraph in re.split(r'</w:p>', xml):
+        line = "".join(html.unescape(part) for part in _DOCX_TEXT.findall(paragraph)).strip()
+        if line:
+            text.append(line)
+            length += len(line) + 1
+            if length >= max_chars:
+                break
+    return "\n".join(text)[:max_chars]
+
+
+def extract_xlsx_headers(file_path: Path, max_chars: int = 1000) -> str:
+    """Returns the sheet names and the first row of the first sheet."""
+    with zipfile.ZipFile(file_path) as archive:
+        names = set(archive.namelist())
+        sheets = _XLSX_SHEET_NAME.findall(_read_zip_member(archive, 'xl/workbook.xml')) if 'xl/workbook.xml' in names else []
+        first_row = _read_zip_member(archive, 'xl/worksheets/sheet1.xml', stop_at='</row>') if 'xl/worksheets/sheet1.xml' in names else ""
+        first_row = first_row.split('</row>')[0]
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            shared = ["".join(_XLSX_TEXT.findall(item)) for item in
+                      _XLSX_SHARED_STRING.findall(_read_zip_member(archive, 'xl/sharedStrings.xml'))]
+
+    headers = []
+    for attributes, body in _XLSX_CELL.findall(first_row):
+        value = re.search(r'<v>([^<]*)</v>', body or "")
+        if 't="s"' in attributes and value and value.group(1).isdigit():
+            index = int(value.group(1))
+            headers.append(shared[index] if index < len(shared) else "")
+        elif 't="inlineStr"' in attributes:
+            headers.append("".join(_XLSX_TEXT.findall(body or "")))
+        elif value:
+            headers.append(value.group(1))
+    text = f"Sheets: {', '.join(html.unescape(name) for name in sheets)}\nHeaders: {', '.join(html.unescape(h) for h in headers if h)}"
+    return text[:max_chars]
+
+
+def extract_text(file_path: Path, max_chars: int = 1000) -> str:
+    """Returns up to max_chars characters of text from PDF, Office and text files, or an empty string."""
+    suffix = file_path.suffix.lower()
+    try:
+        if suffix == '.pdf':
+            return extract_pdf_text(file_path, max_chars)
+        if suffix == '.docx':
+            return extract_docx_text(file_path, max_chars)
+        if suffix == '.xlsx':
+            return extract_xlsx_headers(file_path, max_chars)
+        if suffix in TEXT_EXTENSIONS:
+            with open(file_path, 'r', errors='ignore') as f:
+                return f.read(min(max_chars, MAX_BYTES_PER_FILE))
+    except Exception:
+        pass
+    return ""
@@ -1,13 +1,34 @@
 import argparse
 import sys
+import time
 from pathlib import Path
 from sorter import SmartSorter
+from move_journal import MoveJournal
+from watcher import FolderWatcher
 
 def main():
     parser = argparse.ArgumentParser(description="Smart File Sorter using Gemini")
     parser.add_argument('--path', type=str, default='.', help="Path to the directory to sort (default: current directory)")
     parser.add_argument('--smart', action='store_true', help="Enable AI-based sorting (slower but smarter)")
     parser.add_argument('--wet-run', action='store_true', help="Actually move files (default is DRY RUN)")
+    parser.add_argument('--workers', type=int, default=1, help="Number of files categorized concurrently (default: 1, one at a time)")
+    parser.add_argument('--batch-size', type=int, default=1, help="Number of text files categorized with one LLM request (default: 1)")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the on-disk category cache")
+    parser.add_argument('--embeddings', action='store_true', help="Match files to existing folders with embeddings first, only ask the chat model when unsure")
+    parser.add_argument('--recursive', action='store_true', help="Also sort files in sub directories, into category folders under --path")
+    parser.add_argument('--max-depth', type=int, default=None, help="Maximum depth for --recursive (default: no limit)")
+    parser.add_argument('--include', action='append', default=None, help="Only sort files matching this glob (repeatable), e.g. '*.pdf'")
+    parser.add_argument('--exclude', action='append', default=None, help="Skip files and directories matching this glob (repeatable)")
+    parser.add_argument('--min-size', type=int, default=None, help="Skip files smaller than this many bytes")
+    parser.add_argument('--max-size', type=int, default=None, help="Skip files larger than this many bytes")
+    parser.add_argument('--min-age-days', type=float, default=None, help="Skip files modified less than this many days ago")
+    parser.add_argument('--max-age-days', type=float, default=None, help="Skip files modified more than this many days ago")
+    parser.add_argument('--undo', action='store_true', help="Move the files of the last run back (with --wet-run)")
+    parser.add_argument('--no-resume', action='store_true', help="Start over instead of resuming an interrupted run")
+    parser.add_argument('--duplicates', choices=['keep', 'skip', 'link'], default='keep',
+                        help="Files identical to one already sorted: move them anyway (keep, default), leave them in place (skip), or leave them as hard links to the sorted copy (link)")
+    parser.add_argument('--watch', action='store_true', help="After sorting, keep running and sort new files as they arrive")
+    parser.add_argument('--settle-seconds', type=float, default=2.0, help="In --watch mode, wait until a file has not changed for this long (default: 2)")
     
     args = parser.parse_args()
     
@@ -21,38 +42,113 @@ def main():
     print(f"Target: {target_path}")
     print(f"Mode: {'SMART (AI)' if args.smart else 'BASIC (Extension)'}")
     print(f"Action: {'MOVING FILES' if args.wet_run else 'DRY RUN (No changes)'}")
+    print(f"Workers: {args.workers}")
     print("-------------------------")
 
+    if args.undo:
+        undo_last_run(target_path, dry_run=not args.wet_run)
+        return
+
     try:
-        sorter = SmartSorter()
+        sorter = SmartSorter(use_cache=not args.no_cache)
         
         # Scan for existing folders to prime the AI
         sorter.scan_existing_folders(target_path)
+        if args.smart and args.embeddings:
+            sorter.enable_embedding_fast_path(target_path)
         
-        # Generator to iterate through files
+        # Moves are planned first and recorded in a journal, so an interrupted run can resume and be undone.
+        journal = None
+        last_journal = MoveJournal.latest(target_path)
+        if args.wet_run and last_journal and not args.no_resume:
+            journal = MoveJournal(last_journal)
+            if journal.is_complete:
+                journal = None
+            else:
+                print(f"Resuming {last_journal.name}: {len(journal.done)} of {len(journal.moves)} planned moves done")
+        if journal is None:
+            # Dry runs only keep the plan in memory.
+            journal = MoveJournal(MoveJournal.new_path(target_path) if args.wet_run else None)
+
+        start_time = time.perf_counter()
         file_count = 0
-        for file_path in sorter.scan_directory(target_path):
-            file_count += 1
-            # In dry run, we just print intent. In wet run, we move.
-            # But the sorter.sort_file method handles printing and wet/dry logic if we pass it down
-            # Let's adjust usage slightly to fit the method signature I wrote
-            
-            # Re-reading my own implementation of sort_file:
-            # def sort_file(self, file_path: Path, use_smart: bool = False, dry_run: bool = True):
-            
-            # So I need to pass 'not args.wet_run' as dry_run
-            sorter.sort_file(file_path, use_smart=args.smart, dry_run=not args.wet_run)
-            
-        if file_count == 0:
+        if not journal.is_planned:
+            files = sorter.scan_directory(target_path, recursive=args.recursive, include=args.include, exclude=args.exclude,
+                                          min_size=args.min_size, max_size=args.max_size, min_age_days=args.min_age_days,
+                                          max_age_days=args.max_age_days, max_depth=args.max_depth)
+            # Files planned before an interruption are not categorized again.
+            files = (file_path for file_path in files if not journal.knows(file_path))
+            # In recursive mode files from sub directories go to the category folders at the top.
+            dest_root = target_path if args.recursive else None
+
+            # Files are categorized concurrently, destinations are still picked one by one in scan order.
+            file_count = sorter.plan_moves(files, journal, use_smart=args.smart, workers=args.workers,
+                                           batch_size=args.batch_size, dest_root=dest_root, duplicates=args.duplicates)
+            journal.mark_planned()
+
+        print(f"-------------------------\nApplying {len(journal.pending())} moves...")
+        moved = journal.apply(dry_run=not args.wet_run)
+        journal.close()
+        elapsed = time.perf_counter() - start_time
+
+        if file_count == 0 and not journal.moves:
             print("No files found to sort.")
         else:
-            print(f"-------------------------\nProcessed {file_count} files.")
+            print(f"-------------------------\nProcessed {file_count} files in {elapsed:.1f}s ({file_count / elapsed:.2f} files/s).")
+            if args.wet_run:
+                print(f"Moved {moved} files, journal: {journal.path} (undo with --undo --wet-run)")
+            if journal.failed:
+                print(f"{len(journal.failed)} moves failed, run again to retry them:")
+                for move_id, error in journal.failed.items():
+                    print(f"  {journal.moves[move_id]['src']}: {error}")
+        print(sorter.duplicate_finder.stats())
+        if args.smart and sorter.cache:
+            print(sorter.cache.stats())
+        if sorter.embedding_classifier:
+            print(sorter.embedding_classifier.stats())
+        if args.smart and sorter.client:
+            print(sorter.limiter.stats())
+            print(sorter.breaker.stats())
+
+        if args.watch:
+            watch_journal = MoveJournal(MoveJournal.new_path(target_path) if args.wet_run else None)
+            watcher = FolderWatcher(sorter, target_path, watch_journal, use_smart=args.smart, dry_run=not args.wet_run,
+                                    recursive=args.recursive, max_depth=args.max_depth,
+                                    dest_root=target_path if args.recursive else None, workers=args.workers,
+                                    batch_size=args.batch_size, duplicates=args.duplicates,
+                                    settle_seconds=args.settle_seconds,
+                                    include=args.include, exclude=args.exclude, min_size=args.min_size,
+                                    max_size=args.max_size, min_age_days=args.min_age_days, max_age_days=args.max_age_days)
+            try:
+                watched = watcher.run()
+            except KeyboardInterrupt:
+                watched = watcher.sorted_count
+            print(f"\nStopped watching, sorted {watched} new files.")
 
     except KeyboardInterrupt:
         print("\nOperation cancelled.")
+        if args.wet_run:
+            print("Run the same command again to resume.")
     except Exception as e:
         print(f"\nAn error occurred: {e}")
 
+
+def undo_last_run(target_path: Path, dry_run: bool = True):
+    """Moves the files of the most recent journal back to where they were."""
+    journal_path = MoveJournal.latest(target_path)
+    if journal_path is None:
+        print("No previous run to undo.")
+        return
+    journal = MoveJournal(journal_path)
+    if journal.is_undone:
+        print(f"{journal_path.name} was already undone.")
+        return
+    print(f"Undoing {journal_path.name} ({len(journal.done)} files moved)")
+    restored = journal.undo(dry_run=dry_run)
+    journal.close()
+    if not dry_run:
+        print(f"Restored {restored} files.")
+
 if __name__ == "__main__":
     main()
 
@@ -68,4 +164,36 @@ python main.py --path ~/Downloads --smart
 Run (Real Action): Add --wet-run to actually move files.
 python main.py --path ~/Downloads --smart --wet-run
 
+Run (Faster): Add --workers to categorize several files at the same time.
+python main.py --path ~/Downloads --smart --wet-run --workers 8
+
+Run (Fewer Requests): Add --batch-size to send several text files in one request.
+python main.py --path ~/Downloads --smart --wet-run --workers 2 --batch-size 8
+
+Run (Fast Path): Add --embeddings to match files to existing folders without the chat model when confident.
+Set LM_STUDIO_EMBEDDING_MODEL to the embedding model loaded in LM Studio.
+python main.py --path ~/Downloads --smart --wet-run --embeddings
+
+Run (Whole Tree): Add --recursive to also sort sub directories, with optional filters.
+python main.py --path ~/Downloads --recursive --max-depth 3 --include '*.pdf' --exclude 'node_modules' --min-age-days 7
+
+Resume / Undo: Wet runs are recorded in <path>/.sortmyfolder/. Running the same command again after an interruption
+resumes without categorizing the planned files again (--no-resume starts over), and --undo puts the last run back.
+python main.py --path ~/Downloads --undo --wet-run
+
+Run (Watch): Add --watch to keep running and sort new files as soon as they are completely written, instead of a cron job.
+Uses filesystem events with `pip install watchdog`, otherwise polls the folder every few seconds.
+python main.py --path ~/Downloads --smart --wet-run --watch
+
+Duplicates: Files with the same content as one already sorted are reported. --duplicates skip leaves them where they are,
+--duplicates link replaces them by hard links to the sorted copy (undone by --undo like the moves).
+python main.py --path ~/Downloads --smart --wet-run --duplicates skip
+
+Content Limits: Images are sent to the model as thumbnails of at most SORTER_IMAGE_MAX_EDGE pixels (default 768),
+and no more than SORTER_MAX_BYTES_PER_FILE bytes (default 256 KiB) are read from any document.
+
+Server Health: Requests to LM Studio adapt their concurrency (at most SORTER_MAX_CONCURRENCY, default 8) to its latency.
+After SORTER_BREAKER_FAILURES failed requests in a row (default 5) the run sorts by extension and checks again after
+SORTER_BREAKER_RESET_SECONDS (default 30). LM_STUDIO_TIMEOUT sets the request timeout (default 60 seconds).
+
 """
\ No newline at end of file
@@ -0,0 +1,283 @@
+import errno
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+JOURNAL_DIR_NAME = ".sortmyfolder"
+
+
+def names_in(directory: Path) -> set:
+    """
+    Returns the casefolded names in the directory, an empty set if it does not exist.
+    Casefolded so a name that only differs in case is treated as taken, like on the default macOS and Windows filesystems.
+    """
+    try:
+        with os.scandir(directory) as iterator:
+            return {entry.name.casefold() for entry in iterator}
+    except OSError:
+        return set()
+
+
+def _replace_with_link(file_path: Path, target: Path):
+    """Replaces the file by a hard link to target, atomically, so it takes no extra space."""
+    temporary = file_path.with_name(f".{file_path.name}.sortmyfolder-link")
+    os.link(target, temporary)
+    os.replace(temporary, file_path)
+
+
+def _replace_with_copy(file_path: Path):
+    """Turns a hard link back into an independent copy of the file."""
+    temporary = file_path.with_name(f".{file_path.name}.sortmyfolder-copy")
+    shutil.copy2(file_path, temporary)
+    os.replace(temporary, file_path)
+
+
+def _rename(src: Path, dst: Path):
+    """Moves a file, with a single rename on the same filesystem and a copy + delete across filesystems."""
+    if os.path.lexists(dst):
+        # os.rename silently replaces an existing file on POSIX.
+        raise FileExistsError(errno.EEXIST, "Destination already exists", str(dst))
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(src), str(dst))
+
+
+class MoveJournal:
+    """
+    Append-only JSON lines record of a sorting run, kept in <target>/.sortmyfolder/journal-<time>.jsonl.
+
+    The run is split in two phases: every file is categorized and given a destination first ("move" entries,
+    or "duplicate" for files left in place because the same content is already sorted),
+    then the moves are applied ("done" entries). A move with action "link" does not move the file but replaces it
+    by a hard link to its identical copy. Entries are flushed as they are written and synced to disk
+    every checkpoint_every moves, so after a crash the next run picks up the same journal: files already planned
+    are not categorized again and moves already done are skipped. A finished journal can be undone.
+
+    A journal without a path is only kept in memory, which is what dry runs use.
+    """
+
+    def __init__(self, path: Optional[Path] = None, checkpoint_every: int = 20):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.moves = []         # Planned moves, in order: {"id", "src", "dst", "category"}
+        self.done = {}          # Move id -> destination it was moved to
+        self.failed = {}        # Move id -> error of its last attempt, in this process; retried by the next apply
+        self.undone = set()
+        self.created_dirs = []
+        self.is_planned = False
+        self.is_complete = False
+        self.is_undone = False
+        self.reserved = {}      # Destination directory -> casefolded names taken, see SmartSorter.resolve_destination
+        self._known = set()
+        self._file = None
+        self._unsynced = 0
+        self._valid_size = None
+        self._previewed = 0
+        if path and path.exists():
+            self._load()
+
+    @staticmethod
+    def journal_dir(root: Path) -> Path:
+        return root / JOURNAL_DIR_NAME
+
+    @classmethod
+    def new_path(cls, root: Path) -> Path:
+        # Microseconds, so a watch session started right after a run does not get the same name.
+        return cls.journal_dir(root) / f"journal-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}.jsonl"
+
+    @classmethod
+    def latest(cls, root: Path) -> Optional[Path]:
+        """Returns the most recent journal of the directory, or None."""
+        journals = sorted(cls.journal_dir(root).glob("journal-*.jsonl"))
+        return journals[-1] if journals else None
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash, everything before it is still valid and new entries go after it.
+                    self._valid_size = f.tell() - len(line)
+                    break
+                kind = entry.get("type")
+                if kind == "move":
+                    self.moves.append(entry)
+                    self._known.update((entry["src"], entry["dst"]))
+                elif kind == "duplicate":
+                    self._known.add(entry["src"])
+                elif kind == "done":
+                    self.done[entry["id"]] = entry["dst"]
+                elif kind == "undone":
+                    self.undone.add(entry["id"])
+                elif kind == "mkdir":
+                    self.created_dirs.append(entry["path"])
+                elif kind == "planned":
+                    self.is_planned = True
+                elif kind == "complete":
+                    self.is_complete = True
+                elif kind == "undo_complete":
+                    self.is_undone = True
+        for move in self.pending():
+            if move.get("action") == "link":
+                continue
+            dst = Path(move["dst"])
+            self.reserved.setdefault(dst.parent, names_in(dst.parent)).add(dst.name.casefold())
+
+    def _write(self, entry: dict, sync: bool = False):
+        if not self.path:
+            return
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a')
+            if self._valid_size is not None:
+                self._file.truncate(self._valid_size)
+                self._valid_size = None
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if sync or self._unsynced >= self.checkpoint_every:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._file:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def knows(self, file_path: Path) -> bool:
+        """True if the file is already planned, as a source or as a destination."""
+        return str(file_path) in self._known
+
+    def pending(self) -> list:
+        return [move for move in self.moves if move["id"] not in self.done]
+
+    def plan(self, file_path: Path, dest_path: Optional[Path], category: str):
+        """Records where a file goes. dest_path None means it is already in place, which is only printed."""
+        if dest_path is None:
+            print(f"  -> Already in place: {file_path.parent.name}/{file_path.name}")
+            return
+        move = {"type": "move", "id": len(self.moves), "src": str(file_path), "dst": str(dest_path), "category": category}
+        self.moves.append(move)
+        self._known.update((move["src"], move["dst"]))
+        self._write(move)
+
+    def plan_duplicate(self, file_path: Path, original: Path, category: str, link: bool = False):
+        """
+        Records a file with the same content as original, which is already sorted or will be by this run.
+        The file stays where it is, replaced by a hard link to original when link is True.
+        """
+        print(f"  = {file_path.name} is a duplicate of {original.parent.name}/{original.name}, left in place")
+        if link:
+            entry = {"type": "move", "id": len(self.moves), "src": str(file_path), "dst": str(original),
+                     "category": category, "action": "link"}
+            self.moves.append(entry)
+        else:
+            entry = {"type": "duplicate", "src": str(file_path), "of": str(original), "category": category}
+        self._known.add(str(file_path))
+        self._write(entry)
+
+    def mark_planned(self):
+        self.is_planned = True
+        self._write({"type": "planned", "moves": len(self.moves)}, sync=True)
+
+    def apply(self, dry_run: bool = True, complete: bool = True) -> int:
+        """
+        Applies the planned moves that are not done yet. Returns the number of files moved.
+        Moves that fail are kept in failed and the journal is not marked complete, so a resumed run retries them.
+        complete=False keeps the journal open for more moves, as watch mode does until it stops.
+        """
+        moved = 0
+        moves = self.pending()
+        if dry_run:
+            # Nothing is marked done in a dry run, moves already shown by an earlier call are not shown again.
+            moves = [move for move in moves if move["id"] >= self._previewed]
+            self._previewed = len(self.moves)
+        for move in moves:
+            src, dst = Path(move["src"]), Path(move["dst"])
+            if move.get("action") == "link":
+                print(f"  = Linking {src.name} to: {dst.parent.name}/{dst.name}")
+                if dry_run:
+                    continue
+                try:
+                    if not os.path.samefile(src, dst):
+                        _replace_with_link(src, dst)
+                except OSError as e:
+                    print(f"  [Link Error] {src.name}: {e}")
+                    self.failed[move["id"]] = str(e)
+                    continue
+                self._mark_done(move)
+                continue
+            print(f"  -> Moving to: {dst.parent.name}/{dst.name}")
+            if dry_run:
+                continue
+            if not os.path.lexists(src) and os.path.lexists(dst):
+                # Moved just before a crash, the "done" entry did not make it to the journal.
+                self._mark_done(move)
+                continue
+            try:
+                if not dst.parent.exists():
+                    dst.parent.mkdir(parents=True)
+                    self.created_dirs.append(str(dst.parent))
+                    self._write({"type": "mkdir", "path": str(dst.parent)})
+                _rename(src, dst)
+            except OSError as e:
+                print(f"  [Move Error] {src.name}: {e}")
+                self.failed[move["id"]] = str(e)
+                continue
+            self._mark_done(move)
+            moved += 1
+        if not dry_run and complete and not self.failed:
+            self.mark_complete()
+        return moved
+
+    def mark_complete(self):
+        self.is_complete = True
+        self._write({"type": "complete", "moved": len(self.done)}, sync=True)
+
+    def _mark_done(self, move: dict):
+        self.done[move["id"]] = move["dst"]
+        self.failed.pop(move["id"], None)
+        self._write({"type": "done", "id": move["id"], "dst": move["dst"]})
+
+    def undo(self, dry_run: bool = True) -> int:
+        """Moves every file of this journal back where it came from, newest first. Returns the number restored."""
+        restored = 0
+        for move in reversed(self.moves):
+            if move["id"] not in self.done or move["id"] in self.undone:
+                continue
+            src, dst = Path(move["src"]), Path(move["dst"])
+            print(f"  <- Restoring: {src.parent.name}/{src.name}")
+            if dry_run:
+                continue
+            try:
+                if move.get("action") == "link":
+                    _replace_with_copy(src)
+                else:
+                    src.parent.mkdir(parents=True, exist_ok=True)
+                    _rename(dst, src)
+            except OSError as e:
+                print(f"  [Undo Error] {dst.name}: {e}")
+                continue
+            self.undone.add(move["id"])
+            self._write({"type": "undone", "id": move["id"]})
+            restored += 1
+        if not dry_run:
+            # Folders created by the run are removed again, if nothing else was put in them since.
+            for directory in reversed(self.created_dirs):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+            self.is_undone = True
+            self._write({"type": "undo_complete", "restored": len(self.undone)}, sync=True)
+        return restored
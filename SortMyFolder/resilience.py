@@ -0,0 +1,149 @@
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("SORTER_MAX_CONCURRENCY", "8"))
+DEFAULT_FAILURE_THRESHOLD = int(os.getenv("SORTER_BREAKER_FAILURES", "5"))
+DEFAULT_RESET_SECONDS = float(os.getenv("SORTER_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the server while the circuit breaker is open."""
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter: a random delay between 0 and min(cap, base * 2^attempt) seconds."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of concurrent requests to the server, adjusting the limit with AIMD:
+    every fast successful request adds 1/limit (about +1 per round of requests), an error or a request slower
+    than `tolerance` times the best latency seen halves it, at most once per round.
+    So the run finds out how many requests the local server handles well instead of queueing them all on it.
+    """
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = DEFAULT_MAX_CONCURRENCY,
+                 tolerance: float = 2.0):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.decreases = 0
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Waits for a free slot. Returns the start time to pass to release."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, success: Optional[bool]):
+        """success None frees the slot without adjusting the limit, for answers that say nothing about the load."""
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self._cond.notify_all()
+            if success is None:
+                return
+            if success:
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    # Drift up slowly, so one unusually fast answer does not keep the limit down for the whole run.
+                    self._baseline += (latency - self._baseline) * 0.05
+                overloaded = latency > self._baseline * self.tolerance
+            else:
+                self.errors += 1
+                overloaded = True
+
+            if overloaded:
+                # Requests of the same round fail together, only react once to them.
+                if now - self._last_decrease > latency:
+                    self.limit = max(float(self.min_limit), self.limit / 2)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                self._cond.notify_all()
+
+    def stats(self) -> str:
+        return (f"Requests: {self.requests} sent, {self.errors} failed, concurrency limit {int(self.limit)} "
+                f"(lowered {self.decreases} times)")
+
+
+class CircuitBreaker:
+    """
+    Stops calling a server that keeps failing.
+    After failure_threshold consecutive failures the circuit opens and allow() returns False, so callers fall back
+    right away. After reset_seconds a single probe request is let through: if it succeeds the circuit closes,
+    otherwise it stays open for twice as long (up to max_reset_seconds).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_seconds: float = DEFAULT_RESET_SECONDS,
+                 max_reset_seconds: float = 300.0, name: str = "LM Studio"):
+        self.failure_threshold = failure_threshold
+        self.base_reset_seconds = reset_seconds
+        self.reset_seconds = reset_seconds
+        self.max_reset_seconds = max_reset_seconds
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True while calls should not even be tried. Does not use up the probe, unlike allow()."""
+        with self._lock:
+            return self.state == self.HALF_OPEN or (
+                self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_seconds)
+
+    def allow(self) -> bool:
+        """True if a request may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                # This caller is the probe, everyone else keeps falling back until it is answered.
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"⚡ {self.name} is answering again, back to smart sorting.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.reset_seconds = self.base_reset_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.reset_seconds = min(self.max_reset_seconds, self.reset_seconds * 2)
+            elif self.state == self.OPEN or self.failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.trips += 1
+            print(f"⚡ {self.name} looks unhealthy, sorting by extension for now "
+                  f"(next check in {self.reset_seconds:.0f}s).")
+
+    def stats(self) -> str:
+        return f"Circuit breaker: {self.state}, opened {self.trips} times"
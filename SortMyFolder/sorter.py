@@ -1,46 +1,88 @@
 import os
+import fnmatch
+import re
 import shutil
 import mimetypes
 import time
-import base64
+import json
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 from dotenv import load_dotenv
-from PIL import Image
-import PyPDF2
-from openai import OpenAI
+from openai import OpenAI, APIStatusError
+from category_cache import CategoryCache, DEFAULT_CACHE_PATH
+from embedding_classifier import EmbeddingClassifier
+from extractors import encode_image, extract_text, image_hints
+from move_journal import names_in
+from dedup import DuplicateFinder
+from resilience import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, backoff_delay
 
 # Load environment variables
 load_dotenv()
 
+# Bump when the system prompt changes, so cached categories from the old prompt are not reused.
+PROMPT_VERSION = "1"
+# Characters of each file sent in a batch request, less than for a single file to keep the prompt small.
+BATCH_SNIPPET_CHARS = 600
+# Seconds before a request to LM Studio is given up. Retries are done by _generate_with_retry, not by the client.
+REQUEST_TIMEOUT = float(os.getenv("LM_STUDIO_TIMEOUT", "60"))
+# Files plan_moves takes from the scan at a time, so categorizing starts before the scan of a large tree is done.
+PLAN_CHUNK_SIZE = 1000
+
 class SmartSorter:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, use_cache: bool = True, cache_path: Optional[str] = None,
+                 connect: bool = True):
+        """
+        :param connect: False does not create the LM Studio client, for scanning and extension based sorting.
+            Smart sorting then falls back to the extension categories, as when LM Studio can not be reached.
+        """
         # Point to LM Studio local server
         self.base_url = os.getenv("LM_STUDIO_URL", "http://localhost:1234/v1")
         self.api_key = os.getenv("LM_STUDIO_API_KEY", "lm-studio") # Key doesn't matter for local
         
-        try:
-            self.client = OpenAI(base_url=self.base_url, api_key=self.api_key)
-            print(f"Connected to LM Studio at {self.base_url}")
-            # Try to get the loaded model ID, fallback to user env or default
+        self.client = None
+        self.model_name = os.getenv("LM_STUDIO_MODEL", "local-model")
+        if connect:
             try:
-                models = self.client.models.list()
-                if models.data:
-                    self.model_name = models.data[0].id
-                    print(f"Using loaded model: {self.model_name}")
-                else:
+                self.client = OpenAI(base_url=self.base_url, api_key=self.api_key, timeout=REQUEST_TIMEOUT, max_retries=0)
+                print(f"Connected to LM Studio at {self.base_url}")
+                # Try to get the loaded model ID, fallback to user env or default
+                try:
+                    models = self.client.models.list()
+                    if models.data:
+                        self.model_name = models.data[0].id
+                        print(f"Using loaded model: {self.model_name}")
+                    else:
+                        self.model_name = os.getenv("LM_STUDIO_MODEL", "local-model")
+                        print(f"No models found in list. Using configured name: {self.model_name}")
+                except Exception as e:
                     self.model_name = os.getenv("LM_STUDIO_MODEL", "local-model")
-                    print(f"No models found in list. Using configured name: {self.model_name}")
-            except Exception as e:
-                self.model_name = os.getenv("LM_STUDIO_MODEL", "local-model")
-                print(f"Could not auto-detect model: {e}. Using configured name: {self.model_name}")
+                    print(f"Could not auto-detect model: {e}. Using configured name: {self.model_name}")
 
-        except Exception as e:
-            print(f"Warning: Could not connect to LM Studio: {e}")
-            self.client = None
+            except Exception as e:
+                print(f"Warning: Could not connect to LM Studio: {e}")
+                self.client = None
 
         self.existing_folders = set()
 
+        self.embedding_classifier = None
+
+        # Remembers content hashes, shared by duplicate detection and the category cache.
+        self.duplicate_finder = DuplicateFinder()
+
+        # Shared by all worker threads: how many requests LM Studio gets at once, and whether it gets any at all.
+        self.limiter = AdaptiveLimiter()
+        self.breaker = CircuitBreaker()
+
+        self.cache = None
+        if use_cache:
+            try:
+                self.cache = CategoryCache(cache_path or DEFAULT_CACHE_PATH)
+            except Exception as e:
+                print(f"Warning: Could not open category cache: {e}")
+
         # Basic extension mapping
         self.EXT_MAP = {
             'Images': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.heic', '.webp'],
@@ -52,15 +94,96 @@ class SmartSorter:
             'Code': ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c', '.json', '.xml', '.yaml', '.yml', '.sql', '.ipynb']
         }
 
-    def scan_directory(self, path: Path):
-        """Yields files from the directory."""
+    def file_filter(self, path: Path, include: Optional[list] = None, exclude: Optional[list] = None,
+                    min_size: Optional[int] = None, max_size: Optional[int] = None,
+                    min_age_days: Optional[float] = None, max_age_days: Optional[float] = None):
+        """
+        Builds the filters of scan_directory, also used by watch mode for single files.
+        Returns (skip, accept): skip(full_path, name) is True for hidden and excluded files and directories,
+        accept(full_path, name, stat) is True if a file passes the include, size and age filters,
+        stat being a function returning its os.stat_result (DirEntry.stat, or a Path's stat).
+        """
+        root = str(path)
+        prefix_length = len(os.path.join(root, ''))
+
+        def compile_patterns(patterns: Optional[list]) -> list:
+            # (matches the relative path?, compiled pattern), compiled once instead of per file.
+            return [('/' in pattern, re.compile(fnmatch.translate(pattern))) for pattern in patterns or []]
+
+        include_patterns, exclude_patterns = compile_patterns(include), compile_patterns(exclude)
+        check_stat = min_size is not None or max_size is not None or min_age_days is not None or max_age_days is not None
+
+        def matches(patterns: list, full_path: str, name: str) -> bool:
+            for on_relative_path, pattern in patterns:
+                target = full_path[prefix_length:].replace(os.sep, '/') if on_relative_path else name
+                if pattern.match(target):
+                    return True
+            return False
+
+        def skip(full_path: str, name: str) -> bool:
+            return name.startswith('.') or bool(exclude_patterns and matches(exclude_patterns, full_path, name))
+
+        def accept(full_path: str, name: str, stat) -> bool:
+            if include_patterns and not matches(include_patterns, full_path, name):
+                return False
+            if not check_stat:
+                return True
+            stat = stat()
+            if min_size is not None and stat.st_size < min_size:
+                return False
+            if max_size is not None and stat.st_size > max_size:
+                return False
+            age_days = (time.time() - stat.st_mtime) / 86400
+            if min_age_days is not None and age_days < min_age_days:
+                return False
+            if max_age_days is not None and age_days > max_age_days:
+                return False
+            return True
+
+        return skip, accept
+
+    def scan_directory(self, path: Path, recursive: bool = False, include: Optional[list] = None,
+                       exclude: Optional[list] = None, min_size: Optional[int] = None, max_size: Optional[int] = None,
+                       min_age_days: Optional[float] = None, max_age_days: Optional[float] = None,
+                       max_depth: Optional[int] = None):
+        """
+        Yields files from the directory, lazily, using os.scandir.
+        The DirEntry type and stat info cached by scandir are reused, so filtering costs at most one stat per file.
+        :param recursive: Also walk sub directories (hidden ones are skipped).
+        :param include: Glob patterns a file must match, on its name or its path relative to `path` if the pattern has a '/'.
+        :param exclude: Glob patterns for files and directories to skip, matched the same way.
+        :param min_size / max_size: File size limits in bytes.
+        :param min_age_days / max_age_days: Limits on the time since the file was last modified.
+        :param max_depth: How deep to recurse, 0 is only `path` itself. No limit by default.
+        """
         if not path.exists():
             print(f"Directory not found: {path}")
             return
 
-        for entry in path.iterdir():
-            if entry.is_file() and entry.name != '.DS_Store' and not entry.name.startswith('.'):
-                yield entry
+        skip, accept = self.file_filter(path, include, exclude, min_size, max_size, min_age_days, max_age_days)
+
+        def walk(directory: str, depth: int):
+            try:
+                iterator = os.scandir(directory)
+            except OSError as e:
+                print(f"  [Scan Error] {directory}: {e}")
+                return
+            with iterator:
+                for entry in iterator:
+                    if skip(entry.path, entry.name):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive and (max_depth is None or depth < max_depth):
+                                yield from walk(entry.path, depth + 1)
+                            continue
+                        if not entry.is_file() or not accept(entry.path, entry.name, entry.stat):
+                            continue
+                    except OSError:
+                        continue
+                    yield Path(entry.path)
+
+        yield from walk(str(path), 0)
 
     def scan_existing_folders(self, path: Path):
         """Scans for existing directories to reuse."""
@@ -68,13 +191,47 @@ class SmartSorter:
         if not path.exists():
             return
             
-        for entry in path.iterdir():
-            if entry.is_dir() and not entry.name.startswith('.'):
-                self.existing_folders.add(entry.name)
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if entry.is_dir() and not entry.name.startswith('.'):
+                    self.existing_folders.add(entry.name)
         
         if self.existing_folders:
             print(f"Found existing folders: {', '.join(sorted(list(self.existing_folders)))}")
 
+    def enable_embedding_fast_path(self, path: Path, **classifier_options) -> bool:
+        """
+        Builds folder centroids from the files already in the existing folders, so confident matches
+        skip the chat model. Call after scan_existing_folders. Returns False if the embeddings endpoint is not usable.
+        """
+        if not self.client or not self.existing_folders:
+            return False
+        try:
+            classifier = EmbeddingClassifier(self.client, call=self._call_with_retry, **classifier_options)
+            count = classifier.build(path, self.existing_folders, self._describe_for_embedding)
+        except Exception as e:
+            print(f"Warning: Embedding fast path disabled: {e}")
+            return False
+        print(f"Embedding fast path ready for {count} folders.")
+        self.embedding_classifier = classifier if count else None
+        return bool(count)
+
+    def _describe_for_embedding(self, file_path: Path, text_content: Optional[str] = None) -> str:
+        if text_content is None:
+            text_content = self._extract_text(file_path)
+        return f"{file_path.name}\n{text_content[:BATCH_SNIPPET_CHARS]}"
+
+    def _fast_path_category(self, file_path: Path, text_content: Optional[str] = None) -> Optional[str]:
+        """Returns an existing folder if the file is confidently close to it, without calling the chat model."""
+        if not self.embedding_classifier:
+            return None
+        try:
+            match = self.embedding_classifier.classify(self._describe_for_embedding(file_path, text_content))
+        except Exception as e:
+            print(f"  [Embedding Error] {e}")
+            return None
+        return match[0] if match else None
+
     def get_basic_category(self, file_path: Path) -> str:
         """Determines category based on file extension."""
         ext = file_path.suffix.lower()
@@ -83,61 +240,150 @@ class SmartSorter:
                 return category
         return "Others"
 
-    def _encode_image(self, image_path):
-        """Encodes image to base64 string."""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def _encode_image(self, image_path) -> Optional[str]:
+        """Encodes a downscaled JPEG copy of the image to a base64 string, None if it can not be read."""
+        return encode_image(image_path)
 
-    def _generate_with_retry(self, messages):
-        """Helper to call OpenAI API with retry logic."""
-        max_retries = 3
-        base_delay = 2
-        
+    def _call_with_retry(self, request: Callable[[], object], max_retries: int = 3):
+        """
+        Sends a request to LM Studio (a function calling the client) and returns its response.
+        Requests wait for a slot of the adaptive limiter, failures are retried with exponential backoff and jitter,
+        and CircuitOpenError is raised without calling the server while it is considered down.
+        Chat and embedding requests share the limiter and the breaker, they load the same server.
+        """
         for attempt in range(max_retries):
+            if not self.breaker.allow():
+                raise CircuitOpenError("LM Studio is unavailable")
+            started = self.limiter.acquire()
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=0.3,
-                    max_tokens=20
-                )
-                content = response.choices[0].message.content
-                if content:
-                    return content.strip().replace("/", "_").replace("\\", "_").replace('"', '').replace("'", "")
-                return None
+                response = request()
             except Exception as e:
+                # 4xx answers (e.g. images sent to a model without vision) are the request's fault, not the server's.
+                client_error = isinstance(e, APIStatusError) and e.status_code < 500 and e.status_code != 429
+                self.limiter.release(started, success=None if client_error else False)
+                if client_error:
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
                 print(f"  [LM Studio Error] Attempt {attempt+1}/{max_retries}: {e}")
-                time.sleep(base_delay * (attempt + 1))
-        
+                if attempt + 1 < max_retries:
+                    time.sleep(backoff_delay(attempt))
+                continue
+            self.limiter.release(started, success=True)
+            self.breaker.record_success()
+            return response
+
         raise Exception("Max retries exceeded.")
 
+    def _generate_with_retry(self, messages, max_tokens: int = 20, raw: bool = False, max_retries: int = 3):
+        """
+        Helper to call OpenAI API with retry logic, see _call_with_retry. raw returns the content without the folder
+        name cleanup.
+        """
+        response = self._call_with_retry(lambda: self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens
+        ), max_retries)
+
+        content = response.choices[0].message.content
+        if content and raw:
+            return content
+        if content:
+            return content.strip().replace("/", "_").replace("\\", "_").replace('"', '').replace("'", "")
+        return None
+
+    def _folder_hint(self) -> str:
+        if not self.existing_folders:
+            return ""
+        folder_list = ", ".join(sorted(list(self.existing_folders)))
+        return f" Existing folders involved: {folder_list}. PREFER using one of these if applicable."
+
+    def _extract_text(self, file_path: Path) -> str:
+        """Returns up to 1000 characters of text from PDF, Word, Excel and text files, or an empty string."""
+        return extract_text(file_path)
+
+    def _reaches_model(self, file_path: Path, text_content: Optional[str] = None) -> bool:
+        """True for the files the model is asked about: images, and files with extractable text."""
+        mime_type, _ = mimetypes.guess_type(file_path)
+        if mime_type and mime_type.startswith('image'):
+            return True
+        if text_content is None:
+            text_content = self._extract_text(file_path)
+        return bool(text_content)
+
+    def _cached_category(self, file_path: Path, text_content: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns (cached category or None, content hash or None).
+        Only files that reach the model are hashed: nothing is ever cached for the others (videos, archives, ...),
+        so reading all of their bytes would be wasted.
+        :param text_content: The extracted text of the file, if already known.
+        """
+        if not self.cache or not self._reaches_model(file_path, text_content):
+            return None, None
+        try:
+            content_hash = self.duplicate_finder.full_hash(file_path)
+        except OSError:
+            return None, None
+        return self.cache.get(content_hash, self.model_name, PROMPT_VERSION), content_hash
+
     def get_smart_category(self, file_path: Path) -> str:
         """Uses Local LLM to determine a more specific category."""
         if not self.client:
             return self.get_basic_category(file_path)
 
         mime_type, _ = mimetypes.guess_type(file_path)
-        
-        folder_hint = ""
-        if self.existing_folders:
-            folder_list = ", ".join(sorted(list(self.existing_folders)))
-            folder_hint = f" Existing folders involved: {folder_list}. PREFER using one of these if applicable."
+        text_content = None if mime_type and mime_type.startswith('image') else self._extract_text(file_path)
+
+        # Same content, model and prompt already classified -> no LLM call needed.
+        cached, content_hash = self._cached_category(file_path, text_content)
+        if cached:
+            return cached
+        if self.breaker.is_open():
+            return self.get_basic_category(file_path)
+
+        fast_category = self._fast_path_category(file_path, text_content)
+        if fast_category:
+            return fast_category
+
+        result = self._get_model_category(file_path, text_content)
+        if not result:
+            # Fallback if AI fails
+            return self.get_basic_category(file_path)
+
+        if content_hash:
+            self.cache.put(content_hash, self.model_name, PROMPT_VERSION, result)
+        return result
+
+    def _get_model_category(self, file_path: Path, text_content: Optional[str] = None) -> Optional[str]:
+        """
+        Asks the Local LLM for a category. Returns None if it could not decide.
+        :param text_content: The extracted text of the file, if already known, so it is not parsed again.
+        """
+        mime_type, _ = mimetypes.guess_type(file_path)
             
-        system_prompt = f"You are a file organizer. Analyze the content and suggest a single, short folder name (max 2 words) like 'Invoices', 'Vacation', 'Code', 'Receipts'.{folder_hint} Return ONLY the folder name string. Do not output JSON. Do not output markdown. Do not provide explanations."
+        system_prompt = f"You are a file organizer. Analyze the content and suggest a single, short folder name (max 2 words) like 'Invoices', 'Vacation', 'Code', 'Receipts'.{self._folder_hint()} Return ONLY the folder name string. Do not output JSON. Do not output markdown. Do not provide explanations."
 
         try:
             # Handle Images
             if mime_type and mime_type.startswith('image'):
                 try:
                     base64_image = self._encode_image(file_path)
-                    
+                    if not base64_image:
+                        raise ValueError("could not read the image")
+                    hints = image_hints(file_path)
+                    prompt = "Categorize this image into a single folder name."
+                    if hints:
+                        prompt += f" Image details: {hints}."
+
                     # Prepare image message format compatible with OpenAI Vision
                     messages = [
                         {"role": "system", "content": system_prompt},
                         {
                             "role": "user", 
                             "content": [
-                                {"type": "text", "text": "Categorize this image into a single folder name."},
+                                {"type": "text", "text": prompt},
                                 {
                                     "type": "image_url", 
                                     "image_url": {
@@ -150,27 +396,15 @@ class SmartSorter:
                     
                     result = self._generate_with_retry(messages)
                     if result: return result
+                except CircuitOpenError:
+                    raise
                 except Exception as e:
                     # Fallback for non-vision models or errors
                     print(f"  [Vision Error] {e}")
 
-            # Handle Text-based Documents
-            text_content = ""
-            if file_path.suffix.lower() == '.pdf':
-                try:
-                    with open(file_path, 'rb') as f:
-                        reader = PyPDF2.PdfReader(f)
-                        if len(reader.pages) > 0:
-                            text_content = reader.pages[0].extract_text()[:1000] 
-                except Exception:
-                    pass
-            elif file_path.suffix.lower() in ['.txt', '.md', '.py', '.json', '.csv', '.html', '.css', '.js', '.ipynb', '.sql']:
-                try:
-                    with open(file_path, 'r', errors='ignore') as f:
-                        text_content = f.read(1000)
-                except Exception:
-                    pass
-            
+            # Handle Text-based Documents, and images the vision request failed for
+            if text_content is None:
+                text_content = self._extract_text(file_path)
             if text_content:
                 result = self._generate_with_retry([
                     {"role": "system", "content": system_prompt},
@@ -182,54 +416,289 @@ class SmartSorter:
              # print(f"  [AI Error] Could not categorize {file_path.name}: {e}")
              pass
 
-        # Fallback if AI fails 
-        return self.get_basic_category(file_path)
+        return None
 
-    def sort_file(self, file_path: Path, use_smart: bool = False, dry_run: bool = True):
-        """Determines destination and moves file."""
-        if use_smart:
-            print(f"🤖 Analyzing: {file_path.name}...")
-            category = self.get_smart_category(file_path)
-            
-            # Defensive cleanup for chatty local models
-            if category:
-                # Remove common JSON/Markdown characters
-                for char in ['{', '}', '"', "'", '`', '*', '[', ']']:
-                    category = category.replace(char, '')
-                
-                category = category.strip()
-                # Split by newline and take first non-empty line
-                lines = [line.strip() for line in category.split('\n') if line.strip()]
-                if lines:
-                    category = lines[0]
-                    # If it looks like a key-value pair "Category: Finance", take the last part
-                    if ':' in category:
-                        category = category.split(':')[-1].strip()
+    def get_smart_categories_batch(self, file_paths: list) -> list:
+        """
+        Categorizes several text files with a single LLM request, returning one category per file.
+        Images still use one vision request each, files without text use the extension category,
+        and files the batch answer does not cover fall back to get_smart_category.
+        """
+        if not self.client:
+            return [self.get_basic_category(file_path) for file_path in file_paths]
+
+        categories = [None] * len(file_paths)
+        content_hashes = [None] * len(file_paths)
+        batch = []  # (position in file_paths, text)
+        for position, file_path in enumerate(file_paths):
+            mime_type, _ = mimetypes.guess_type(file_path)
+            is_image = bool(mime_type and mime_type.startswith('image'))
+            text_content = None if is_image else self._extract_text(file_path)
+            cached, content_hashes[position] = self._cached_category(file_path, text_content)
+            if cached:
+                categories[position] = cached
+                continue
+            if self.breaker.is_open():
+                categories[position] = self.get_basic_category(file_path)
+                continue
+            if is_image:
+                categories[position] = self.get_smart_category(file_path)
+                continue
+            fast_category = self._fast_path_category(file_path, text_content)
+            if fast_category:
+                categories[position] = fast_category
+            elif text_content:
+                batch.append((position, text_content[:BATCH_SNIPPET_CHARS]))
+            else:
+                categories[position] = self.get_basic_category(file_path)
+
+        if len(batch) == 1:
+            position = batch[0][0]
+            categories[position] = self.get_smart_category(file_paths[position])
+        elif batch:
+            answers = self._ask_batch([(file_paths[position].name, text) for position, text in batch])
+            for index, (position, _) in enumerate(batch):
+                category = answers.get(index)
+                if category:
+                    categories[position] = category
+                    if content_hashes[position]:
+                        self.cache.put(content_hashes[position], self.model_name, PROMPT_VERSION, category)
                 else:
-                    category = "Others"
+                    # Not classified by the batch, ask for this file alone.
+                    categories[position] = self.get_smart_category(file_paths[position])
+        return categories
 
-            if len(category) > 20 or not category:
-                category = self.get_basic_category(file_path)
-        else:
+    def _ask_batch(self, files: list) -> dict:
+        """
+        Sends (file name, text) pairs in one request.
+        Returns {index: category} for the files the model answered, which may be fewer than asked.
+        """
+        system_prompt = f"You are a file organizer. For each file, analyze the name and content and suggest a single, short folder name (max 2 words) like 'Invoices', 'Vacation', 'Code', 'Receipts'.{self._folder_hint()} Return ONLY a JSON array with one object per file, like [{{\"index\": 0, \"category\": \"Invoices\"}}]. Do not output markdown. Do not provide explanations."
+        user_prompt = "Categorize these files into folder names:\n\n" + "\n\n".join(
+            f"### File {index}: {name}\n{text}" for index, (name, text) in enumerate(files))
+        try:
+            content = self._generate_with_retry([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ], max_tokens=20 * len(files) + 20, raw=True)
+        except Exception as e:
+            print(f"  [Batch Error] {e}")
+            return {}
+        if not content:
+            return {}
+
+        # Local models like to wrap JSON in markdown, so only look at the outermost array.
+        start, end = content.find('['), content.rfind(']')
+        try:
+            items = json.loads(content[start:end + 1]) if start != -1 and end > start else []
+        except json.JSONDecodeError:
+            items = []
+        answers = {}
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get("index"), int) and isinstance(item.get("category"), str):
+                if 0 <= item["index"] < len(files) and item["category"].strip():
+                    answers[item["index"]] = item["category"].strip().replace("/", "_").replace("\\", "_")
+        return answers
+
+    def _clean_category(self, category: Optional[str], file_path: Path) -> str:
+        """Turns a model answer into a safe folder name, falling back to the extension category."""
+        # Defensive cleanup for chatty local models
+        if category:
+            # Remove common JSON/Markdown characters
+            for char in ['{', '}', '"', "'", '`', '*', '[', ']']:
+                category = category.replace(char, '')
+            
+            category = category.strip()
+            # Split by newline and take first non-empty line
+            lines = [line.strip() for line in category.split('\n') if line.strip()]
+            if lines:
+                category = lines[0]
+                # If it looks like a key-value pair "Category: Finance", take the last part
+                if ':' in category:
+                    category = category.split(':')[-1].strip()
+            else:
+                category = "Others"
+
+        if len(category) > 20 or not category:
             category = self.get_basic_category(file_path)
-        
+        return category
+
+    def categorize_batch(self, file_paths: list, use_smart: bool = False) -> list:
+        """Like categorize, for several files at once with a single LLM request."""
+        if not use_smart:
+            return [self.categorize(file_path) for file_path in file_paths]
+        print(f"🤖 Analyzing batch: {', '.join(file_path.name for file_path in file_paths)}...")
+        categories = self.get_smart_categories_batch(file_paths)
+        return [self._safe_folder_name(self._clean_category(category, file_path))
+                for category, file_path in zip(categories, file_paths)]
+
+    def _safe_folder_name(self, category: str) -> str:
         # Final safety cleanup for filenames
         category = "".join([c for c in category if c.isalpha() or c.isdigit() or c in (' ', '_', '-')]).strip()
         if not category: category = "Others"
+        return category
+
+    def categorize(self, file_path: Path, use_smart: bool = False) -> str:
+        """Determines the destination folder name for a file. Safe to call from several threads."""
+        if use_smart:
+            print(f"🤖 Analyzing: {file_path.name}...")
+            category = self._clean_category(self.get_smart_category(file_path), file_path)
+        else:
+            category = self.get_basic_category(file_path)
+        return self._safe_folder_name(category)
 
-        dest_dir = file_path.parent / category
-        dest_path = dest_dir / file_path.name
+    def resolve_destination(self, file_path: Path, category: str, reserved: Optional[dict] = None,
+                            dest_root: Optional[Path] = None) -> Optional[Path]:
+        """
+        Picks a free destination path, also avoiding paths already reserved by earlier files of this run.
+        Each destination folder is listed once into `reserved` (folder -> names taken), so duplicates are
+        resolved in memory instead of probing the disk for every candidate name.
+        Category folders are created in dest_root, or next to the file when it is not given.
+        Returns None when the file already is in its category folder.
+        """
+        dest_dir = (dest_root or file_path.parent) / category
+        if dest_dir == file_path.parent:
+            return None
+        if reserved is None:
+            reserved = {}
+        taken = reserved.get(dest_dir)
+        if taken is None:
+            taken = reserved[dest_dir] = names_in(dest_dir)
 
         # Handle duplicates
+        name = file_path.name
         counter = 1
-        while dest_path.exists():
-            stem = file_path.stem
-            suffix = file_path.suffix
-            dest_path = dest_dir / f"{stem}_{counter}{suffix}"
+        while name.casefold() in taken:
+            name = f"{file_path.stem}_{counter}{file_path.suffix}"
             counter += 1
 
-        print(f"  -> Moving to: {category}/{dest_path.name}")
+        taken.add(name.casefold())
+        return dest_dir / name
+
+    def move_file(self, file_path: Path, dest_path: Optional[Path], dry_run: bool = True):
+        """Moves the file to its destination, or only prints it in dry run."""
+        if dest_path is None:
+            print(f"  -> Already in place: {file_path.parent.name}/{file_path.name}")
+            return
+        print(f"  -> Moving to: {dest_path.parent.name}/{dest_path.name}")
 
         if not dry_run:
-            dest_dir.mkdir(exist_ok=True)
+            dest_path.parent.mkdir(exist_ok=True)
             shutil.move(str(file_path), str(dest_path))
+
+    def sort_file(self, file_path: Path, use_smart: bool = False, dry_run: bool = True, dest_root: Optional[Path] = None):
+        """Determines destination and moves file."""
+        category = self.categorize(file_path, use_smart)
+        dest_path = self.resolve_destination(file_path, category, dest_root=dest_root)
+        self.move_file(file_path, dest_path, dry_run)
+
+    def categorize_files(self, file_paths, use_smart: bool = False, workers: int = 1, batch_size: int = 1):
+        """
+        Yields (file_path, category) in the order of file_paths, with a pool of workers categorizing them
+        concurrently (the slow LLM part). With batch_size > 1, each worker categorizes batch_size files
+        with a single LLM request. At most workers * 2 batches are read ahead of the file being yielded.
+        """
+        max_in_flight = max(1, workers) * 2
+        batch_size = max(1, batch_size)
+
+        def categorize_chunk(chunk: list) -> list:
+            if batch_size == 1:
+                return [self.categorize(chunk[0], use_smart)]
+            return self.categorize_batch(chunk, use_smart)
+
+        def collect(chunk: list, future):
+            try:
+                categories = future.result()
+            except Exception as e:
+                print(f"  [Error] Could not categorize {', '.join(file_path.name for file_path in chunk)}: {e}")
+                categories = [self.get_basic_category(file_path) for file_path in chunk]
+            return zip(chunk, categories)
+
+        if workers <= 1 and batch_size == 1:
+            for file_path in file_paths:
+                yield file_path, self.categorize(file_path, use_smart)
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            pending = deque()
+            chunk = []
+            for file_path in file_paths:
+                chunk.append(file_path)
+                if len(chunk) < batch_size:
+                    continue
+                pending.append((chunk, executor.submit(categorize_chunk, chunk)))
+                chunk = []
+                if len(pending) >= max_in_flight:
+                    yield from collect(*pending.popleft())
+            if chunk:
+                pending.append((chunk, executor.submit(categorize_chunk, chunk)))
+            while pending:
+                yield from collect(*pending.popleft())
+
+    def plan_moves(self, file_paths, journal, use_smart: bool = False, workers: int = 1, batch_size: int = 1,
+                   dest_root: Optional[Path] = None, duplicates: str = "keep", reserved: Optional[dict] = None) -> int:
+        """
+        Categorizes the files and records in the journal where each one goes, without moving anything yet.
+        Files with identical content are categorized once, the copies get the same category.
+        :param duplicates: What to do with a file whose content is already in its destination folder, or which is a copy
+            of another file of this run: "keep" moves it anyway (renamed if the name is taken), "skip" leaves it
+            where it is, "link" leaves it where it is as a hard link to the sorted copy.
+        :param reserved: Names taken per destination folder, see resolve_destination. Defaults to the journal's.
+        :return: Number of files planned.
+        """
+        if reserved is None:
+            reserved = journal.reserved
+        self.duplicate_finder.forget_folders()
+        # The scan is read in chunks. Copies of a file of an earlier chunk are planned with its category and destination.
+        earlier = {}
+        planned_originals = {}  # original -> (category, where its content ends up)
+        planned = 0
+        file_paths = iter(file_paths)
+        while chunk := list(islice(file_paths, PLAN_CHUNK_SIZE)):
+            copies = self.duplicate_finder.group(chunk, earlier)
+            is_copy = {copy for group in copies.values() for copy in group}
+            for original, group in copies.items():
+                if original in planned_originals:
+                    category, sorted_path = planned_originals[original]
+                    for copy in group:
+                        self._plan_file(copy, category, journal, reserved, dest_root, duplicates, original=sorted_path)
+                        planned += 1
+
+            originals = (file_path for file_path in chunk if file_path not in is_copy)
+            for file_path, category in self.categorize_files(originals, use_smart, workers, batch_size):
+                sorted_path = self._plan_file(file_path, category, journal, reserved, dest_root, duplicates)
+                planned_originals[file_path] = (category, sorted_path)
+                planned += 1
+                for copy in copies.get(file_path, []):
+                    self._plan_file(copy, category, journal, reserved, dest_root, duplicates, original=sorted_path)
+                    planned += 1
+        return planned
+
+    def _plan_file(self, file_path: Path, category: str, journal, reserved: dict, dest_root: Optional[Path],
+                   duplicates: str, original: Optional[Path] = None) -> Path:
+        """Plans a single file. Returns where its content ends up, for the copies of it."""
+        dest_dir = (dest_root or file_path.parent) / category
+        if dest_dir != file_path.parent:
+            if original is None:
+                original = self.duplicate_finder.find_identical(file_path, dest_dir)
+            if original is not None and duplicates != "keep":
+                journal.plan_duplicate(file_path, original, category, link=duplicates == "link")
+                return original
+            if original is not None:
+                print(f"  = {file_path.name} is a duplicate of {original.parent.name}/{original.name}")
+        dest_path = self.resolve_destination(file_path, category, reserved, dest_root)
+        journal.plan(file_path, dest_path, category)
+        return dest_path or file_path
+
+    def sort_files_pipelined(self, file_paths, use_smart: bool = False, dry_run: bool = True, workers: int = 4,
+                             dest_root: Optional[Path] = None, batch_size: int = 1) -> int:
+        """
+        Sorts files categorized by categorize_files, while the moves are applied one by one in scan order,
+        so duplicate names are resolved the same way every run. Returns the number of files processed.
+        """
+        reserved = {}
+        processed = 0
+        for file_path, category in self.categorize_files(file_paths, use_smart, workers, batch_size):
+            self.move_file(file_path, self.resolve_destination(file_path, category, reserved, dest_root), dry_run)
+            processed += 1
+        return processed
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The SortMyFolder modules import each other as top-level modules, like when main.py is run from its folder.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
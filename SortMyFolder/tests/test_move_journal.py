@@ -0,0 +1,28 @@
+from move_journal import MoveJournal
+
+
+def test_failed_moves_keep_the_journal_open_and_are_retried(tmp_path):
+    good, bad = tmp_path / "good.txt", tmp_path / "bad.txt"
+    good.write_text("good")
+    bad.write_text("bad")
+    blocker = tmp_path / "Blocked"
+    blocker.write_text("a file where the category folder should be")
+
+    path = MoveJournal.new_path(tmp_path)
+    journal = MoveJournal(path)
+    journal.plan(good, tmp_path / "Documents" / "good.txt", "Documents")
+    journal.plan(bad, blocker / "bad.txt", "Blocked")
+    journal.mark_planned()
+    assert journal.apply(dry_run=False) == 1
+    assert list(journal.failed) == [1]
+    assert not journal.is_complete
+    journal.close()
+
+    blocker.unlink()
+    resumed = MoveJournal(path)
+    assert not resumed.is_complete
+    assert [move["id"] for move in resumed.pending()] == [1]
+    assert resumed.apply(dry_run=False) == 1
+    assert not resumed.failed and resumed.is_complete
+    assert (blocker / "bad.txt").read_text() == "bad"
+    resumed.close()
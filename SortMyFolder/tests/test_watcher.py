@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+import watcher
+from move_journal import MoveJournal
+from sorter import SmartSorter
+from watcher import FolderWatcher
+
+SETTLE_SECONDS = 0.5
+TIMEOUT = 10
+
+
+@pytest.fixture(params=["polling", "watchdog"])
+def start_watcher(request, tmp_path, monkeypatch):
+    """Returns a function starting a FolderWatcher on tmp_path in a thread, with the polling fallback or watchdog."""
+    if request.param == "polling":
+        monkeypatch.setattr(watcher, "Observer", None)
+    elif watcher.Observer is None:
+        pytest.skip("watchdog is not installed")
+    monkeypatch.setenv("LM_STUDIO_URL", "http://127.0.0.1:9/v1")  # Nothing listens there, no model is used.
+    sorter = SmartSorter(use_cache=False)
+    started = []
+
+    def start(**options) -> FolderWatcher:
+        journal = MoveJournal(MoveJournal.new_path(tmp_path))
+        folder_watcher = FolderWatcher(sorter, tmp_path, journal, dry_run=False, settle_seconds=SETTLE_SECONDS,
+                                       poll_seconds=0.1, **options)
+        thread = threading.Thread(target=folder_watcher.run, daemon=True)
+        thread.start()
+        started.append((folder_watcher, thread))
+        # Let the observer start, or the first poll list the files already there.
+        time.sleep(0.5)
+        return folder_watcher
+
+    yield start
+    for folder_watcher, thread in started:
+        folder_watcher.stop()
+        thread.join(TIMEOUT)
+
+
+def wait_for(condition) -> bool:
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def write_slowly(path, chunks: int, pause: float):
+    with open(path, "wb") as f:
+        for _ in range(chunks):
+            f.write(b"x" * 1024)
+            f.flush()
+            time.sleep(pause)
+
+
+def test_slow_writer_is_sorted_once_it_settles(start_watcher, tmp_path):
+    start_watcher()
+    source = tmp_path / "report.txt"
+    writer = threading.Thread(target=write_slowly, args=(source, 8, SETTLE_SECONDS / 3))
+    writer.start()
+    assert wait_for(source.exists)
+    while writer.is_alive():
+        assert source.exists(), "moved while it was still being written"
+        time.sleep(0.02)
+    writer.join()
+
+    assert wait_for(lambda: (tmp_path / "Documents" / "report.txt").exists())
+    assert (tmp_path / "Documents" / "report.txt").stat().st_size == 8 * 1024
+    assert not source.exists()
+
+
+def test_renamed_partial_download_is_sorted_under_its_final_name(start_watcher, tmp_path):
+    start_watcher()
+    partial = tmp_path / "movie.mp4.crdownload"
+    write_slowly(partial, 3, 0.05)
+    time.sleep(SETTLE_SECONDS * 3)
+    assert partial.exists(), "a partial download was sorted"
+
+    partial.rename(tmp_path / "movie.mp4")
+    assert wait_for(lambda: (tmp_path / "Video" / "movie.mp4").exists())
+    assert not (tmp_path / "Video" / "movie.mp4.crdownload").exists()
+
+
+def test_recursive_include_and_exclude(start_watcher, tmp_path):
+    (tmp_path / "inbox").mkdir()
+    (tmp_path / "private").mkdir()
+    start_watcher(recursive=True, include=["*.pdf"], exclude=["private"])
+
+    (tmp_path / "inbox" / "invoice.pdf").write_bytes(b"%PDF-1.4")
+    (tmp_path / "inbox" / "notes.txt").write_text("not included")
+    (tmp_path / "private" / "secret.pdf").write_bytes(b"%PDF-1.4")
+    (tmp_path / "top.pdf").write_bytes(b"%PDF-1.4")
+
+    assert wait_for(lambda: (tmp_path / "inbox" / "Documents" / "invoice.pdf").exists())
+    assert wait_for(lambda: (tmp_path / "Documents" / "top.pdf").exists())
+    time.sleep(SETTLE_SECONDS * 3)
+    assert (tmp_path / "inbox" / "notes.txt").exists()
+    assert (tmp_path / "private" / "secret.pdf").exists()
@@ -0,0 +1,223 @@
+import os
+import queue
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from move_journal import MoveJournal
+from sorter import SmartSorter
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Files browsers and download tools write to before renaming them to their final name.
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.partial', '.download', '.tmp', '.swp')
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forwards watchdog events to the watcher: new files become candidates, writes only delay them."""
+
+    def __init__(self, watcher: "FolderWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, new=True)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path, new=True)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, new=False)
+
+    def on_closed(self, event):
+        # Only emitted on Linux (inotify IN_CLOSE_WRITE): the writer is done, no need to wait for the full settle time.
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, new=False, closed=True)
+
+
+class FolderWatcher:
+    """
+    Sorts files as they arrive in a directory, instead of rescanning it from a cron job.
+
+    Filesystem events (inotify on Linux, FSEvents on macOS, through watchdog) put new files on a queue.
+    A file is only sorted once it has settled: no event for settle_seconds and the same size and mtime on two checks,
+    so downloads that are still being written are left alone. Settled files are categorized together with the
+    usual SmartSorter logic and moved through one MoveJournal for the whole session, so --undo works afterwards.
+    The loop blocks on the queue while nothing is pending, so an idle watcher uses no CPU.
+
+    Without watchdog installed the directory is polled every poll_seconds instead.
+    """
+
+    def __init__(self, sorter: SmartSorter, root: Path, journal: MoveJournal, use_smart: bool = False,
+                 dry_run: bool = True, recursive: bool = False, max_depth: Optional[int] = None,
+                 dest_root: Optional[Path] = None, workers: int = 1, batch_size: int = 1, duplicates: str = "keep",
+                 settle_seconds: float = 2.0, poll_seconds: float = 5.0, **filters):
+        self.sorter = sorter
+        self.root = root
+        self.journal = journal
+        self.use_smart = use_smart
+        self.dry_run = dry_run
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.dest_root = dest_root
+        self.workers = workers
+        self.batch_size = batch_size
+        self.duplicates = duplicates
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.skip, self.accept = sorter.file_filter(root, **filters)
+        self.sorted_count = 0
+        self._events = queue.Queue()
+        self._pending = {}  # path -> [last event time, (size, mtime) at the last check or None, closed after writing]
+        self._stop = threading.Event()
+
+    def notify(self, path: str, new: bool, closed: bool = False):
+        """Called from the observer thread for every file event."""
+        self._events.put((path, new, closed))
+
+    def stop(self):
+        self._stop.set()
+        self._events.put(None)  # Wakes up the loop if it is waiting for events.
+
+    def _is_candidate(self, path: str) -> bool:
+        """Applies the scan filters to a path from an event, including its parent directories when recursive."""
+        relative = os.path.relpath(path, self.root)
+        parts = relative.split(os.sep)
+        if parts[0] == os.pardir or (len(parts) > 1 and not self.recursive):
+            return False
+        if self.max_depth is not None and len(parts) - 1 > self.max_depth:
+            return False
+        directory = str(self.root)
+        for part in parts:
+            directory = os.path.join(directory, part)
+            if self.skip(directory, part):
+                return False
+        name = parts[-1]
+        if name.lower().endswith(PARTIAL_SUFFIXES):
+            return False
+        # Files the session moved itself come back as events in the category folders.
+        return not self.journal.knows(Path(path))
+
+    def _record(self, path: str, new: bool, closed: bool, now: float):
+        if path not in self._pending:
+            if not new or not self._is_candidate(path):
+                return
+            self._pending[path] = [now, None, False]
+        entry = self._pending[path]
+        entry[0], entry[2] = now, closed
+
+    def _settled(self, now: float) -> list:
+        """
+        Returns the pending files that are done being written and removes them from the pending set:
+        closed after writing, or unchanged for settle_seconds and with the same size and mtime on two checks.
+        """
+        ready = []
+        for path, entry in list(self._pending.items()):
+            if not entry[2] and now - entry[0] < self.settle_seconds:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Deleted or renamed before it settled, a rename comes back as its own event.
+                del self._pending[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if not entry[2] and entry[1] != signature:
+                # Check once more after another settle period, some writers do not trigger events for every write.
+                entry[0], entry[1] = now, signature
+                continue
+            del self._pending[path]
+            if self.accept(path, os.path.basename(path), lambda: stat):
+                ready.append(Path(path))
+        return ready
+
+    def process(self, files: list) -> int:
+        """Categorizes and moves a group of settled files. Returns the number of files moved."""
+        files = [file_path for file_path in files if not self.journal.knows(file_path)]
+        if not files:
+            return 0
+        print(f"📥 {len(files)} new file(s): {', '.join(file_path.name for file_path in files)}")
+        first_new = len(self.journal.moves)
+        # The destination folders change between batches, so they are listed again every time.
+        self.sorter.plan_moves(files, self.journal, use_smart=self.use_smart, workers=self.workers,
+                               batch_size=self.batch_size, dest_root=self.dest_root, duplicates=self.duplicates,
+                               reserved={})
+        for move in self.journal.moves[first_new:]:
+            if Path(move["dst"]).parent.parent == self.root:
+                # New category folders are offered to the model for the next files.
+                self.sorter.existing_folders.add(move["category"])
+        moved = self.journal.apply(dry_run=self.dry_run, complete=False)
+        self.sorted_count += len(files)
+        return moved
+
+    def _poll(self):
+        """Fallback without watchdog: reports files that are new or changed since the previous poll."""
+        seen = {}
+        first = True
+        while not self._stop.wait(0 if first else self.poll_seconds):
+            current = {}
+            for file_path in self.sorter.scan_directory(self.root, recursive=self.recursive, max_depth=self.max_depth):
+                try:
+                    stat = file_path.stat()
+                except OSError:
+                    continue
+                path = str(file_path)
+                current[path] = (stat.st_size, stat.st_mtime_ns)
+                # Files already there when watching started are left to the normal run.
+                if not first and seen.get(path) != current[path]:
+                    self.notify(path, new=path not in seen)
+            seen = current
+            first = False
+
+    def run(self):
+        """Watches until stop() is called, Ctrl+C or SIGTERM."""
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), str(self.root), recursive=self.recursive)
+            observer.start()
+            print(f"👀 Watching {self.root} for new files (Ctrl+C to stop)")
+        else:
+            threading.Thread(target=self._poll, daemon=True).start()
+            print(f"👀 Watching {self.root} by polling every {self.poll_seconds:g}s "
+                  f"(pip install watchdog for filesystem events, Ctrl+C to stop)")
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        try:
+            while not self._stop.is_set():
+                if self._pending:
+                    next_check = min(entry[0] + (0 if entry[2] else self.settle_seconds) for entry in self._pending.values())
+                    timeout = max(0.05, next_check - time.monotonic())
+                else:
+                    timeout = None  # Nothing to wait for, sleep until the next event.
+                try:
+                    item = self._events.get(timeout=timeout)
+                    while item is not None:
+                        self._record(*item, now=time.monotonic())
+                        item = self._events.get_nowait()
+                except queue.Empty:
+                    pass
+                ready = self._settled(time.monotonic())
+                if ready:
+                    self.process(ready)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            if self.journal.failed:
+                print(f"{len(self.journal.failed)} moves failed, the journal stays open: a --wet-run of the folder retries them")
+            elif not self.dry_run and self.journal.moves:
+                self.journal.mark_complete()
+            self.journal.close()
+        return self.sorted_count
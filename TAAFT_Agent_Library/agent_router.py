@@ -0,0 +1,79 @@
+import os
+from typing import Callable, Optional
+
+import numpy as np
+
+from prompt_store import DEFAULT_CACHE_DIR, PromptStore
+
+DEFAULT_TOP_K = int(os.getenv("TAAFT_ROUTER_TOP_K", "3"))
+
+
+class AgentRouter:
+    """
+    Picks the agents whose description is closest to the question, so the Team coordinator only reads and chooses
+    between a handful of members instead of the descriptions of the whole library on every turn.
+
+    The descriptions are embedded once, locally, with the default chromadb embedding model (all-MiniLM-L6-v2, the same
+    one TalkToDatabase uses). The vectors are saved in cache_dir under the hash of the prompt collection file,
+    so they are computed again only when the file changes. Routing a question is one embedding and a dot product.
+    Nothing is loaded until the first question, so creating the router does not slow down startup.
+    """
+
+    def __init__(self, store: PromptStore, cache_dir: str = DEFAULT_CACHE_DIR,
+                 embedding_function: Optional[Callable[[list], list]] = None):
+        """
+        :param store: The prompt collection, its version names the cache file.
+        :param embedding_function: Maps a list of texts to a list of vectors, chromadb's DefaultEmbeddingFunction by default.
+        """
+        self.store = store
+        self._embedding_function = embedding_function
+        self.cache_path = os.path.join(cache_dir, f"{self._model_name()}-{store.version[:16]}.npy")
+        self._vectors = None
+
+    def _model_name(self) -> str:
+        return type(self._embedding_function).__name__ if self._embedding_function else "DefaultEmbeddingFunction"
+
+    @property
+    def embedding_function(self) -> Callable[[list], list]:
+        if self._embedding_function is None:
+            # chromadb takes a while to import, only pay for it when a question is routed.
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            self._embedding_function = DefaultEmbeddingFunction()
+        return self._embedding_function
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            self._vectors = self._load_or_build()
+        return self._vectors
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _load_or_build(self) -> np.ndarray:
+        if os.path.exists(self.cache_path):
+            vectors = np.load(self.cache_path, mmap_mode="r")
+            if len(vectors) == len(self.store):
+                return vectors
+        texts = [f"{name}: {description}" for name, description in self.store.descriptions()]
+        vectors = self._normalize(np.asarray(self.embedding_function(texts), dtype=np.float32))
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temporary_path = f"{self.cache_path}.{os.getpid()}.tmp.npy"
+        np.save(temporary_path, vectors)
+        os.replace(temporary_path, self.cache_path)
+        return vectors
+
+    def route(self, question: str, k: int = DEFAULT_TOP_K, keep: Optional[list] = None) -> list:
+        """
+        Returns the k best agents for the question as (index in the store, cosine similarity), best first.
+        :param keep: Indexes of agents returned whatever their score, first, e.g. the agent that asked the question
+            the user is now answering ("my café expansion" does not look like a business plan interview on its own).
+            The best of the other agents fill the rest of the k places.
+        """
+        query = self._normalize(np.asarray(self.embedding_function([question])[0], dtype=np.float32))
+        scores = self.vectors @ query
+        keep = list(dict.fromkeys(keep or []))
+        best = [int(index) for index in np.argsort(-scores)[:k + len(keep)] if int(index) not in keep]
+        return [(index, float(scores[index])) for index in keep + best[:max(0, k - len(keep))]]
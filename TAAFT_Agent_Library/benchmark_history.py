@@ -0,0 +1,63 @@
+"""
+Measures the history tokens sent with each question over a long session:
+- full: every previous question and answer (add_history_to_context without a limit, the previous setup)
+- budgeted: SessionMemory, the latest turns within the token budget plus the rolling summary of the older ones
+The summaries are made by a stand-in that returns a 200 word text, no model is called. The tokens read by the
+summary calls are reported separately, they are spent once per summary and not on every question.
+
+python benchmark_history.py --turns 100 --budget 3000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from session_memory import SessionMemory, estimate_tokens
+
+WORDS = ("plan growth market pricing customer churn funnel launch budget hiring risk assumption experiment "
+         "channel retention revenue metric segment roadmap feedback").split()
+
+
+def make_turns(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [(" ".join(rng.choices(WORDS, k=rng.randint(10, 40))) + "?",
+             " ".join(rng.choices(WORDS, k=rng.randint(150, 700))) + ".") for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history tokens per turn")
+    parser.add_argument('--turns', type=int, default=100, help="Questions in the session")
+    parser.add_argument('--budget', type=int, default=3000, help="Token budget of the verbatim history")
+    args = parser.parse_args()
+
+    turns = make_turns(args.turns)
+    summary_input = []
+
+    def summarize(summary, folded):
+        summary_input.append(estimate_tokens(summary or "") + sum(estimate_tokens(q + a) for q, a in folded))
+        return " ".join(WORDS[n % len(WORDS)] for n in range(200))
+
+    with tempfile.TemporaryDirectory() as directory:
+        memory = SessionMemory("benchmark", summarize, db_file=os.path.join(directory, "sessions.db"),
+                               budget_tokens=args.budget)
+        full_total = budgeted_total = 0
+        print(f"{'turn':>6} {'full':>9} {'budgeted':>9}")
+        for turn in range(args.turns):
+            previous = turns[:turn]
+            full = sum(estimate_tokens(question) + estimate_tokens(answer) for question, answer in previous)
+            history_runs, summary = memory.prepare(previous)
+            budgeted = estimate_tokens(summary or "") + sum(
+                estimate_tokens(question) + estimate_tokens(answer) for question, answer in previous[len(previous) - history_runs:])
+            full_total += full
+            budgeted_total += budgeted
+            if turn + 1 in (1, 5, 10, 25, 50) or (turn + 1) % 100 == 0 or turn + 1 == args.turns:
+                print(f"{turn + 1:>6} {full:>9} {budgeted:>9}")
+        memory.close()
+
+    print(f"Total over {args.turns} questions: full {full_total} tokens, budgeted {budgeted_total} tokens "
+          f"+ {sum(summary_input)} tokens read by {len(summary_input)} summary calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares routing with the agent router against handing the Team coordinator the whole library:
+local routing latency (building the index, loading it from the cache, routing one question), how many prompt tokens
+the member descriptions take per turn, and how often the agent an example question was written for is among the
+top-k candidates. The example questions come from the "examples" of the prompt collection.
+Tokens are estimated at 4 characters per token.
+
+python benchmark_routing.py --top-k 1 3 5
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from agent_router import AgentRouter
+from prompt_store import PromptStore
+from session_memory import estimate_tokens
+
+
+def member_tokens(descriptions: list) -> int:
+    """Tokens the coordinator reads to choose a member: the name and description of every member offered to it."""
+    return sum(estimate_tokens(f"{name}: {description}") for name, description in descriptions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark routing questions to agents")
+    parser.add_argument('--collection', default="prompt_collection.json")
+    parser.add_argument('--top-k', type=int, nargs='+', default=[1, 3, 5], help="Numbers of candidates to compare")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="router_bench_")
+    try:
+        store = PromptStore(args.collection, path=os.path.join(cache_dir, "prompts.sqlite"))
+        descriptions = store.descriptions()
+        questions = store.examples()
+        if not questions:
+            print("The prompt collection has no examples to route.")
+            return
+        start = time.perf_counter()
+        AgentRouter(store, cache_dir=cache_dir).vectors
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        router = AgentRouter(store, cache_dir=cache_dir)
+        router.vectors
+        load_seconds = time.perf_counter() - start
+        router.route(questions[0][0])  # Loads the embedding model.
+        print(f"{len(store)} agents: index built in {build_seconds * 1000:.0f} ms, "
+              f"loaded from cache in {load_seconds * 1000:.1f} ms")
+
+        all_tokens = member_tokens(descriptions)
+        print(f"{'members':>10} {'route ms':>9} {'tokens/turn':>12} {'recall':>7}")
+        print(f"{'all':>10} {'-':>9} {all_tokens:>12} {1:>7.2f}")
+        for k in args.top_k:
+            hits, tokens = 0, 0
+            start = time.perf_counter()
+            routes = [(router.route(question, k=k), expected) for question, expected in questions]
+            route_ms = (time.perf_counter() - start) * 1000 / len(questions)
+            for candidates, expected in routes:
+                hits += expected in [index for index, _ in candidates]
+                tokens += member_tokens([descriptions[index] for index, _ in candidates])
+            print(f"{'top ' + str(k):>10} {route_ms:>9.1f} {tokens // len(questions):>12} {hits / len(questions):>7.2f}")
+        store.close()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
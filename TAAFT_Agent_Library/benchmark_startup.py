@@ -0,0 +1,90 @@
+"""
+Measures the time until the first question can be asked, for prompt libraries of different sizes made by repeating
+the entries of prompt_collection.json:
+- eager: parse the whole JSON and create an Agent with its own Groq model for every entry (the previous startup)
+- lazy: open the prompt store and the router, agents are created when a question is routed to them
+The one-time import of the JSON into the store and the creation of the first agent are shown separately.
+No request is sent, the API key is not used.
+
+python benchmark_startup.py --sizes 10 100 1000 10000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from agno.agent import Agent
+from agno.models.groq import Groq
+from groq import Groq as GroqClient
+
+from agent_router import AgentRouter
+from prompt_store import PromptStore
+
+MODEL_ID = "openai/gpt-oss-20b"
+
+
+def write_library(path: str, prompts: list, size: int):
+    library = [dict(prompts[n % len(prompts)], name=f"{prompts[n % len(prompts)]['name']} {n}") for n in range(size)]
+    with open(path, "w") as library_file:
+        json.dump(library, library_file)
+
+
+def eager_startup(path: str) -> float:
+    start = time.perf_counter()
+    with open(path, "r") as source_file:
+        prompt_collection = json.load(source_file)
+    [Agent(name=single_prompt["name"], model=Groq(MODEL_ID, api_key="benchmark"),
+           description=single_prompt["description"], instructions=single_prompt["prompt"])
+     for single_prompt in prompt_collection]
+    return time.perf_counter() - start
+
+
+def lazy_startup(path: str, cache_dir: str) -> tuple:
+    """Returns the startup time and the time to create the first agent."""
+    start = time.perf_counter()
+    store = PromptStore(path, path=os.path.join(cache_dir, "prompts.sqlite"))
+    AgentRouter(store, cache_dir=cache_dir)
+    groq_client = GroqClient(api_key="benchmark")
+    startup = time.perf_counter() - start
+    start = time.perf_counter()
+    single_prompt = store.get(len(store) - 1)
+    Agent(name=single_prompt["name"], model=Groq(MODEL_ID, client=groq_client),
+          description=single_prompt["description"], instructions=single_prompt["prompt"])
+    first_agent = time.perf_counter() - start
+    store.close()
+    return startup, first_agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TAAFT startup time")
+    parser.add_argument('--collection', default="prompt_collection.json")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000], help="Library sizes to compare")
+    args = parser.parse_args()
+
+    with open(args.collection, "r") as source_file:
+        prompts = json.load(source_file)
+
+    # Initializes the Groq SDK once, so the first size is not charged for it.
+    GroqClient(api_key="benchmark")
+    print(f"{'agents':>8} {'MB':>7} {'eager ms':>9} {'import ms':>10} {'lazy ms':>8} {'1st agent ms':>13}")
+    for size in args.sizes:
+        cache_dir = tempfile.mkdtemp(prefix="startup_bench_")
+        try:
+            path = os.path.join(cache_dir, "prompt_collection.json")
+            write_library(path, prompts, size)
+            eager = eager_startup(path)
+            start = time.perf_counter()
+            PromptStore(path, path=os.path.join(cache_dir, "prompts.sqlite")).close()
+            import_seconds = time.perf_counter() - start
+            lazy, first_agent = lazy_startup(path, cache_dir)
+            print(f"{size:>8} {os.path.getsize(path) / 1024 / 1024:>7.1f} {eager * 1000:>9.1f} {import_seconds * 1000:>10.1f} "
+                  f"{lazy * 1000:>8.2f} {first_agent * 1000:>13.2f}")
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
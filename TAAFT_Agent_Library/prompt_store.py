@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+# Indexes derived from the prompt collection: this store and the agent router vectors.
+DEFAULT_CACHE_DIR = os.getenv("TAAFT_ROUTER_CACHE_DIR", ".agent_index")
+DEFAULT_STORE_PATH = os.path.join(DEFAULT_CACHE_DIR, "prompts.sqlite")
+
+
+class PromptStore:
+    """
+    The prompt collection, indexed in SQLite so a single prompt can be read without parsing the whole JSON file.
+
+    The JSON file is imported once, and again only when its size or modification time changes. After that, opening
+    the store reads a few rows of metadata whatever the size of the library, and each prompt is read by its index
+    (its position in the JSON list) the first time an agent needs it.
+    """
+
+    def __init__(self, source_path: str = "prompt_collection.json", path: str = DEFAULT_STORE_PATH):
+        self.source_path = source_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                examples TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        stat = os.stat(source_path)
+        signature = f"{stat.st_size}-{stat.st_mtime_ns}"
+        if self._meta("signature") != signature:
+            self._import(signature)
+        # SHA-256 of the imported file, the agent router keys its vectors on it.
+        self.version = self._meta("sha256")
+        self.count = int(self._meta("count"))
+
+    def _meta(self, key: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _import(self, signature: str):
+        with open(self.source_path, "rb") as source_file:
+            data = source_file.read()
+        prompts = json.loads(data)
+        with self._conn:
+            self._conn.execute("DELETE FROM prompts")
+            self._conn.executemany(
+                "INSERT INTO prompts (id, name, description, prompt, examples) VALUES (?, ?, ?, ?, ?)",
+                [(index, prompt["name"], prompt["description"], prompt["prompt"], json.dumps(prompt.get("examples", [])))
+                 for index, prompt in enumerate(prompts)])
+            self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("signature", signature), ("sha256", hashlib.sha256(data).hexdigest()), ("count", str(len(prompts)))])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, index: int) -> dict:
+        """The entry at this position of the collection: name, description, prompt and examples."""
+        row = self._conn.execute(
+            "SELECT name, description, prompt, examples FROM prompts WHERE id = ?", (index,)).fetchone()
+        if row is None:
+            raise IndexError(index)
+        return {"name": row[0], "description": row[1], "prompt": row[2], "examples": json.loads(row[3])}
+
+    def descriptions(self) -> list:
+        """(name, description) of every entry, in collection order."""
+        return self._conn.execute("SELECT name, description FROM prompts ORDER BY id").fetchall()
+
+    def examples(self) -> list:
+        """(example question, index of its entry) for every example in the collection."""
+        return [(example, index) for index, examples in self._conn.execute("SELECT id, examples FROM prompts ORDER BY id")
+                for example in json.loads(examples)]
+
+    def close(self):
+        self._conn.close()
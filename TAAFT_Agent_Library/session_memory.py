@@ -0,0 +1,120 @@
+import os
+import sqlite3
+from typing import Callable, Optional
+
+DEFAULT_SESSION_DB = os.getenv("TAAFT_SESSION_DB", "taaft_sessions.db")
+# Tokens of previous questions and answers sent verbatim with every question.
+DEFAULT_HISTORY_TOKENS = int(os.getenv("TAAFT_HISTORY_TOKENS", "3000"))
+DEFAULT_MAX_HISTORY_RUNS = 10
+
+SUMMARY_PROMPT = ("You keep a running summary of a conversation between a user and a team of assistants. "
+                  "Update the summary with the new exchanges: keep the user's goals, facts about them, decisions and "
+                  "open questions, drop small talk. Answer with the updated summary only, at most 200 words.")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about 4 characters per token."""
+    return len(text) // 4
+
+
+def team_turns(team, session_id: str) -> list:
+    """(question, answer) of every completed run of the team in the session, oldest first, without member runs."""
+    session = team.get_session(session_id=session_id)
+    if session is None:
+        return []
+    return [(run.input.input_content_string() if run.input else "", str(run.content))
+            for run in session.runs or [] if run.parent_run_id is None and run.content is not None]
+
+
+def last_member_id(team, session_id: str) -> Optional[str]:
+    """agent_id of the member that answered the latest question of the session, or None if the team answered itself."""
+    session = team.get_session(session_id=session_id)
+    team_runs = [run for run in (session.runs or []) if run.parent_run_id is None] if session is not None else []
+    if not team_runs:
+        return None
+    latest = team_runs[-1]
+    member_runs = [run for run in session.runs if run.parent_run_id == latest.run_id]
+    member_runs += getattr(latest, "member_responses", None) or []
+    for run in reversed(member_runs):
+        if getattr(run, "agent_id", None):
+            return run.agent_id
+    return None
+
+
+def summarize_turns(client, model_id: str, summary: Optional[str], turns: list) -> str:
+    """Folds turns into the summary with one chat completion call (OpenAI compatible client, e.g. groq.Groq)."""
+    exchanges = "\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+    response = client.chat.completions.create(model=model_id, messages=[
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew exchanges:\n{exchanges}"},
+    ])
+    return response.choices[0].message.content.strip()
+
+
+class SessionMemory:
+    """
+    Keeps the conversation history sent with every question within a token budget, however long the session gets.
+
+    The latest turns are sent verbatim (the team's num_history_runs). When they no longer fit in budget_tokens, the
+    oldest of them are folded into a rolling summary, down to half the budget, so the next few turns fit again
+    without another summary. Summarizing only reads the previous summary and the turns that left the window,
+    never the whole session. The summary is stored in the session database, so it survives restarts.
+    """
+
+    def __init__(self, session_id: str, summarize: Callable[[Optional[str], list], str],
+                 db_file: str = DEFAULT_SESSION_DB, budget_tokens: int = DEFAULT_HISTORY_TOKENS,
+                 max_runs: int = DEFAULT_MAX_HISTORY_RUNS):
+        """
+        :param summarize: Returns the new summary from the previous one (or None) and a list of (question, answer).
+        """
+        self.session_id = session_id
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.max_runs = max_runs
+        self.summary_calls = 0
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS taaft_session_summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT,
+                summarized_turns INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+        row = self._conn.execute("SELECT summary, summarized_turns FROM taaft_session_summaries WHERE session_id = ?",
+                                 (session_id,)).fetchone()
+        self.summary, self.summarized_turns = row if row else (None, 0)
+
+    def _window(self, turns: list, budget_tokens: int, max_runs: int) -> int:
+        """Number of latest turns that fit in budget_tokens."""
+        used, count = 0, 0
+        for question, answer in reversed(turns):
+            used += estimate_tokens(question) + estimate_tokens(answer)
+            if count == max_runs or used > budget_tokens:
+                break
+            count += 1
+        return count
+
+    def prepare(self, turns: list) -> tuple:
+        """
+        Decides the context for the next question.
+        :param turns: All (question, answer) of the session so far, oldest first.
+        :return: Number of latest turns to send verbatim, and the summary of the turns before them (or None).
+        """
+        if self.summarized_turns > len(turns):
+            # The session was deleted, the summary belongs to a history that is gone.
+            self.summary, self.summarized_turns = None, 0
+        verbatim = turns[self.summarized_turns:]
+        if self._window(verbatim, self.budget_tokens, self.max_runs) < len(verbatim):
+            keep = self._window(verbatim, self.budget_tokens // 2, self.max_runs // 2)
+            folded = verbatim[:len(verbatim) - keep]
+            self.summary = self.summarize(self.summary, folded)
+            self.summary_calls += 1
+            self.summarized_turns += len(folded)
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO taaft_session_summaries (session_id, summary, summarized_turns) "
+                                   "VALUES (?, ?, ?)", (self.session_id, self.summary, self.summarized_turns))
+        return len(turns) - self.summarized_turns, self.summary
+
+    def close(self):
+        self._conn.close()
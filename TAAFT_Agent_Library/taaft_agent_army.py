@@ -1,31 +1,60 @@
-import json
 import os
 
 from agno.agent import Agent
 from agno.models.groq import Groq
 from agno.team import Team
 from dotenv import load_dotenv
-from agno.db.in_memory import InMemoryDb
+from agno.db.sqlite import SqliteDb
+from groq import Groq as GroqClient
+
+from agent_router import AgentRouter, DEFAULT_TOP_K
+from prompt_store import PromptStore
+from session_memory import DEFAULT_SESSION_DB, SessionMemory, last_member_id, summarize_turns, team_turns
 load_dotenv()
 
-db = InMemoryDb()
-with open("prompt_collection.json", "r") as source_file:
-    prompt_collection = json.load(source_file)
+MODEL_ID = "openai/gpt-oss-20b"
+SESSION_ID = os.getenv("TAAFT_SESSION_ID", "1")
+# Earlier exchanges a member sees: only its own, from its last few runs in the session.
+MEMBER_HISTORY_RUNS = 2
+# Sessions survive restarts.
+db = SqliteDb(db_file=DEFAULT_SESSION_DB)
+# Indexed copy of prompt_collection.json, prompts are only read when their agent is first used.
+prompt_store = PromptStore("prompt_collection.json")
+# One HTTP client (and connection pool) for the team and every member.
+groq_client = GroqClient(api_key=os.environ["GROQ_API_KEY"])
+members = {}
+MEMBER_ID_PREFIX = "taaft-prompt-"
+
+
+def get_member(index: int) -> Agent:
+    """
+    Returns the agent for an entry of the prompt collection, creating it the first time it is needed.
+    :param index: Position of the entry in prompt_collection.json.
+    """
+    if index not in members:
+        single_prompt = prompt_store.get(index)
+        members[index] = Agent(
+            id=f"{MEMBER_ID_PREFIX}{index}",  # the session runs name their member by id, see last_member_id
+            name=single_prompt["name"],
+            model=Groq(MODEL_ID, client=groq_client),
+            description=single_prompt["description"],
+            instructions=single_prompt["prompt"],
+            add_history_to_context=True,
+            num_history_runs=MEMBER_HISTORY_RUNS
+        )
+    return members[index]
+
 
-members_list = [
-    Agent(
-        name=single_prompt["name"],
-        model=Groq("openai/gpt-oss-20b", api_key=os.environ["GROQ_API_KEY"]),
-        description=single_prompt["description"],
-        instructions=single_prompt["prompt"]
-    ) for
-    single_prompt in prompt_collection]
+# Picks the few members worth offering to the team for each question, see agent_router.
+router = AgentRouter(prompt_store)
+# Keeps the history sent with each question within a token budget, older turns are summarized.
+memory = SessionMemory(SESSION_ID, summarize=lambda summary, turns: summarize_turns(groq_client, MODEL_ID, summary, turns))
 
 taaft_agent_team = Team(
     name="TAAFT Agent Library",
     description="A team of agents that can help you with various tasks.",
-    model=Groq("openai/gpt-oss-20b", api_key=os.environ["GROQ_API_KEY"]),
-    members=members_list,
+    model=Groq(MODEL_ID, client=groq_client),
+    members=[],
     determine_input_for_members=False,
     show_members_responses=True,
     debug_mode=True,
@@ -37,5 +66,18 @@ taaft_agent_team = Team(
 
 while True:
     qsn = input("Enter your Question: ")
-    taaft_agent_team.print_response(qsn,session_id="1",user_id="101")
+    # Library prompts interview the user one question at a time: the member that asked stays a candidate for the answer.
+    previous_member = last_member_id(taaft_agent_team, SESSION_ID) or ""
+    keep = [int(previous_member[len(MEMBER_ID_PREFIX):])] if previous_member.startswith(MEMBER_ID_PREFIX) else []
+    keep = [index for index in keep if index < len(prompt_store)]  # the collection may have changed since
+    candidates = router.route(qsn, k=DEFAULT_TOP_K, keep=keep)
+    taaft_agent_team.members = [get_member(index) for index, _ in candidates]
+    print("Candidates: " + ", ".join(f"{get_member(index).name} ({score:.2f})" for index, score in candidates))
+    history_runs, summary = memory.prepare(team_turns(taaft_agent_team, SESSION_ID))
+    # 0 on the first question, or when every earlier turn is in the summary: no run is sent, instead of forcing one in.
+    taaft_agent_team.add_history_to_context = history_runs > 0
+    if history_runs:
+        taaft_agent_team.num_history_runs = history_runs
+    taaft_agent_team.additional_context = f"Summary of the earlier conversation:\n{summary}" if summary else None
+    taaft_agent_team.print_response(qsn,session_id=SESSION_ID,user_id="101")
     print("\n" + "=" * 50 + "\n")
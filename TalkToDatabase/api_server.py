@@ -1,19 +1,37 @@
 # This is my API Server code
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware # Import CORSMiddleware
 
-from TalkToDatabase.helper import refresh_db_schema, CustomJsonEncoder
-from TalkToDatabase.main import smart_db_team, ApplicationResponseModel # Import ApplicationResponseModel
-from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
+# helper and main (pandas, chromadb, psycopg, google-genai, groq, agno) are imported on first use and warmed up in
+# the background after startup, so a worker binds and answers /health right away. See warmup.py.
+from TalkToDatabase.batch import run_question, answer_questions_stream, start_batch_job, get_batch_job, DEFAULT_MAX_CONCURRENCY, MAX_BATCH_CONCURRENCY
+from TalkToDatabase.token_budget import TokenBudget, DEFAULT_TENANT
+from TalkToDatabase.rollups import build_rollups, refresh_rollups, load_registry, start_refresh_scheduler
+from TalkToDatabase.schema_store import schema_store
+from TalkToDatabase.warmup import start_warmup, get_readiness
+from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse, Response
 import json
 import asyncio # Import asyncio
 import threading # Import threading
+import gzip
+import hashlib
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background work of the server: mining new rollups and refreshing the existing ones, right away and
+    then on a schedule, and loading the agents, /ready tells when they are loaded.
+    """
+    start_refresh_scheduler()
+    start_warmup()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -29,6 +47,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _to_json(value) -> str:
+    from TalkToDatabase.helper import CustomJsonEncoder
+    return json.dumps(value, cls=CustomJsonEncoder)
+
 @app.get("/health")
 def health_check():
     """
@@ -36,50 +58,74 @@ def health_check():
     """
     return {"response": "ok"}
 
-@app.get("/refresh_db_schema")
+@app.get("/ready")
+def readiness_check(response: Response):
+    """
+    Readiness endpoint: 200 once the agents and their dependencies are loaded, 503 while they are still warming up
+    or if loading them failed. Queries sent before that are answered too, they wait for the loading.
+    """
+    readiness = get_readiness()
+    if readiness["status"] != "ready":
+        response.status_code = 503
+    return {"response": readiness["status"], **readiness}
+
+@app.get("/refresh_db_schema", status_code=202)
 def perform_refresh_db_schema():
     """
-    Endpoint to refresh the database schema.
+    Endpoint to refresh the database schema. The refresh runs in the background,
+    poll /refresh_db_schema/{job_id} for its status. Queries keep using the old schema until it is done.
+    """
+    from TalkToDatabase.helper import start_refresh_db_schema_job
+    job = start_refresh_db_schema_job()
+    return {"response": "Database schema refresh started.", "job_id": job["job_id"], "status": job["status"]}
+
+@app.get("/refresh_db_schema/{job_id}")
+def get_refresh_db_schema_status(job_id: str):
+    """
+    Endpoint to poll a schema refresh job.
     """
-    response = refresh_db_schema()
-    if "failed" in response.lower():
+    from TalkToDatabase.helper import get_refresh_db_schema_job
+    job = get_refresh_db_schema_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Schema refresh job {job_id} not found.")
+    if job["status"] == "failed":
         raise HTTPException(
             status_code=500,
             detail="Failed to refresh the database schema. Please check the server logs for more details."
         )
-    return {"response": response}
+    return {"response": job["message"], **job}
 
-async def query_generator(query: str, update_queue: asyncio.Queue):
-    # Initialize application_response and put it in team_session_state
-    app_response = ApplicationResponseModel(user_question=query)
-    smart_db_team.team_session_state["application_response"] = app_response
-    smart_db_team.team_session_state["update_queue"] = update_queue # Pass the queue
+@app.get("/rollups")
+def get_rollups():
+    """
+    Endpoint to list the materialized rollups, how often they were used and the query time they saved.
+    """
+    return {"response": list(load_registry().values())}
 
+@app.get("/rollups/refresh")
+def perform_refresh_rollups():
+    """
+    Endpoint to mine the query log for new rollups and refresh all of them now.
+    """
+    try:
+        build_rollups()
+        return {"response": list(refresh_rollups().values())}
+    except Exception as e:
+        print(f"Error refreshing rollups: {e}")
+        raise HTTPException(status_code=500, detail="Failed to refresh the rollups. Please check the server logs for more details.")
+
+async def query_generator(query: str, update_queue: asyncio.Queue, token_budget: TokenBudget):
     # Function to run smart_db_team.run() in a separate thread
     def run_team():
         try:
-            resp = smart_db_team.run(f"User Question: {query}")
-            if len(app_response.insights) == 0:
-                app_response.insights = resp.content
-            final_stats = []
-
-            for x,y in zip(resp.metrics.get("total_tokens", []), app_response.usage_stats):
-                final_stats.append(int(x)+int(y))
-
+            from TalkToDatabase.main import build_smart_db_team # Waits for the warm-up if it is still importing
+            # The team holds the budget, response and queue of its question, concurrent requests need one each.
+            final_response = run_question(build_smart_db_team(), query, update_queue, token_budget)
             # After the team run completes, put a final message or signal
-            final_response = {
-                "user_question": app_response.user_question,
-                "generated_sql_query": app_response.generated_sql_query,
-                "explanation": app_response.explanation,
-                "dataframe": app_response.dataframe.to_dict(orient="records") if app_response.dataframe is not None else None,
-                "insights": app_response.insights,
-                "usage_stats": final_stats, # Include usage stats
-                "status": "completed" # Indicate completion
-            }
-            update_queue.put_nowait(json.dumps(final_response, cls=CustomJsonEncoder))
+            update_queue.put_nowait(_to_json(final_response))
         except Exception as e:
             error_message = {"error": str(e), "status": "error"}
-            update_queue.put_nowait(json.dumps(error_message, cls=CustomJsonEncoder))
+            update_queue.put_nowait(_to_json(error_message))
         finally:
             # Signal that no more data will be put into the queue
             update_queue.put_nowait(None) # Sentinel value to stop the generator
@@ -96,24 +142,131 @@ async def query_generator(query: str, update_queue: asyncio.Queue):
         yield f"data: {data}\n\n" # SSE format
 
 @app.get("/query_db") # Changed to GET endpoint
-async def query_db(query: str): # Receive query as a query parameter
+async def query_db(query: str, tenant_id: str = DEFAULT_TENANT): # Receive query as a query parameter
+    """
+    Answers a question, streaming the progress as server-sent events.
+    tenant_id is not authenticated, see token_budget.py: set it from a gateway, not from the end user.
+    """
     if not query:
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
     print("Received query:", query)
 
+    token_budget = TokenBudget(tenant_id=tenant_id)
+    if token_budget.is_exhausted():
+        raise HTTPException(status_code=429, detail=f"Daily token budget exhausted for tenant '{tenant_id}'.")
+
     update_queue = asyncio.Queue() # Create an async queue
 
-    return StreamingResponse(query_generator(query, update_queue), media_type="text/event-stream")
+    return StreamingResponse(query_generator(query, update_queue, token_budget), media_type="text/event-stream")
+
+class BatchQueryRequest(BaseModel):
+    questions: list[str]
+    max_concurrency: int = Field(DEFAULT_MAX_CONCURRENCY, ge=1, le=MAX_BATCH_CONCURRENCY)
+    tenant_id: str = DEFAULT_TENANT
+    as_job: bool = False # Return a job id to poll instead of streaming the results
+
+async def batch_result_generator(batch_request: BatchQueryRequest):
+    async for result in answer_questions_stream(batch_request.questions, batch_request.max_concurrency, batch_request.tenant_id):
+        yield _to_json(result) + "\n" # NDJSON format
+
+@app.post("/query_db/batch")
+async def query_db_batch(batch_request: BatchQueryRequest):
+    """
+    Endpoint to answer many questions at once. Results are streamed as NDJSON in completion order,
+    each with the index of its question, or a job id is returned when as_job is set.
+    """
+    if not batch_request.questions or any(not question.strip() for question in batch_request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty.")
+    print(f"Received batch of {len(batch_request.questions)} questions")
+
+    if batch_request.as_job:
+        return {"job_id": start_batch_job(batch_request.questions, batch_request.max_concurrency, batch_request.tenant_id)}
+    return StreamingResponse(batch_result_generator(batch_request), media_type="application/x-ndjson")
+
+@app.get("/query_db/batch/{job_id}")
+def get_query_db_batch(job_id: str):
+    """
+    Endpoint to poll a batch job started with as_job.
+    """
+    job = get_batch_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Batch job {job_id} not found.")
+    return json.loads(_to_json(job))
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows gzip, honouring q-values (gzip;q=0 refuses it).
+    :param accept_encoding: str: The Accept-Encoding header value.
+    :return: bool: True if gzip is acceptable.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches the ETag, using the weak comparison the header calls for.
+    :param if_none_match: str: The If-None-Match header value, a list of ETags or "*".
+    :param etag: str: The ETag of the current representation.
+    :return: bool: True if the client already has this representation.
+    """
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return any(candidate.removeprefix("W/") == etag.removeprefix("W/") for candidate in candidates if candidate)
 
 @app.get("/database_schema")
-def get_database_schema():
+def get_database_schema(request: Request, table: list[str] = Query(None), offset: int = Query(0, ge=0),
+                        limit: int = Query(None, ge=0)):
     """
     Endpoint to return the content of database_schema.json.
+    The schema is served from memory with an ETag, gzipped when the client accepts it,
+    and can be filtered with ?table=A&table=B and paginated with offset / limit (in tables).
     """
     try:
-        with open("database_schema.json", "r") as f:
-            schema_data = json.load(f)
-        return schema_data
+        # Body and ETag come from the same version, even if the file changes while the request is served.
+        version = schema_store.snapshot()
+        partial = table is not None or offset > 0 or limit is not None
+        if partial:
+            selected, total_tables = version.select(table, offset, limit)
+            # Every filter / page gets its own ETag, derived from the schema version.
+            variant = hashlib.sha1(repr((sorted(table or []), offset, limit)).encode()).hexdigest()[:12]
+            etag = version.etag[:-1] + f'-{variant}"'
+        else:
+            total_tables = len(version.schema)
+            etag = version.etag
+
+        use_gzip = _accepts_gzip(request.headers.get("accept-encoding", ""))
+        if use_gzip:
+            # The gzipped body is a different representation, so it gets its own strong ETag.
+            etag = etag[:-1] + '-gz"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "X-Total-Tables": str(total_tables)}
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        if partial:
+            content = json.dumps(selected).encode("utf-8")
+            content = gzip.compress(content) if use_gzip else content
+        else:
+            content = version.serialized(compressed=use_gzip)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=content, media_type="application/json", headers=headers)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="database_schema.json not found.")
     except json.JSONDecodeError:
@@ -0,0 +1,196 @@
+"""
+Batch answering of many questions at once, used by /query_db/batch and by offline reporting jobs.
+
+The questions are de-duplicated, the retrieval context of all of them is fetched with one batched embedding call,
+and each unique question is answered by its own SmartDB team (the team keeps per question state) with at most
+max_concurrency questions in flight at the same time.
+
+Usage from Python:
+    results = asyncio.run(answer_questions(["How many employees do we have?", "List all products"]))
+"""
+
+import asyncio
+import os
+import time
+import uuid
+
+from TalkToDatabase.token_budget import TokenBudget, BudgetExceededError, DEFAULT_TENANT
+
+DEFAULT_MAX_CONCURRENCY = 4
+# Upper bound of max_concurrency, every question in flight is a team making model calls.
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", "16"))
+# Seconds a finished batch job can still be polled, then its results are dropped.
+BATCH_JOB_TTL_SECONDS = int(os.getenv("BATCH_JOB_TTL_SECONDS", "3600"))
+
+# job_id -> {"status": "running" | "completed" | "error", "total": int, "results": list, "started_at", "finished_at"}
+batch_jobs = {}
+
+
+def _import_agents() -> tuple:
+    """
+    Returns the helper and main modules. They pull in pandas, chromadb and the model clients, so they are imported
+    on first use and importing this module (from the API server) stays fast.
+    """
+    from TalkToDatabase import helper, main
+    return helper, main
+
+
+def run_question(team, query: str, update_queue: asyncio.Queue, token_budget: TokenBudget, retrieval_context: dict = None) -> dict:
+    """
+    Runs the SmartDB team for one question and returns the final response.
+    :param team: Team: The SmartDB team to use. It must not be answering another question at the same time.
+    :param query: str: The user question.
+    :param update_queue: asyncio.Queue: Queue the tools publish their progress to.
+    :param token_budget: TokenBudget: Token budget of the question.
+    :param retrieval_context: dict: Optional pre-fetched tables, columns and examples for the question.
+    :return: dict: The final response of the question.
+    """
+    _, main = _import_agents()
+    app_response = main.ApplicationResponseModel(user_question=query)
+    team.team_session_state["application_response"] = app_response
+    team.team_session_state["update_queue"] = update_queue # Pass the queue
+    team.team_session_state["token_budget"] = token_budget
+    team.team_session_state["retrieval_context"] = retrieval_context
+
+    # Every model turn and tool call is charged to token_budget as it happens (see main._charge_model_turns).
+    try:
+        resp = team.run(f"User Question: {query}")
+    except BudgetExceededError as e:
+        print(e)
+        resp = None
+    if resp is not None and len(app_response.insights) == 0:
+        app_response.insights = resp.content
+    # agno usually handles the refusal inside the run and still returns a response, the budget knows either way.
+    budget_exceeded = token_budget.refusal is not None
+    if budget_exceeded:
+        # The answer is what the tools produced before the refusal.
+        app_response.explanation = token_budget.refusal
+    final_stats = []
+
+    coordinator_tokens = resp.metrics.get("total_tokens", []) if resp is not None else []
+    for x,y in zip(coordinator_tokens, app_response.usage_stats):
+        final_stats.append(int(x)+int(y))
+
+    return {
+        "user_question": app_response.user_question,
+        "generated_sql_query": app_response.generated_sql_query,
+        "explanation": app_response.explanation,
+        "dataframe": app_response.dataframe.to_dict(orient="records") if app_response.dataframe is not None else None,
+        "insights": app_response.insights,
+        "usage_stats": final_stats, # Include usage stats
+        "token_budget": token_budget.report(), # Spend per stage
+        "status": "budget_exceeded" if budget_exceeded else "completed" # Indicate completion
+    }
+
+
+def _dedupe_key(question: str) -> str:
+    helper, _ = _import_agents()
+    return " ".join(helper.clean_user_question(question).lower().split())
+
+
+async def answer_questions_stream(questions: list, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, tenant_id: str = DEFAULT_TENANT):
+    """
+    Answers a list of questions, yielding each result as soon as it is ready.
+    Duplicate questions are answered once and the result is yielded for every position they appear at.
+    :param questions: list: The user questions.
+    :param max_concurrency: int: Maximum number of questions answered at the same time, at most MAX_BATCH_CONCURRENCY.
+    :param tenant_id: str: Tenant the tokens are charged to.
+    :return: dict: {"index", "question", "duplicate_of", ...final response} per question, in completion order.
+    """
+    # A cold import takes seconds, it must not block the event loop.
+    helper, main = await asyncio.to_thread(_import_agents)
+
+    # Positions of every unique question, in the order they were first asked.
+    unique = {}
+    for index, question in enumerate(questions):
+        unique.setdefault(_dedupe_key(question), []).append(index)
+
+    # Retrieval context for all unique questions with one embedding call.
+    first_indexes = [indexes[0] for indexes in unique.values()]
+    try:
+        contexts = await asyncio.to_thread(helper.retrieve_context, [helper.clean_user_question(questions[index]) for index in first_indexes])
+    except Exception as e:
+        # Without the vector store no question can be answered, every one gets an error line instead of none.
+        print(f"Error retrieving the context of the batch: {e}")
+        for indexes in unique.values():
+            for index in indexes:
+                yield {"index": index, "question": questions[index], "duplicate_of": None if index == indexes[0] else indexes[0],
+                       "error": f"Could not retrieve the context of the question: {e}", "status": "error"}
+        return
+
+    semaphore = asyncio.Semaphore(min(max(1, max_concurrency), MAX_BATCH_CONCURRENCY))
+
+    async def answer(indexes: list, context: dict) -> tuple:
+        query = questions[indexes[0]]
+        async with semaphore:
+            token_budget = TokenBudget(tenant_id=tenant_id)
+            if token_budget.is_exhausted():
+                return indexes, {"error": f"Daily token budget exhausted for tenant '{tenant_id}'.", "status": "error"}
+            try:
+                # Progress updates are not streamed for batches, the queue only keeps the tools happy.
+                result = await asyncio.to_thread(run_question, main.build_smart_db_team(), query, asyncio.Queue(), token_budget, context)
+            except Exception as e:
+                result = {"error": str(e), "status": "error"}
+        return indexes, result
+
+    tasks = [asyncio.create_task(answer(indexes, context)) for indexes, context in zip(unique.values(), contexts)]
+    for finished in asyncio.as_completed(tasks):
+        indexes, result = await finished
+        for index in indexes:
+            yield {"index": index, "question": questions[index], "duplicate_of": None if index == indexes[0] else indexes[0], **result}
+
+
+async def answer_questions(questions: list, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, tenant_id: str = DEFAULT_TENANT) -> list:
+    """
+    Answers a list of questions and returns the results in the same order as the questions.
+    """
+    results = [None] * len(questions)
+    async for result in answer_questions_stream(questions, max_concurrency, tenant_id):
+        results[result["index"]] = result
+    return results
+
+
+def start_batch_job(questions: list, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, tenant_id: str = DEFAULT_TENANT) -> str:
+    """
+    Starts answering the questions in the background of the running event loop.
+    :return: str: Job id to poll with get_batch_job.
+    """
+    _prune_batch_jobs()
+    job_id = str(uuid.uuid4())
+    job = {"job_id": job_id, "status": "running", "total": len(questions), "results": [], "started_at": time.time(), "finished_at": None}
+    batch_jobs[job_id] = job
+
+    async def run_job():
+        try:
+            async for result in answer_questions_stream(questions, max_concurrency, tenant_id):
+                job["results"].append(result)
+            job["status"] = "completed"
+        except Exception as e:
+            job["status"] = "error"
+            job["error"] = str(e)
+        job["finished_at"] = time.time()
+
+    job["task"] = asyncio.get_running_loop().create_task(run_job())
+    return job_id
+
+
+def _prune_batch_jobs():
+    """
+    Drops the jobs finished more than BATCH_JOB_TTL_SECONDS ago, so a long running server does not keep every result.
+    """
+    expired_before = time.time() - BATCH_JOB_TTL_SECONDS
+    for job_id, job in list(batch_jobs.items()):
+        if job["finished_at"] is not None and job["finished_at"] < expired_before:
+            del batch_jobs[job_id]
+
+
+def get_batch_job(job_id: str) -> dict:
+    """
+    Returns the status and the results finished so far of a batch job, or None if the job is unknown or finished
+    more than BATCH_JOB_TTL_SECONDS ago.
+    """
+    _prune_batch_jobs()
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return None
+    return {key: value for key, value in job.items() if key != "task"}
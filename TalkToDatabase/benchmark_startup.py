@@ -0,0 +1,108 @@
+"""
+Measures the cold start of the API server, every sample in a fresh Python process:
+- import: importing TalkToDatabase.api_server
+- eager: the same import followed by the warm-up in the foreground, i.e. everything the import used to load
+  (helper with pandas, chromadb, psycopg, google-genai and groq, and the SmartDB team with agno and Gemini)
+- /health and /ready: seconds from starting uvicorn until each endpoint answers 200
+
+No model or database is called, placeholder API keys are set when missing.
+Run from the repository root:
+    python -m TalkToDatabase.benchmark_startup --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import TalkToDatabase.api_server
+{warm_up}
+print(time.perf_counter() - start)
+"""
+
+
+def _environment() -> dict:
+    environment = dict(os.environ)
+    environment.setdefault("GOOGLE_API_KEY", "benchmark")
+    environment.setdefault("GROQ_API_KEY", "benchmark")
+    # The rollup refresh would connect to Postgres.
+    environment["ROLLUP_REFRESH_SECONDS"] = "0"
+    return environment
+
+
+def time_import(eager: bool) -> float:
+    warm_up = "from TalkToDatabase.warmup import warm_up\nassert warm_up()['status'] == 'ready'" if eager else ""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(warm_up=warm_up)], env=_environment(),
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def time_server(timeout: float) -> tuple:
+    """
+    :return: tuple: Seconds until /health and until /ready answered 200.
+    """
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "TalkToDatabase.api_server:app", "--port", str(port),
+                               "--log-level", "warning"], env=_environment(), stdout=subprocess.DEVNULL)
+    try:
+        if not _wait_for(f"{base_url}/health", timeout):
+            raise RuntimeError("The server did not answer /health")
+        health = time.perf_counter() - start
+        if not _wait_for(f"{base_url}/ready", timeout):
+            raise RuntimeError("The server did not become ready")
+        return health, time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the API server")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Seconds to wait for the server")
+    args = parser.parse_args()
+
+    samples = {"import": [], "eager": [], "/health": [], "/ready": []}
+    for _ in range(args.runs):
+        samples["import"].append(time_import(eager=False))
+        samples["eager"].append(time_import(eager=True))
+        health, ready = time_server(args.timeout)
+        samples["/health"].append(health)
+        samples["/ready"].append(ready)
+
+    print(f"{'measurement':>12} {'median s':>9} {'min s':>7} {'max s':>7}")
+    for name, values in samples.items():
+        print(f"{name:>12} {statistics.median(values):>9.3f} {min(values):>7.3f} {max(values):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
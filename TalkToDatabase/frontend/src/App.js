@@ -219,7 +219,13 @@ function App() {
   const handleRefreshSchema = async () => {
     setIsRefreshing(true);
     try {
-      const result = await axios.get('http://localhost:8000/refresh_db_schema');
+      const started = await axios.get('http://localhost:8000/refresh_db_schema');
+      // The refresh runs in the background, poll the job until it is done.
+      let result = started;
+      while (result.data.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        result = await axios.get(`http://localhost:8000/refresh_db_schema/${started.data.job_id}`);
+      }
       setNotification({ open: true, message: result.data.response || 'Database schema refreshed successfully!', severity: 'success' });
       setDbSchemaContent(null); // Clear schema content to force re-fetch
     } catch (err) {
@@ -4,6 +4,7 @@ import pprint
 import decimal # Import decimal
 import pandas as pd
 from chromadb import Settings
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
 from dotenv import load_dotenv
 import psycopg
 import uuid
@@ -14,9 +15,30 @@ from google.genai import types
 from agno.agent.agent import Agent
 from groq import Groq
 import asyncio # Import asyncio
+from TalkToDatabase.token_budget import TokenBudget, BudgetExceededError
+from TalkToDatabase.rollups import rewrite_with_rollup, record_query, record_rollup_hit, load_registry, rollup_is_fresh
+from TalkToDatabase.schema_store import schema_store, SCHEMA_FILE
+import time
+import threading
 
 load_dotenv()
 
+EMBEDDINGS_PATH = "Embeddings/"
+# Pointer to the Chroma collections version serving queries, swapped atomically by a schema refresh.
+ACTIVE_EMBEDDINGS_FILE = os.path.join(EMBEDDINGS_PATH, "active_version.json")
+EMBEDDING_COLLECTIONS = ["examples", "table_names", "column_names"]
+# Seconds a replaced collections version is kept after a schema refresh, for the queries of other worker processes
+# that read the pointer before the swap. Queries of this process are tracked and keep their version until they finish.
+EMBEDDINGS_GRACE_SECONDS = int(os.getenv("EMBEDDINGS_GRACE_SECONDS", "600"))
+# Seconds a finished schema refresh job can still be polled.
+SCHEMA_REFRESH_JOB_TTL_SECONDS = int(os.getenv("SCHEMA_REFRESH_JOB_TTL_SECONDS", "3600"))
+
+schema_refresh_jobs = {}
+_schema_refresh_lock = threading.Lock()
+# version -> number of retrieve_context calls of this process reading it, "" is the un-versioned collections.
+_embeddings_readers = {}
+_embeddings_lock = threading.Lock()
+
 class CustomJsonEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, decimal.Decimal):
@@ -37,11 +59,33 @@ async def _publish_update_to_queue(agent: Agent):
         "explanation": app_response.explanation,
         "dataframe": app_response.dataframe.to_dict(orient="records") if app_response.dataframe is not None else None,
         "insights": app_response.insights,
-        "usage_stats": app_response.usage_stats
+        "usage_stats": app_response.usage_stats,
+        "token_budget": agent.team_session_state["token_budget"].report() if "token_budget" in agent.team_session_state else None
     }
     # Put the JSON string into the queue
     await update_queue.put(json.dumps(current_state, cls=CustomJsonEncoder))
 
+
+def _get_token_budget(agent: Agent) -> TokenBudget:
+    """
+    Returns the token budget of the current request, creating a default one if the caller did not set it.
+    """
+    budget = agent.team_session_state.get("token_budget")
+    if budget is None:
+        budget = TokenBudget()
+        agent.team_session_state["token_budget"] = budget
+    return budget
+
+
+def _report_budget_exceeded(agent: Agent, error: BudgetExceededError) -> str:
+    """
+    Publishes the budget error to the UI and returns it as the tool output, so the coordinator stops calling tools.
+    """
+    print(error)
+    agent.team_session_state["application_response"].explanation = str(error)
+    asyncio.run(_publish_update_to_queue(agent)) # Publish update
+    return f"STOP: {error} Do not call any more tools, return this message to the user."
+
 #
 # from openinference.instrumentation.agno import AgnoInstrumentor
 # from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
@@ -80,23 +124,19 @@ def debug_sql_query(agent: Agent, error_message:str ) -> str:
         :return: str: The corrected SQL query.
 
         """
+    budget = _get_token_budget(agent)
+    try:
+        budget.check("debug_sql")
+    except BudgetExceededError as e:
+        return _report_budget_exceeded(agent, e)
+
     # First we will clean the User Question.
     user_question = agent.team_session_state["application_response"].user_question
 
-    # Then we will use the ChromaDB to retrieve the relevant tables and columns.
-    client = chromadb.PersistentClient(path="Embeddings/", settings=Settings(anonymized_telemetry=False))
-    table_collection = client.get_collection(name="table_names")
-    tables_result = table_collection.query(
-        query_texts=[user_question],
-        n_results=3
-    )
-
-    # Then we will use the retrieved tables and columns to generate the SQL query.
-    column_collection = client.get_collection(name="column_names")
-    columns_result = column_collection.query(
-        query_texts=[user_question],
-        n_results=5
-    )
+    # Then we will use the ChromaDB to retrieve the relevant tables and columns, unless the batch already did.
+    context = agent.team_session_state.get("retrieval_context")
+    if context is None:
+        context = retrieve_context([user_question])[0]
 
     db_type = "Postgres"
 
@@ -105,8 +145,8 @@ def debug_sql_query(agent: Agent, error_message:str ) -> str:
 
         You will be provided with:
         1.  **User Question:** {user_question}
-        2.  **Relevant Tables:** {','.join(tables_result["documents"][0])}
-        3.  **Relevant Column Data :** {' \n '.join([str(single_col) for single_col in columns_result["metadatas"][0]])}
+        2.  **Relevant Tables:** {','.join(context["tables"])}
+        3.  **Relevant Column Data :** {' \n '.join([str(single_col) for single_col in context["columns"]])}
         4.  **Database Schema:** dbo
         5. **Error Message:** {error_message}
         6. **Generated SQL Query:** {agent.team_session_state["application_response"].generated_sql_query}
@@ -125,18 +165,22 @@ def debug_sql_query(agent: Agent, error_message:str ) -> str:
 
     """
 
+    # Model and thinking budget go down as the request budget drains.
+    model_name, thinking_budget = budget.choose_gemini_config()
     client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
     llm_response = client.models.generate_content(
-        model="gemini-2.5-pro",
+        model=model_name,
         contents=debug_prompt,
         config=types.GenerateContentConfig(
-            thinking_config=types.ThinkingConfig(thinking_budget=-1),
+            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
             temperature=0.2,
             response_mime_type="application/json",
             response_schema=SQLOutput
         )
     )
 
+    budget.record("debug_sql", llm_response.usage_metadata.total_token_count)
+
     output_response: SQLOutput = llm_response.parsed
     agent.team_session_state["application_response"].generated_sql_query = output_response.generated_sql_query
     agent.team_session_state["application_response"].explanation = output_response.explanation
@@ -144,6 +188,48 @@ def debug_sql_query(agent: Agent, error_message:str ) -> str:
 
     return output_response.generated_sql_query
 
+def clean_user_question(user_question: str) -> str:
+    """
+    Removes quotes and punctuation from the user question before it is embedded.
+    """
+    return user_question.replace("'", "").replace('"', '').replace("?", "").replace("!", "").strip()
+
+
+def retrieve_context(questions: list) -> list:
+    """
+    Retrieves the relevant tables, columns and examples for a list of questions.
+    All the questions are embedded once, in a single batch, and the embeddings are reused for the three collections.
+    :param questions: list: Cleaned user questions.
+    :return: list: One dict per question with "tables", "columns" and "examples".
+    """
+    client = chromadb.PersistentClient(path=EMBEDDINGS_PATH, settings=Settings(anonymized_telemetry=False))
+    # The collections are created with the default embedding function, so the same one is used for the questions.
+    query_embeddings = DefaultEmbeddingFunction()(questions)
+
+    # The version is held until the three queries are done, a schema refresh does not drop it in between.
+    with _embeddings_lock:
+        version = get_active_embeddings_version()
+        reader_key = version or ""
+        _embeddings_readers[reader_key] = _embeddings_readers.get(reader_key, 0) + 1
+    try:
+        tables_result = client.get_collection(name=_collection_name("table_names", version)).query(query_embeddings=query_embeddings, n_results=3)
+        columns_result = client.get_collection(name=_collection_name("column_names", version)).query(query_embeddings=query_embeddings, n_results=5)
+        examples_result = client.get_collection(name=_collection_name("examples", version)).query(query_embeddings=query_embeddings, n_results=3)
+    finally:
+        with _embeddings_lock:
+            _embeddings_readers[reader_key] -= 1
+            if not _embeddings_readers[reader_key]:
+                del _embeddings_readers[reader_key]
+
+    return [
+        {
+            "tables": tables_result["documents"][index],
+            "columns": columns_result["metadatas"][index],
+            "examples": examples_result["metadatas"][index],
+        } for index in range(len(questions))
+    ]
+
+
 def generate_sql_query(agent: Agent) -> str:
     """
     Generates a SQL query based on the user's question.
@@ -151,57 +237,43 @@ def generate_sql_query(agent: Agent) -> str:
     :return: str: The generated SQL query.
 
     """
+    budget = _get_token_budget(agent)
+    try:
+        budget.check("generate_sql")
+    except BudgetExceededError as e:
+        return _report_budget_exceeded(agent, e)
+
     # First we will clean the User Question.
     user_question = agent.team_session_state["application_response"].user_question
     asyncio.run(_publish_update_to_queue(agent)) # Publish update
 
-    cleaned_question = user_question.replace("'", "").replace('"', '').replace("?", "").replace("!", "").strip()
+    cleaned_question = clean_user_question(user_question)
 
     agent.team_session_state["application_response"].user_question = cleaned_question
     agent.team_session_state["application_response"].generated_sql_query = "Generating Embeddings for the User Question."
     agent.team_session_state["application_response"].explanation = "Generating Embeddings for the User Question."
     asyncio.run(_publish_update_to_queue(agent)) # Publish update
 
-    # Then we will use the ChromaDB to retrieve the relevant tables and columns.
-    client = chromadb.PersistentClient(path="Embeddings/", settings=Settings(anonymized_telemetry=False))
-    table_collection = client.get_collection(name="table_names")
-    tables_result = table_collection.query(
-        query_texts=[cleaned_question],
-        n_results=3
-    )
-    agent.team_session_state["application_response"].generated_sql_query = "Getting relevant Tables and Columns for the User Question."
-    agent.team_session_state["application_response"].explanation = "Getting relevant Tables and Columns for the User Question."
-    asyncio.run(_publish_update_to_queue(agent))  # Publish update
-
-    # Then we will use the retrieved tables and columns to generate the SQL query.
-    column_collection = client.get_collection(name="column_names")
-    columns_result = column_collection.query(
-        query_texts=[cleaned_question],
-        n_results=5
-    )
-
-    agent.team_session_state["application_response"].generated_sql_query = "Getting relevant Examples for the User Question."
-    agent.team_session_state[
-        "application_response"].explanation = "Getting relevant Examples for the User Question."
+    # Then we will use the ChromaDB to retrieve the relevant tables, columns and examples.
+    # Batch runs retrieve the context of all their questions in one call and hand it over, see batch.py.
+    context = agent.team_session_state.get("retrieval_context")
+    if context is None:
+        context = retrieve_context([cleaned_question])[0]
+    agent.team_session_state["application_response"].generated_sql_query = "Getting relevant Tables, Columns and Examples for the User Question."
+    agent.team_session_state["application_response"].explanation = "Getting relevant Tables, Columns and Examples for the User Question."
     asyncio.run(_publish_update_to_queue(agent))  # Publish update
 
-    example_collection = client.get_collection(name="examples")
-    example_queries = example_collection.query(
-        query_texts=[cleaned_question],
-        n_results=3
-    )
-
     db_type = "Postgres"
 
     sql_prompt = f""" You are an expert SQL query generator. Your task is to translate natural language questions into accurate and efficient {db_type}-compatible SQL queries.
     
     You will be provided with:
     1.  **User Question:** {user_question}
-    2.  **Relevant Tables:** {','.join(tables_result["documents"][0])}
-    3.  **Relevant Column Data :** { ' \n '.join([str(single_col) for single_col in columns_result["metadatas"][0]])}
+    2.  **Relevant Tables:** {','.join(context["tables"])}
+    3.  **Relevant Column Data :** { ' \n '.join([str(single_col) for single_col in context["columns"]])}
     4.  **Database Schema:** dbo
     5.  **Example SQLs:** 
-        {' \n '.join([str(single_example) for single_example in example_queries["metadatas"][0]])}
+        {' \n '.join([str(single_example) for single_example in context["examples"]])}
     ---
     
     **Instructions to follow:**
@@ -221,18 +293,22 @@ def generate_sql_query(agent: Agent) -> str:
         "application_response"].explanation = "Getting SQL based on the User Question."
     asyncio.run(_publish_update_to_queue(agent))  # Publish update
 
+    # Model and thinking budget go down as the request budget drains.
+    model_name, thinking_budget = budget.choose_gemini_config()
     client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
     llm_response = client.models.generate_content(
-        model="gemini-2.5-pro",
+        model=model_name,
         contents=sql_prompt,
         config=types.GenerateContentConfig(
-            thinking_config=types.ThinkingConfig(thinking_budget=-1),
+            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
             temperature=0.2,
             response_mime_type="application/json",
             response_schema=SQLOutput
         )
     )
 
+    budget.record("generate_sql", llm_response.usage_metadata.total_token_count)
+
     output_response: SQLOutput = llm_response.parsed
     agent.team_session_state["application_response"].generated_sql_query = output_response.generated_sql_query
     agent.team_session_state["application_response"].explanation = output_response.explanation
@@ -275,12 +351,31 @@ def execute_query(agent: Agent, sql_query: str) -> tuple:
     try:
         db_url = f"postgresql://{os.environ['POSTGRESQL_USERNAME']}:{os.environ['POSTGRESQL_PASSWORD']}@{os.environ['POSTGRESQL_HOST']}:{os.environ['POSTGRESQL_PORT']}/{os.environ['POSTGRESQL_DATABASE']}"
         # sql_query = sql_query.replace("```sql", "").replace("```", "").strip()  # Clean the SQL query
+        # Read from a materialized rollup if one answers the same question.
+        registry = load_registry()
+        executed_sql, rollup_name = rewrite_with_rollup(sql_query, registry)
+        start = time.perf_counter()
         with psycopg.connect(db_url) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(sql_query)
+                if rollup_name and not rollup_is_fresh(cursor, registry[rollup_name]):
+                    # The table changed since the rollup was refreshed, its answer would be out of date.
+                    executed_sql, rollup_name = sql_query, None
+                try:
+                    cursor.execute(executed_sql)
+                except Exception as e:
+                    if rollup_name is None:
+                        raise
+                    print(f"Rollup {rollup_name} failed, running the original query: {e}")
+                    conn.rollback()
+                    executed_sql, rollup_name = sql_query, None
+                    cursor.execute(executed_sql)
                 if cursor.description:
                     headers = [desc[0] for desc in cursor.description]
                     rows = cursor.fetchall()
+                    duration_ms = (time.perf_counter() - start) * 1000
+                    record_query(sql_query, executed_sql, rollup_name, duration_ms, len(rows))
+                    if rollup_name:
+                        record_rollup_hit(rollup_name, duration_ms)
                     df = pd.DataFrame(rows, columns=headers)
                     agent.team_session_state["application_response"].dataframe = df
                     agent.team_session_state["application_response"].usage_stats.append(0)
@@ -316,16 +411,70 @@ def get_all_columns(table_name: str) -> list:
     return [(row[0], row[1]) for row in rows] if rows else []
 
 
+def _collection_name(base_name: str, version: str) -> str:
+    return f"{base_name}_{version}" if version else base_name
+
+
+def _load_active_embeddings() -> dict:
+    """
+    Returns {"version": active version, "retired": {version: time it was replaced}} from ACTIVE_EMBEDDINGS_FILE.
+    Versions are "" for the un-versioned collections in "retired".
+    """
+    try:
+        with open(ACTIVE_EMBEDDINGS_FILE, "r") as file:
+            active = json.load(file)
+    except FileNotFoundError:
+        return {"version": None, "retired": {}}
+    retired = active.get("retired", {})
+    if "previous_version" in active:
+        # Written before replaced versions had a grace period, the previous version is retired from now on.
+        retired.setdefault(active["previous_version"] or "", time.time())
+    return {"version": active["version"], "retired": retired}
+
+
+def get_active_embeddings_version() -> str:
+    """
+    Returns the version of the Chroma collections currently serving queries.
+    None means the un-versioned collections built before refreshes were versioned.
+    """
+    return _load_active_embeddings()["version"]
+
+
+def _activate_embeddings_version(version: str):
+    """
+    Points the readers to the given collections version, and drops the collections no query can still be reading:
+    the replaced versions are kept while a retrieve_context call of this process holds them, and for
+    EMBEDDINGS_GRACE_SECONDS after they were replaced.
+    """
+    with _embeddings_lock:
+        active = _load_active_embeddings()
+        retired = active["retired"]
+        retired.setdefault(active["version"] or "", time.time())
+        retired.pop(version or "", None)
+        expired_before = time.time() - EMBEDDINGS_GRACE_SECONDS
+        retired = {v: retired_at for v, retired_at in retired.items() if retired_at >= expired_before or v in _embeddings_readers}
+        temp_file = ACTIVE_EMBEDDINGS_FILE + ".tmp"
+        with open(temp_file, "w") as file:
+            json.dump({"version": version, "retired": retired}, file)
+        os.replace(temp_file, ACTIVE_EMBEDDINGS_FILE)
+
+    # Readers only pick the active version, so the dropped ones can be deleted outside of the lock.
+    client = chromadb.PersistentClient(path=EMBEDDINGS_PATH, settings=Settings(anonymized_telemetry=False))
+    keep = {_collection_name(base_name, v) for base_name in EMBEDDING_COLLECTIONS for v in [version, *retired]}
+    for collection in client.list_collections():
+        name = getattr(collection, "name", collection)
+        if name not in keep:
+            client.delete_collection(name=name)
+
+
 def refresh_db_schema() -> str:
     """
     Refreshes the database schema by retrieving all tables and their columns.
+    The new schema and embeddings are built next to the live ones and swapped in only when complete,
+    so queries running in the meantime keep using the old ones.
     :return: str: A message indicating the schema has been refreshed.
     """
-    # Delete the existing schema file if it exists.
     try:
-        if os.path.exists("database_schema.json"):
-            os.remove("database_schema.json")
-
         tables = get_all_tables()
         schema = {}
         for table in tables:
@@ -333,14 +482,19 @@ def refresh_db_schema() -> str:
                 if table not in schema:
                     schema[table] = []
                 schema[table].append({"column_name": single_col, "data_type": data_type, "column_description": ""})
+        if not schema:
+            return "Failed to refresh database schema. No tables found."
 
-        # Write the schema to a JSON file.
-        schema_file_path = "database_schema.json"
-        with open(schema_file_path, 'w') as schema_file:
-            import json
+        # Write the schema to a staging file, it replaces the live file only after the embeddings are built.
+        staging_file_path = SCHEMA_FILE + ".staging"
+        with open(staging_file_path, 'w') as schema_file:
             json.dump(schema, schema_file, indent=4)
 
-        generate_embeddings()
+        version = generate_embeddings(schema, activate=False)
+
+        os.replace(staging_file_path, SCHEMA_FILE)
+        schema_store.reload()
+        _activate_embeddings_version(version)
 
         return "Database schema refreshed successfully."
     except Exception as e:
@@ -348,10 +502,57 @@ def refresh_db_schema() -> str:
         return "Failed to refresh database schema."
 
 
-def generate_embeddings():
-    client = chromadb.PersistentClient(path="Embeddings/",
-                                       settings=Settings(allow_reset=True, anonymized_telemetry=False))
-    client.reset()  # Empty the database before adding new data.
+def _prune_refresh_db_schema_jobs():
+    """
+    Drops the jobs finished more than SCHEMA_REFRESH_JOB_TTL_SECONDS ago. Called with _schema_refresh_lock held.
+    """
+    expired_before = time.time() - SCHEMA_REFRESH_JOB_TTL_SECONDS
+    for job_id, job in list(schema_refresh_jobs.items()):
+        if job["finished_at"] is not None and job["finished_at"] < expired_before:
+            del schema_refresh_jobs[job_id]
+
+
+def _run_refresh_db_schema_job(job: dict):
+    message = refresh_db_schema()
+    job["message"] = message
+    job["status"] = "failed" if "failed" in message.lower() else "completed"
+    job["finished_at"] = time.time()
+
+
+def start_refresh_db_schema_job() -> dict:
+    """
+    Starts refresh_db_schema in a background thread. If a refresh is already running, that job is returned instead.
+    :return: dict: The job, poll it with get_refresh_db_schema_job.
+    """
+    with _schema_refresh_lock:
+        _prune_refresh_db_schema_jobs()
+        for job in schema_refresh_jobs.values():
+            if job["status"] == "running":
+                return job
+        job = {"job_id": str(uuid.uuid4()), "status": "running", "message": None, "started_at": time.time(), "finished_at": None}
+        schema_refresh_jobs[job["job_id"]] = job
+    threading.Thread(target=_run_refresh_db_schema_job, args=(job,), daemon=True).start()
+    return job
+
+
+def get_refresh_db_schema_job(job_id: str) -> dict:
+    """
+    Returns a schema refresh job, or None if it is unknown or finished more than SCHEMA_REFRESH_JOB_TTL_SECONDS ago.
+    """
+    with _schema_refresh_lock:
+        _prune_refresh_db_schema_jobs()
+        return schema_refresh_jobs.get(job_id)
+
+
+def generate_embeddings(database_schema: dict = None, activate: bool = True) -> str:
+    """
+    Builds a new version of the examples, table and column collections in ChromaDB.
+    :param database_schema: dict: The schema to embed, the live schema when not given.
+    :param activate: bool: Switch the readers to the new collections straight away.
+    :return: str: Version of the new collections.
+    """
+    client = chromadb.PersistentClient(path=EMBEDDINGS_PATH, settings=Settings(anonymized_telemetry=False))
+    version = time.strftime('%Y%m%d%H%M%S') + "_" + uuid.uuid4().hex[:6]
 
 
     # Storing Examples in ChromaDB.
@@ -359,7 +560,7 @@ def generate_embeddings():
         examples = file.read()
         examples = json.loads(examples)
 
-    example_collection = client.create_collection(name="examples")
+    example_collection = client.create_collection(name=_collection_name("examples", version))
 
     print("Storing examples in ChromaDB...")
     example_collection.add(
@@ -369,14 +570,12 @@ def generate_embeddings():
     )
     print("Examples stored in ChromaDB.")
 
-    with open("database_schema.json", "r") as file:
-        schema = file.read()
-
-    database_schema = json.loads(schema)
+    if database_schema is None:
+        database_schema = schema_store.get()
 
     # Storing Table Names in ChromaDB.
 
-    collection = client.create_collection(name="table_names")
+    collection = client.create_collection(name=_collection_name("table_names", version))
     print("Storing table names in ChromaDB...")
 
     collection.add(
@@ -388,7 +587,7 @@ def generate_embeddings():
 
     # Storing Column Names in ChromaDB.
     print("Storing column names in ChromaDB...")
-    collection = client.create_collection(name="column_names")
+    collection = client.create_collection(name=_collection_name("column_names", version))
     for table_name, columns in database_schema.items():
         collection.add(
             documents=[column["column_name"] for column in columns],
@@ -399,6 +598,10 @@ def generate_embeddings():
         )
     print(f"Column stored in ChromaDB.")
 
+    if activate:
+        _activate_embeddings_version(version)
+    return version
+
 
 def generate_conversation_id() -> str:
     """
@@ -418,6 +621,12 @@ def generate_insights(agent: Agent, question: str) -> str:
     if dataframe.empty:
         return "No data available to generate insights."
 
+    budget = _get_token_budget(agent)
+    try:
+        budget.check("insights")
+    except BudgetExceededError as e:
+        return _report_budget_exceeded(agent, e)
+
     # Convert the DataFrame to a string representation for the LLM.
     df_str = dataframe.to_csv(index=False)
 
@@ -442,6 +651,7 @@ def generate_insights(agent: Agent, question: str) -> str:
         ],
         model="llama-3.1-8b-instant"
     )
+    budget.record("insights", response.usage.total_tokens)
     content = response.choices[0].message.content
     agent.team_session_state["application_response"].insights = content
     agent.team_session_state["application_response"].usage_stats.append(response.usage.total_tokens)
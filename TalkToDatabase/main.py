@@ -1,5 +1,6 @@
 # https://towardsdatascience.com/a-multi-agent-sql-assistant-you-can-trust-with-human-in-loop-checkpoint-llm-cost-control/
 import os
+import threading
 
 import pandas as pd
 from agno.agent import Agent
@@ -28,45 +29,130 @@ class ApplicationResponseModel(BaseModel):
     update_queue: asyncio.Queue = None
 
 
-sql_manger = Agent(
-    name="SQL Manager Agent",
-    tools=[generate_sql_query, execute_query, debug_sql_query],
-    model=Gemini("gemini-2.5-flash",api_key=os.environ["GOOGLE_API_KEY"]),
-    debug_mode=True,
-)
-
-insight_generator = Agent(
-    name="Insight Generator Agent",
-    tools=[generate_insights],
-    instructions=""" Always use the tool to generate insights based on the dataframe provided by the SQL Manager Agent.""",
-    model=Gemini("gemini-2.5-flash", api_key=os.environ["GOOGLE_API_KEY"]),
-    debug_mode=True,
-)
-
-smart_db_team = Team(
-    name="SmartDB Team",
-    description="A team of agents that can help you with database queries and management.",
-    mode="coordinate",
-    members=[sql_manger, insight_generator],
-    model=Gemini("gemini-2.5-flash",api_key=os.environ["GOOGLE_API_KEY"]),
-    instructions="""
-    You will perform the tasks and complete it using appropriate agent. Things to consider while performing the tasks:
-    1. Be concise and clear in your responses.
-    2. If you are able to generate a SQL query and execute it, generate the insights based on the dataframe returned by the SQL Manager Agent and try to answer the question.
-    3. If there is any error in the SQL query, use the debug_sql_query tool to debug the query and then execute it.
-    4. Perform the debugging of the SQL query max 3 times only. If the query is still not working, then return the error message to the user.
-    5. Always Generate insights whenever a SQL query is executable, without any error. Do not use your own knowledge to generate insights. Call the generate_insights tool to generate insights.
-    6. Do not write any code in Insights. Its for end-user so keep it clean.
+def _charge_model_turns(model: Gemini, stage: str, get_budget) -> Gemini:
+    """
+    Records the tokens of every turn of the model against the token budget of the question being answered, and
+    refuses a turn once the budget is spent, so a chatty coordinator or member is stopped during the run.
+    :param stage: str: Name the tokens are reported under.
+    :param get_budget: Returns the TokenBudget of the current question, or None.
+    :return: Gemini: The same model.
+    """
+    def start():
+        budget = get_budget()
+        if budget is not None:
+            budget.check(stage)  # Raises BudgetExceededError, which ends the run.
+        return budget
+
+    def charge(budget, usage):
+        if budget is not None and usage is not None:
+            budget.record(stage, usage.total_token_count)
+
+    invoke, ainvoke, invoke_stream, ainvoke_stream = model.invoke, model.ainvoke, model.invoke_stream, model.ainvoke_stream
+
+    def counted_invoke(*args, **kwargs):
+        budget = start()
+        response = invoke(*args, **kwargs)
+        charge(budget, response.usage_metadata)
+        return response
+
+    async def counted_ainvoke(*args, **kwargs):
+        budget = start()
+        response = await ainvoke(*args, **kwargs)
+        charge(budget, response.usage_metadata)
+        return response
+
+    # Streamed chunks carry the usage so far, the last one the total.
+    def counted_invoke_stream(*args, **kwargs):
+        budget, usage = start(), None
+        for chunk in invoke_stream(*args, **kwargs):
+            usage = chunk.usage_metadata or usage
+            yield chunk
+        charge(budget, usage)
+
+    async def counted_ainvoke_stream(*args, **kwargs):
+        budget, usage = start(), None
+        async for chunk in ainvoke_stream(*args, **kwargs):
+            usage = chunk.usage_metadata or usage
+            yield chunk
+        charge(budget, usage)
+
+    model.invoke, model.ainvoke = counted_invoke, counted_ainvoke
+    model.invoke_stream, model.ainvoke_stream = counted_invoke_stream, counted_ainvoke_stream
+    return model
+
+
+def build_smart_db_team() -> Team:
+    """
+    Builds a SmartDB team with its own agents and session state.
+    Every team holds the state of the question it is answering, so concurrent questions need one team each.
+    """
+    def get_budget():
+        return team.team_session_state.get("token_budget")
+
+    sql_manger = Agent(
+        name="SQL Manager Agent",
+        tools=[generate_sql_query, execute_query, debug_sql_query],
+        model=_charge_model_turns(Gemini("gemini-2.5-flash",api_key=os.environ["GOOGLE_API_KEY"]), "sql_manager", get_budget),
+        debug_mode=True,
+    )
+
+    insight_generator = Agent(
+        name="Insight Generator Agent",
+        tools=[generate_insights],
+        instructions=""" Always use the tool to generate insights based on the dataframe provided by the SQL Manager Agent.""",
+        model=_charge_model_turns(Gemini("gemini-2.5-flash", api_key=os.environ["GOOGLE_API_KEY"]), "insight_generator", get_budget),
+        debug_mode=True,
+    )
+
+    team = Team(
+        name="SmartDB Team",
+        description="A team of agents that can help you with database queries and management.",
+        mode="coordinate",
+        members=[sql_manger, insight_generator],
+        model=_charge_model_turns(Gemini("gemini-2.5-flash",api_key=os.environ["GOOGLE_API_KEY"]), "coordinator", get_budget),
+        instructions="""
+        You will perform the tasks and complete it using appropriate agent. Things to consider while performing the tasks:
+        1. Be concise and clear in your responses.
+        2. If you are able to generate a SQL query and execute it, generate the insights based on the dataframe returned by the SQL Manager Agent and try to answer the question.
+        3. If there is any error in the SQL query, use the debug_sql_query tool to debug the query and then execute it.
+        4. Perform the debugging of the SQL query max 3 times only. If the query is still not working, then return the error message to the user.
+        5. Always Generate insights whenever a SQL query is executable, without any error. Do not use your own knowledge to generate insights. Call the generate_insights tool to generate insights.
+        6. Do not write any code in Insights. Its for end-user so keep it clean.
+        7. If a tool returns a message starting with STOP, the token budget is exhausted. Do not call any more tools and return that message to the user.
     
-    Do not assume any data. The Tools provided by the agents are capable enough to handle the tasks.
-    Always check the task to do before routing to an agent.
-    Do not use your own knowledge to answer the question, always use the team members and there tools to perform the task.
-    Remember: You are the final gatekeeper of the task. You need to make sure that the task is completed by the appropriate agent.
-    """,
-    debug_mode=True,
-    show_members_responses=True,
-    team_session_state={"application_response": ApplicationResponseModel()},
-)
+        Do not assume any data. The Tools provided by the agents are capable enough to handle the tasks.
+        Always check the task to do before routing to an agent.
+        Do not use your own knowledge to answer the question, always use the team members and there tools to perform the task.
+        Remember: You are the final gatekeeper of the task. You need to make sure that the task is completed by the appropriate agent.
+        """,
+        debug_mode=True,
+        show_members_responses=True,
+        team_session_state={"application_response": ApplicationResponseModel()},
+    )
+    return team
+
+
+_smart_db_team = None
+_smart_db_team_lock = threading.Lock()
+
+
+def get_smart_db_team() -> Team:
+    """
+    Returns a shared SmartDB team, built on first use, for scripts answering one question at a time.
+    It must not answer two questions at the same time, the API server builds a team per question instead.
+    """
+    global _smart_db_team
+    with _smart_db_team_lock:
+        if _smart_db_team is None:
+            _smart_db_team = build_smart_db_team()
+    return _smart_db_team
+
+
+def __getattr__(name):
+    # smart_db_team is built on first access, so importing this module does not create the Gemini models.
+    if name == "smart_db_team":
+        return get_smart_db_team()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # if __name__ == "__main__":
 #     You can add more functionality here to interact with the team or run specific tasks.
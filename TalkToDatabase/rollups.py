@@ -0,0 +1,546 @@
+"""
+Materialized pre-aggregations (rollups) for recurring aggregate questions.
+
+Questions like "headcount by department" or "employees joined per month" end up as the same
+SELECT <dimensions>, COUNT/SUM/AVG/MIN/MAX(...) FROM dbo."Table" GROUP BY <dimensions> query again and again.
+This module:
+1. Mines the query log (query_log.jsonl, written by execute_query) and examples.json for these aggregate patterns.
+2. Creates a Postgres materialized view per recurring pattern, grouped by the pattern dimensions and storing
+   COUNT(*), plus SUM / COUNT / MIN / MAX of every measured column.
+3. Rewrites a generated SQL query to read from a rollup when that is semantically equivalent, i.e. a single table
+   query whose GROUP BY dimensions and WHERE columns are covered by the rollup dimensions. Aggregates are re-aggregated
+   (COUNT(*) -> SUM("count_all"), AVG(x) -> SUM("sum_x")::numeric / SUM("count_x"), ...) so grouping by a subset of the rollup
+   dimensions gives the same answer.
+4. Refreshes the materialized views on a schedule and keeps timings of the original vs the rollup query.
+   A rollup is only used while its base table is unchanged since the last refresh (see rollup_is_fresh), so a
+   rewritten query never returns older data than the original query would.
+
+Only single table queries are handled. Queries with JOINs, sub queries, DISTINCT aggregates or window functions are
+always executed as generated.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+QUERY_LOG_FILE = "query_log.jsonl"
+# Once the query log reaches this size it is moved to query_log.jsonl.1 (replacing the previous one) and restarted.
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+ROLLUP_REGISTRY_FILE = "rollups.json"
+EXAMPLES_FILE = "examples.json"
+ROLLUP_SCHEMA = "dbo"
+ROLLUP_MIN_OCCURRENCES = int(os.getenv("ROLLUP_MIN_OCCURRENCES", "3"))
+ROLLUP_REFRESH_SECONDS = int(os.getenv("ROLLUP_REFRESH_SECONDS", "3600"))
+
+_AGGREGATE_PATTERN = re.compile(r'\b(COUNT|SUM|AVG|MIN|MAX)\s*\(\s*(DISTINCT\s+)?([^()]*?)\s*\)', re.IGNORECASE)
+_DATE_TRUNC_PATTERN = re.compile(r"^DATE_TRUNC\s*\(\s*'(\w+)'\s*,\s*(?:\w+\.)?\"?(\w+)\"?\s*\)$", re.IGNORECASE)
+_COLUMN_PATTERN = re.compile(r'^(?:\w+\.)?"?(\w+)"?$')
+_FROM_PATTERN = re.compile(r'\bFROM\s+(?:dbo\.)?"?(\w+)"?(?:\s+(?:AS\s+)?(?!WHERE\b|GROUP\b|ORDER\b|LIMIT\b)(\w+))?', re.IGNORECASE)
+_UNSUPPORTED_PATTERN = re.compile(r'\b(JOIN|UNION|INTERSECT|EXCEPT|OVER|WITH|DECLARE|DISTINCT)\b', re.IGNORECASE)
+_WHERE_KEYWORDS = {"AND", "OR", "NOT", "IN", "IS", "NULL", "TRUE", "FALSE", "LIKE", "ILIKE", "BETWEEN"}
+
+# Reentrant: _update_registry holds it across load_registry and _save_registry.
+_registry_lock = threading.RLock()
+_refresh_thread = None
+
+
+def _db_url() -> str:
+    return f"postgresql://{os.environ['POSTGRESQL_USERNAME']}:{os.environ['POSTGRESQL_PASSWORD']}@{os.environ['POSTGRESQL_HOST']}:{os.environ['POSTGRESQL_PORT']}/{os.environ['POSTGRESQL_DATABASE']}"
+
+
+def _run_statement(sql: str) -> float:
+    """
+    Runs a statement, fetching all rows if it returns any.
+    :return: float: Time taken in milliseconds.
+    """
+    import psycopg  # Imported on first use, importing this module stays cheap for the API server.
+
+    start = time.perf_counter()
+    with psycopg.connect(_db_url()) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            if cursor.description:
+                cursor.fetchall()
+    return (time.perf_counter() - start) * 1000
+
+
+def _split_clauses(sql: str) -> dict:
+    """
+    Splits a flat SELECT statement into its clauses. Returns None if the statement is not a flat SELECT.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    if not sql.upper().startswith("SELECT") or sql.upper().count("SELECT") != 1:
+        return None
+    positions = []
+    for keyword in ("SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT", "OFFSET"):
+        matches = list(re.finditer(r'\b' + keyword.replace(" ", r"\s+") + r'\b', sql, re.IGNORECASE))
+        if len(matches) > 1:
+            return None
+        if matches:
+            positions.append((matches[0].start(), matches[0].end(), keyword))
+    positions.sort()
+    clauses = {}
+    for index, (start, end, keyword) in enumerate(positions):
+        next_start = positions[index + 1][0] if index + 1 < len(positions) else len(sql)
+        clauses[keyword] = sql[end:next_start].strip()
+    return clauses
+
+
+def _split_list(text: str) -> list:
+    """
+    Splits a comma separated list, ignoring commas inside brackets.
+    """
+    items, depth, current = [], 0, ""
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def _parse_dimension(expression: str):
+    """
+    Converts a GROUP BY item into a dimension dict, or None if it is not a column or DATE_TRUNC of a column.
+    """
+    expression = expression.strip()
+    date_trunc = _DATE_TRUNC_PATTERN.match(expression)
+    if date_trunc:
+        unit, column = date_trunc.group(1).lower(), date_trunc.group(2)
+        return {"name": f"{column}__{unit}", "column": column, "unit": unit}
+    column = _COLUMN_PATTERN.match(expression)
+    if column:
+        return {"name": column.group(1), "column": column.group(1), "unit": None}
+    return None
+
+
+def _parse_aggregate(match) -> dict:
+    """
+    Converts a match of _AGGREGATE_PATTERN into an aggregate dict, or None if it can not be re-aggregated.
+    """
+    if match.group(2):  # COUNT(DISTINCT ...) can not be re-aggregated.
+        return None
+    argument = match.group(3)
+    if argument == "*":
+        column = None
+    else:
+        column_match = _COLUMN_PATTERN.match(argument)
+        if not column_match:
+            return None
+        column = column_match.group(1)
+    return {"function": match.group(1).upper(), "column": column, "text": match.group(0)}
+
+
+def parse_aggregate_query(sql: str) -> dict:
+    """
+    Parses a single table aggregate query.
+    :param sql: str: The SQL query.
+    :return: dict: {"table", "alias", "dimensions", "aggregates", "clauses"} or None if the query is not supported.
+    """
+    if _UNSUPPORTED_PATTERN.search(sql):
+        return None
+    clauses = _split_clauses(sql)
+    if not clauses or "GROUP BY" not in clauses or "FROM" not in clauses:
+        return None
+    from_match = _FROM_PATTERN.fullmatch(f"FROM {clauses['FROM']}")
+    if not from_match or "," in clauses["FROM"]:
+        return None
+
+    dimensions = []
+    for item in _split_list(clauses["GROUP BY"]):
+        dimension = _parse_dimension(item)
+        if dimension is None:
+            return None
+        dimensions.append(dimension)
+
+    aggregates = [_parse_aggregate(match) for match in _AGGREGATE_PATTERN.finditer(sql)]
+    if not aggregates or None in aggregates:
+        return None
+
+    return {
+        "table": from_match.group(1),
+        "alias": from_match.group(2),
+        "dimensions": dimensions,
+        "aggregates": aggregates,
+        "clauses": clauses,
+    }
+
+
+def _measure_columns(aggregates: list) -> list:
+    """
+    Returns the rollup measure columns needed to answer the given aggregates.
+    """
+    measures = ["count_all"]
+    for aggregate in aggregates:
+        column, function = aggregate["column"], aggregate["function"]
+        if column is None:
+            continue
+        if function in ("SUM", "AVG"):
+            measures += [f"sum_{column}", f"count_{column}"]
+        elif function == "COUNT":
+            measures.append(f"count_{column}")
+        else:
+            measures.append(f"{function.lower()}_{column}")
+    return list(dict.fromkeys(measures))
+
+
+def mine_patterns(min_occurrences: int = ROLLUP_MIN_OCCURRENCES) -> list:
+    """
+    Finds aggregate patterns which repeat in the query log and examples.json.
+    :param min_occurrences: int: How often a (table, dimensions) pair must be seen to be worth a rollup.
+    :return: list: Patterns sorted by how often they were seen.
+    """
+    queries = []
+    if os.path.exists(EXAMPLES_FILE):
+        with open(EXAMPLES_FILE, "r") as file:
+            queries += [example["example_answer"] for example in json.load(file)]
+    for log_file in (QUERY_LOG_FILE + ".1", QUERY_LOG_FILE):
+        if os.path.exists(log_file):
+            with open(log_file, "r") as file:
+                for line in file:
+                    if line.strip():
+                        queries.append(json.loads(line)["sql"])
+
+    patterns = {}
+    for sql in queries:
+        parsed = parse_aggregate_query(sql)
+        if parsed is None:
+            continue
+        dimensions = sorted({json.dumps(dimension, sort_keys=True) for dimension in parsed["dimensions"]})
+        key = (parsed["table"], tuple(dimensions))
+        pattern = patterns.setdefault(key, {"table": parsed["table"], "dimensions": [json.loads(d) for d in dimensions], "measures": [], "occurrences": 0})
+        pattern["occurrences"] += 1
+        pattern["measures"] = list(dict.fromkeys(pattern["measures"] + _measure_columns(parsed["aggregates"])))
+
+    frequent = [pattern for pattern in patterns.values() if pattern["occurrences"] >= min_occurrences]
+    return sorted(frequent, key=lambda pattern: pattern["occurrences"], reverse=True)
+
+
+def _rollup_name(table: str, dimensions: list) -> str:
+    digest = hashlib.sha1(json.dumps([table, dimensions], sort_keys=True).encode()).hexdigest()[:10]
+    return f"rollup_{table.lower()}_{digest}"
+
+
+def _dimension_sql(dimension: dict) -> str:
+    if dimension["unit"]:
+        return f"DATE_TRUNC('{dimension['unit']}', \"{dimension['column']}\")"
+    return f"\"{dimension['column']}\""
+
+
+def _measure_sql(measure: str) -> str:
+    if measure == "count_all":
+        return 'COUNT(*) AS "count_all"'
+    function, column = measure.split("_", 1)
+    return f'{function.upper()}("{column}") AS "{measure}"'
+
+
+def build_rollup_sql(rollup: dict) -> str:
+    """
+    Builds the CREATE MATERIALIZED VIEW statement of a rollup.
+    """
+    dimensions = [f'{_dimension_sql(dimension)} AS "{dimension["name"]}"' for dimension in rollup["dimensions"]]
+    measures = [_measure_sql(measure) for measure in rollup["measures"]]
+    group_by = ", ".join(_dimension_sql(dimension) for dimension in rollup["dimensions"])
+    return (
+        f'CREATE MATERIALIZED VIEW IF NOT EXISTS {ROLLUP_SCHEMA}."{rollup["name"]}" AS '
+        f'SELECT {", ".join(dimensions + measures)} FROM {ROLLUP_SCHEMA}."{rollup["table"]}" GROUP BY {group_by};'
+    )
+
+
+def load_registry() -> dict:
+    """
+    Loads the rollup registry, rollup name -> rollup definition and statistics.
+    """
+    with _registry_lock:
+        if not os.path.exists(ROLLUP_REGISTRY_FILE):
+            return {}
+        with open(ROLLUP_REGISTRY_FILE, "r") as file:
+            return json.load(file)
+
+
+def _save_registry(registry: dict):
+    with _registry_lock:
+        temp_file = ROLLUP_REGISTRY_FILE + ".tmp"
+        with open(temp_file, "w") as file:
+            json.dump(registry, file, indent=4)
+        os.replace(temp_file, ROLLUP_REGISTRY_FILE)
+
+
+def _update_registry(update) -> dict:
+    """
+    Loads the registry, applies update(registry) and saves it under one lock, so concurrent updates are not lost.
+    update must be quick: no database work while the lock is held.
+    :return: dict: The updated registry.
+    """
+    with _registry_lock:
+        registry = load_registry()
+        update(registry)
+        _save_registry(registry)
+        return registry
+
+
+def _table_changes(cursor, table: str):
+    """
+    Returns how many rows of the table were inserted, updated or deleted since the statistics were last reset,
+    or None if Postgres has no statistics for it.
+    """
+    cursor.execute("SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables WHERE schemaname = %s AND relname = %s;",
+                   (ROLLUP_SCHEMA, table))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _refresh_view(rollup: dict, sql: str) -> float:
+    """
+    Creates or refreshes the view of a rollup, recording the change count of its base table from just before,
+    so rollup_is_fresh can tell if the table changed afterwards.
+    :return: float: Time taken in milliseconds.
+    """
+    import psycopg
+
+    with psycopg.connect(_db_url()) as conn:
+        with conn.cursor() as cursor:
+            base_changes = _table_changes(cursor, rollup["table"])
+    took_ms = _run_statement(sql)
+    rollup["base_changes"] = base_changes
+    rollup["last_refreshed"] = time.time()
+    return took_ms
+
+
+def rollup_is_fresh(cursor, rollup: dict) -> bool:
+    """
+    True if the base table of the rollup had no insert, update or delete since the rollup was last refreshed.
+    Postgres reports table statistics shortly after a transaction ends (normally within a second), and TRUNCATE
+    is not counted, so this catches the usual writes rather than every possible one.
+    :param cursor: A cursor of the connection the query will run on.
+    """
+    if rollup.get("base_changes") is None:
+        return False
+    try:
+        return _table_changes(cursor, rollup["table"]) == rollup["base_changes"]
+    except Exception as e:
+        print(f"Could not check if rollup {rollup['name']} is fresh: {e}")
+        return False
+
+
+def build_rollups(min_occurrences: int = ROLLUP_MIN_OCCURRENCES) -> dict:
+    """
+    Mines the recurring patterns and creates a materialized view for every new one.
+    For each new rollup, the original aggregate query and the rollup query are timed once to measure the saving.
+    :return: dict: The updated registry.
+    """
+    # The views are built from a snapshot, and merged into the registry as it is at the end: the hits recorded
+    # meanwhile are kept.
+    snapshot = load_registry()
+    occurrences, created = {}, {}
+    for pattern in mine_patterns(min_occurrences):
+        name = _rollup_name(pattern["table"], pattern["dimensions"])
+        existing = snapshot.get(name)
+        if existing and set(pattern["measures"]) <= set(existing["measures"]):
+            occurrences[name] = pattern["occurrences"]
+            continue
+
+        rollup = {"name": name, **pattern, "created_at": time.time(), "last_refreshed": None, "hits": 0,
+                  "saved_ms": 0.0}
+        try:
+            if existing:  # New measures are needed, so the view has to be re-created.
+                _run_statement(f'DROP MATERIALIZED VIEW IF EXISTS {ROLLUP_SCHEMA}."{name}";')
+            _refresh_view(rollup, build_rollup_sql(rollup))
+
+            group_by = ", ".join(_dimension_sql(dimension) for dimension in rollup["dimensions"])
+            rollup["base_query_ms"] = _run_statement(
+                f'SELECT {group_by}, COUNT(*) FROM {ROLLUP_SCHEMA}."{rollup["table"]}" GROUP BY {group_by};')
+            rollup["rollup_query_ms"] = _run_statement(f'SELECT * FROM {ROLLUP_SCHEMA}."{name}";')
+            print(f"Created rollup {name} for {rollup['table']} by {[d['name'] for d in rollup['dimensions']]}: "
+                  f"{rollup['base_query_ms']:.1f} ms -> {rollup['rollup_query_ms']:.1f} ms")
+            created[name] = rollup
+        except Exception as e:
+            print(f"Error creating rollup {name}: {e}")
+
+    def merge(registry: dict):
+        for name, count in occurrences.items():
+            if name in registry:
+                registry[name]["occurrences"] = count
+        for name, rollup in created.items():
+            if name in registry:
+                rollup["hits"], rollup["saved_ms"] = registry[name]["hits"], registry[name]["saved_ms"]
+            registry[name] = rollup
+
+    return _update_registry(merge)
+
+
+def refresh_rollups() -> dict:
+    """
+    Refreshes every materialized view in the registry.
+    :return: dict: The updated registry.
+    """
+    refreshed = {}
+    for name, rollup in load_registry().items():
+        try:
+            took_ms = _refresh_view(rollup, f'REFRESH MATERIALIZED VIEW {ROLLUP_SCHEMA}."{name}";')
+            refreshed[name] = {"base_changes": rollup["base_changes"], "last_refreshed": rollup["last_refreshed"]}
+            print(f"Refreshed rollup {name} in {took_ms:.1f} ms")
+        except Exception as e:
+            print(f"Error refreshing rollup {name}: {e}")
+
+    def merge(registry: dict):
+        for name, fields in refreshed.items():
+            if name in registry:
+                registry[name].update(fields)
+
+    return _update_registry(merge)
+
+
+def _refresh_loop(interval_seconds: int):
+    while True:
+        try:
+            build_rollups()
+            refresh_rollups()
+        except Exception as e:
+            print(f"Error in rollup refresh loop: {e}")
+        time.sleep(interval_seconds)
+
+
+def start_refresh_scheduler(interval_seconds: int = ROLLUP_REFRESH_SECONDS):
+    """
+    Starts a daemon thread which mines new patterns and refreshes the rollups right away and then every
+    interval_seconds. Calling it more than once has no effect.
+    """
+    global _refresh_thread
+    if _refresh_thread is not None or interval_seconds <= 0:
+        return
+    _refresh_thread = threading.Thread(target=_refresh_loop, args=(interval_seconds,), daemon=True)
+    _refresh_thread.start()
+
+
+def _aggregate_replacement(aggregate: dict) -> str:
+    column, function = aggregate["column"], aggregate["function"]
+    if column is None:
+        return 'SUM("count_all")'
+    if function == "SUM":
+        return f'SUM("sum_{column}")'
+    if function == "COUNT":
+        return f'SUM("count_{column}")'
+    if function == "AVG":
+        # Without the cast the division of integer sums is an integer division.
+        return f'(SUM("sum_{column}")::numeric / NULLIF(SUM("count_{column}"), 0))'
+    return f'{function}("{function.lower()}_{column}")'
+
+
+def _dimension_regex(dimension: dict) -> str:
+    column = r'(?:\w+\.)?"?' + re.escape(dimension["column"]) + r'"?'
+    return r"DATE_TRUNC\s*\(\s*'" + re.escape(dimension["unit"]) + r"'\s*,\s*" + column + r"\s*\)"
+
+
+def _where_is_covered(where: str, rollup: dict) -> bool:
+    """
+    The WHERE clause may only filter on plain column dimensions of the rollup.
+    """
+    plain_columns = {dimension["column"] for dimension in rollup["dimensions"] if not dimension["unit"]}
+    without_literals = re.sub(r"'(?:[^']|'')*'", " ", where)
+    for column in re.findall(r'"(\w+)"', without_literals):
+        if column not in plain_columns:
+            return False
+    remaining = re.sub(r'(?:\w+\.)?"\w+"', " ", without_literals)
+    for word in re.findall(r'[A-Za-z_]\w*', remaining):
+        if word.upper() not in _WHERE_KEYWORDS:
+            return False
+    return True
+
+
+def _replace_aggregates(sql: str, select_clause: str) -> str:
+    """
+    Replaces every aggregate of the query by its re-aggregation over the rollup measures.
+    An aggregate that is a whole select item without alias is given the name Postgres gives the original,
+    e.g. COUNT(*) AS "count", so the result columns keep their names.
+    """
+    def replace(match) -> str:
+        return _aggregate_replacement(_parse_aggregate(match))
+
+    items = []
+    for item in _split_list(select_clause):
+        match = _AGGREGATE_PATTERN.fullmatch(item)
+        if match:
+            items.append(f'{replace(match)} AS "{match.group(1).lower()}"')
+        else:
+            items.append(_AGGREGATE_PATTERN.sub(replace, item))
+    select_start = sql.index(select_clause)
+    rest = sql[select_start + len(select_clause):]
+    return sql[:select_start] + ", ".join(items) + _AGGREGATE_PATTERN.sub(replace, rest)
+
+
+def rewrite_with_rollup(sql: str, registry: dict = None) -> tuple:
+    """
+    Rewrites a query to read from a rollup when the result is guaranteed to be the same.
+    :param sql: str: The generated SQL query.
+    :param registry: dict: Optional registry, loaded from disk when not given.
+    :return: tuple: (SQL to execute, name of the rollup used or None)
+    """
+    parsed = parse_aggregate_query(sql)
+    if parsed is None:
+        return sql, None
+    registry = registry if registry is not None else load_registry()
+
+    for name, rollup in registry.items():
+        if rollup["table"] != parsed["table"] or rollup.get("last_refreshed") is None:
+            continue
+        rollup_dimensions = {dimension["name"] for dimension in rollup["dimensions"]}
+        if not {dimension["name"] for dimension in parsed["dimensions"]} <= rollup_dimensions:
+            continue
+        if not set(_measure_columns(parsed["aggregates"])) <= set(rollup["measures"]):
+            continue
+        if "WHERE" in parsed["clauses"] and not _where_is_covered(parsed["clauses"]["WHERE"], rollup):
+            continue
+
+        rewritten = _replace_aggregates(sql, parsed["clauses"]["SELECT"])
+        # Plain column dimensions keep their name in the rollup, only DATE_TRUNC(...) needs to be replaced.
+        for dimension in rollup["dimensions"]:
+            if dimension["unit"]:
+                rewritten = re.sub(_dimension_regex(dimension), f'"{dimension["name"]}"', rewritten, flags=re.IGNORECASE)
+        rewritten = re.sub(r'\bFROM\s+(?:dbo\.)?"?' + re.escape(parsed["table"]) + r'"?',
+                           f'FROM {ROLLUP_SCHEMA}."{name}"', rewritten, count=1, flags=re.IGNORECASE)
+
+        # Every quoted identifier left must exist in the rollup or be an output alias, otherwise do not risk it.
+        aliases = set(re.findall(r'\bAS\s+"?(\w+)"?', rewritten, re.IGNORECASE))
+        known = rollup_dimensions | {dimension["column"] for dimension in rollup["dimensions"] if not dimension["unit"]}
+        known |= set(rollup["measures"]) | aliases | {name}
+        identifiers = set(re.findall(r'"(\w+)"', re.sub(r"'(?:[^']|'')*'", " ", rewritten)))
+        if identifiers <= known:
+            return rewritten, name
+    return sql, None
+
+
+def record_query(sql: str, executed_sql: str, rollup_name: str, duration_ms: float, row_count: int):
+    """
+    Appends an executed query to the query log, which is mined for new rollups.
+    """
+    entry = {"timestamp": time.time(), "sql": sql, "executed_sql": executed_sql, "rollup": rollup_name,
+             "duration_ms": round(duration_ms, 2), "rows": row_count}
+    with _registry_lock:
+        if os.path.exists(QUERY_LOG_FILE) and os.path.getsize(QUERY_LOG_FILE) >= QUERY_LOG_MAX_BYTES:
+            os.replace(QUERY_LOG_FILE, QUERY_LOG_FILE + ".1")
+        with open(QUERY_LOG_FILE, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+
+
+def record_rollup_hit(rollup_name: str, duration_ms: float):
+    """
+    Counts a query served from a rollup and the time it saved, based on the timings measured when it was created.
+    """
+    def count_hit(registry: dict):
+        rollup = registry.get(rollup_name)
+        if rollup is not None:
+            rollup["hits"] += 1
+            rollup["saved_ms"] += max(0.0, rollup.get("base_query_ms", 0.0) - duration_ms)
+
+    _update_registry(count_hit)
@@ -0,0 +1,109 @@
+"""
+In-memory model of database_schema.json.
+
+The schema file is parsed once and kept in memory together with its serialized and gzipped bytes and an ETag.
+Every access does a cheap os.stat, and the file is parsed again only when its modification time or size changed,
+so the API, the embeddings and the schema refresh all read the same copy.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+SCHEMA_FILE = "database_schema.json"
+
+
+class SchemaVersion:
+    """
+    One version of the schema with its serialized forms and ETag. Never modified: a changed file gives a new
+    SchemaVersion, so a response built from one version always has the body and the ETag of that version.
+    """
+
+    def __init__(self, raw: bytes):
+        self.schema = json.loads(raw)
+        self.json_bytes = json.dumps(self.schema).encode("utf-8")
+        self.gzip_bytes = gzip.compress(self.json_bytes)
+        self.etag = '"' + hashlib.sha1(raw).hexdigest() + '"'
+
+    def serialized(self, compressed: bool = False) -> bytes:
+        return self.gzip_bytes if compressed else self.json_bytes
+
+    def select(self, tables: list = None, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Returns a part of the schema.
+        :param tables: list: Only these tables, all tables when not given.
+        :param offset: int: Number of tables to skip, in file order. Must not be negative.
+        :param limit: int: Maximum number of tables to return. Must not be negative.
+        :return: tuple: (dict of the selected tables, total number of tables matching the filter)
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative")
+        names = [name for name in self.schema if tables is None or name in tables]
+        end = None if limit is None else offset + limit
+        return {name: self.schema[name] for name in names[offset:end]}, len(names)
+
+
+class SchemaStore:
+    def __init__(self, path: str = SCHEMA_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_signature = None  # (mtime_ns, size) of the loaded file
+        self._version = None
+
+    def _load_if_changed(self) -> SchemaVersion:
+        stat = os.stat(self.path)  # FileNotFoundError is left to the caller.
+        signature = (stat.st_mtime_ns, stat.st_size)
+        version = self._version
+        if signature == self._file_signature:
+            return version
+        with self._lock:
+            if signature == self._file_signature:
+                return self._version
+            with open(self.path, "rb") as schema_file:
+                version = SchemaVersion(schema_file.read())
+            # One assignment, readers see either the old or the new version as a whole.
+            self._version = version
+            self._file_signature = signature
+            print(f"Loaded schema with {len(version.schema)} tables from {self.path}")
+            return version
+
+    def snapshot(self) -> SchemaVersion:
+        """
+        Returns the current version of the schema. Use one snapshot for everything a response needs from the schema.
+        """
+        return self._load_if_changed()
+
+    def get(self) -> dict:
+        """
+        Returns the schema, table name -> list of column dicts. Do not modify the returned dict.
+        """
+        return self.snapshot().schema
+
+    @property
+    def etag(self) -> str:
+        return self.snapshot().etag
+
+    def reload(self):
+        """
+        Forces the schema to be read again, e.g. right after the schema file was rewritten.
+        """
+        with self._lock:
+            self._file_signature = None
+        self._load_if_changed()
+
+    def serialized(self, compressed: bool = False) -> bytes:
+        """
+        Returns the full schema as JSON bytes, gzipped if compressed is set. Both are cached per version.
+        """
+        return self.snapshot().serialized(compressed)
+
+    def select(self, tables: list = None, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Returns a part of the schema, see SchemaVersion.select.
+        """
+        return self.snapshot().select(tables, offset, limit)
+
+
+schema_store = SchemaStore()
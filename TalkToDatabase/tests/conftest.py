@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The TalkToDatabase modules import each other as TalkToDatabase.<module>, so the repository root must be importable.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from TalkToDatabase import token_budget
+from TalkToDatabase.batch import run_question
+from TalkToDatabase.main import _charge_model_turns
+from TalkToDatabase.token_budget import TokenBudget
+
+TOKENS_PER_TURN = 400
+
+
+class FakeModel:
+    """Answers every turn with the same usage, like Gemini responses carry usage_metadata."""
+
+    def __init__(self):
+        self.turns = 0
+
+    def invoke(self, *args, **kwargs):
+        self.turns += 1
+        return SimpleNamespace(usage_metadata=SimpleNamespace(total_token_count=TOKENS_PER_TURN))
+
+    async def ainvoke(self, *args, **kwargs):
+        return self.invoke()
+
+    def invoke_stream(self, *args, **kwargs):
+        yield self.invoke()
+
+    async def ainvoke_stream(self, *args, **kwargs):
+        yield self.invoke()
+
+
+class FakeTeam:
+    """Runs model turns until one fails and handles the error inside the run, as agno does."""
+
+    def __init__(self):
+        self.team_session_state = {}
+        self.model = _charge_model_turns(FakeModel(), "coordinator", lambda: self.team_session_state.get("token_budget"))
+
+    def run(self, message):
+        for _ in range(10):
+            try:
+                self.model.invoke(message)
+            except Exception as e:
+                return SimpleNamespace(content=f"Stopped: {e}", metrics={})
+        return SimpleNamespace(content="Answer", metrics={})
+
+
+@pytest.fixture(autouse=True)
+def tenant_usage_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_budget, "TENANT_USAGE_DB", str(tmp_path / "tenant_usage.db"))
+    monkeypatch.setattr(token_budget, "_connections", threading.local())
+
+
+def test_budget_running_out_mid_run_is_reported():
+    team = FakeTeam()
+    budget = TokenBudget(request_limit=1000)
+    result = run_question(team, "How many employees do we have?", asyncio.Queue(), budget)
+
+    # Three turns fit in 1000 tokens (the third one goes over), the fourth is refused.
+    assert team.model.turns == 3
+    assert result["status"] == "budget_exceeded"
+    assert result["explanation"].startswith("Token budget exceeded before 'coordinator'")
+    assert result["token_budget"]["used"] == 3 * TOKENS_PER_TURN
+
+
+def test_run_within_budget_is_completed():
+    team = FakeTeam()
+    result = run_question(team, "How many employees do we have?", asyncio.Queue(), TokenBudget(request_limit=10 ** 6))
+    assert team.model.turns == 10
+    assert result["status"] == "completed"
+    assert result["insights"] == "Answer"
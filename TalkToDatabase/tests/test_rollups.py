@@ -0,0 +1,35 @@
+import pytest
+
+from TalkToDatabase.rollups import rewrite_with_rollup
+
+ROLLUP = "Employees__DepartmentID"
+
+
+@pytest.fixture
+def registry():
+    return {ROLLUP: {
+        "name": ROLLUP,
+        "table": "Employees",
+        "dimensions": [{"name": "DepartmentID", "column": "DepartmentID", "unit": None}],
+        "measures": ["count_all", "sum_Salary", "count_Salary"],
+        "last_refreshed": 1.0,
+    }}
+
+
+def test_avg_is_not_an_integer_division(registry):
+    sql, rollup = rewrite_with_rollup(
+        'SELECT "DepartmentID", AVG("Salary") AS avg_salary FROM dbo."Employees" GROUP BY "DepartmentID"', registry)
+    assert rollup == ROLLUP
+    assert 'SUM("sum_Salary")::numeric / NULLIF(SUM("count_Salary"), 0)' in sql
+    assert 'AS avg_salary' in sql
+
+
+def test_unaliased_aggregates_keep_their_postgres_names(registry):
+    sql, rollup = rewrite_with_rollup(
+        'SELECT "DepartmentID", COUNT(*), AVG("Salary"), SUM("Salary") AS total FROM dbo."Employees" '
+        'GROUP BY "DepartmentID" ORDER BY COUNT(*) DESC', registry)
+    assert rollup == ROLLUP
+    assert sql == ('SELECT "DepartmentID", SUM("count_all") AS "count", '
+                   '(SUM("sum_Salary")::numeric / NULLIF(SUM("count_Salary"), 0)) AS "avg", '
+                   'SUM("sum_Salary") AS total FROM dbo."Employees__DepartmentID" '
+                   'GROUP BY "DepartmentID" ORDER BY SUM("count_all") DESC')
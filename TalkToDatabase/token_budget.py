@@ -0,0 +1,146 @@
+"""
+Token budget controller for the SmartDB team.
+
+Every /query_db request gets a TokenBudget. The tools in helper.py record the tokens reported by
+Gemini (usage_metadata.total_token_count) and Groq (usage.total_tokens) against it as soon as each call returns,
+and ask it which model / thinking budget to use for the next call. The coordinator and member models record every
+turn the same way (main._charge_model_turns) and refuse the next turn once the budget is spent. As the request budget drains we move from
+gemini-2.5-pro with dynamic thinking, to a capped thinking budget, to gemini-2.5-flash without thinking,
+and finally refuse to make more LLM calls at all.
+
+The same tokens are also charged to the tenant, so one tenant can not burn through the daily quota with many requests.
+The tenant usage is kept in a SQLite file (TENANT_USAGE_DB), so it survives restarts and is shared by all the
+workers of the server on the same host.
+
+The tenant is whatever the caller sends as tenant_id, the API does not authenticate it: anyone who can reach the API
+can spend another tenant's quota. Put the server behind a gateway that sets tenant_id from the authenticated caller.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+REQUEST_TOKEN_BUDGET = int(os.getenv("REQUEST_TOKEN_BUDGET", "60000"))
+TENANT_TOKEN_BUDGET = int(os.getenv("TENANT_TOKEN_BUDGET", "1000000"))
+DEFAULT_TENANT = "default"
+TENANT_USAGE_DB = os.getenv("TENANT_USAGE_DB", "tenant_usage.db")
+
+# (fraction of request budget still left, model, thinking budget). First matching row wins.
+# -1 is Gemini's dynamic thinking. gemini-2.5-pro can not switch thinking off (its minimum is 128 tokens), so the
+# capped step uses 2048 and the last step switches to gemini-2.5-flash with thinking off (0).
+DEGRADATION_STEPS = [
+    (0.50, "gemini-2.5-pro", -1),
+    (0.25, "gemini-2.5-pro", 2048),
+    (0.00, "gemini-2.5-flash", 0),
+]
+
+_connections = threading.local()  # One SQLite connection per thread.
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+def _tenant_db() -> sqlite3.Connection:
+    connection = getattr(_connections, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(TENANT_USAGE_DB, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS tenant_usage "
+                           "(tenant_id TEXT NOT NULL, day TEXT NOT NULL, tokens INTEGER NOT NULL, PRIMARY KEY (tenant_id, day))")
+        # Only today counts, older days are dropped.
+        connection.execute("DELETE FROM tenant_usage WHERE day < ?", (time.strftime('%Y%m%d'),))
+        connection.commit()
+        _connections.connection = connection
+    return connection
+
+
+def get_tenant_usage(tenant_id: str = DEFAULT_TENANT) -> int:
+    """
+    Returns the tokens spent today by the tenant.
+    :param tenant_id: str: The tenant to look up.
+    :return: int: Tokens spent today.
+    """
+    row = _tenant_db().execute("SELECT tokens FROM tenant_usage WHERE tenant_id = ? AND day = ?",
+                               (tenant_id, time.strftime('%Y%m%d'))).fetchone()
+    return row[0] if row else 0
+
+
+def _charge_tenant(tenant_id: str, tokens: int):
+    # A single statement, so concurrent charges from other threads and workers add up.
+    connection = _tenant_db()
+    connection.execute("INSERT INTO tenant_usage (tenant_id, day, tokens) VALUES (?, ?, ?) "
+                       "ON CONFLICT (tenant_id, day) DO UPDATE SET tokens = tokens + excluded.tokens",
+                       (tenant_id, time.strftime('%Y%m%d'), tokens))
+    connection.commit()
+
+
+class TokenBudget:
+    def __init__(self, tenant_id: str = DEFAULT_TENANT, request_limit: int = None, tenant_limit: int = None):
+        self.tenant_id = tenant_id
+        self.request_limit = request_limit if request_limit is not None else REQUEST_TOKEN_BUDGET
+        self.tenant_limit = tenant_limit if tenant_limit is not None else TENANT_TOKEN_BUDGET
+        self.used = 0
+        self.stage_usage = {}  # stage name -> tokens, e.g. {"generate_sql": 5400, "debug_sql": 3100}
+        # Message of the first refused call. agno catches the errors of model turns and tools inside a run, so
+        # this tells the caller that the run was cut short even when BudgetExceededError did not reach it.
+        self.refusal = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> int:
+        """
+        Tokens left for this request, also limited by what is left of the tenant's daily quota.
+        """
+        with self._lock:
+            request_left = self.request_limit - self.used
+        tenant_left = self.tenant_limit - get_tenant_usage(self.tenant_id)
+        return max(0, min(request_left, tenant_left))
+
+    def is_exhausted(self) -> bool:
+        return self.remaining() <= 0
+
+    def record(self, stage: str, tokens) -> int:
+        """
+        Records the tokens spent by one LLM call.
+        :param stage: str: Name of the stage which made the call.
+        :param tokens: int: Tokens reported by the provider. None is treated as 0.
+        :return: int: Tokens left after recording.
+        """
+        tokens = int(tokens or 0)
+        with self._lock:
+            self.used += tokens
+            self.stage_usage[stage] = self.stage_usage.get(stage, 0) + tokens
+        _charge_tenant(self.tenant_id, tokens)
+        return self.remaining()
+
+    def check(self, stage: str):
+        """
+        Raises BudgetExceededError if there is nothing left to spend on the given stage.
+        """
+        if self.is_exhausted():
+            message = (f"Token budget exceeded before '{stage}': used {self.used} of {self.request_limit} tokens for this request "
+                       f"({get_tenant_usage(self.tenant_id)} of {self.tenant_limit} today for tenant '{self.tenant_id}').")
+            with self._lock:
+                self.refusal = self.refusal or message
+            raise BudgetExceededError(message)
+
+    def choose_gemini_config(self) -> tuple:
+        """
+        Picks the Gemini model and thinking budget based on how much of the request budget is left.
+        :return: tuple: (model name, thinking budget)
+        """
+        left_fraction = self.remaining() / self.request_limit if self.request_limit else 0
+        for min_fraction, model, thinking_budget in DEGRADATION_STEPS:
+            if left_fraction > min_fraction:
+                return model, thinking_budget
+        return DEGRADATION_STEPS[-1][1], DEGRADATION_STEPS[-1][2]
+
+    def report(self) -> dict:
+        return {
+            "tenant_id": self.tenant_id,
+            "request_limit": self.request_limit,
+            "used": self.used,
+            "remaining": self.remaining(),
+            "stages": dict(self.stage_usage),
+        }
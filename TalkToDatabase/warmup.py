@@ -0,0 +1,93 @@
+"""
+Background warm-up of the heavy parts of the API server.
+
+The agents pull in pandas, chromadb, psycopg, google-genai, groq and agno, which takes seconds to import. The API
+server does not import them at module level, so a worker binds and answers /health right away, and this module
+loads them in a daemon thread after startup. /ready reports when they are loaded. A query that arrives earlier
+does not fail, it imports what it needs itself and waits for an import in progress. A failed warm-up is tried again
+with a growing delay, so /ready recovers once the cause (e.g. a missing API key in a mounted secret) is gone.
+
+Usage:
+    python -m TalkToDatabase.warmup    # warms up in the foreground and prints the time of every step
+"""
+
+import os
+import threading
+import time
+import traceback
+
+# Seconds before a failed warm-up is tried again, doubled after every failure up to WARMUP_MAX_RETRY_SECONDS.
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_MAX_RETRY_SECONDS = 300
+
+# status: "pending" (not started), "warming", "ready" or "failed"
+_state = {"status": "pending", "steps": {}, "error": None}
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def _import_helper():
+    import TalkToDatabase.helper
+
+
+def _build_team():
+    # Every question gets its own team, building one here imports agno and the Gemini client ahead of the first.
+    from TalkToDatabase.main import build_smart_db_team
+    build_smart_db_team()
+
+
+# (name, function), run in this order. The seconds each one took are reported by /ready.
+WARMUP_STEPS = [
+    ("helper", _import_helper),  # pandas, chromadb, psycopg, google-genai, groq
+    ("smart_db_team", _build_team),  # agno and the Gemini models of the SmartDB teams
+]
+
+
+def warm_up() -> dict:
+    """
+    Runs the warm-up steps in the calling thread.
+    :return: dict: The readiness state, see get_readiness.
+    """
+    _state.update(status="warming", error=None)
+    try:
+        for name, step in WARMUP_STEPS:
+            start = time.perf_counter()
+            step()
+            _state["steps"][name] = round(time.perf_counter() - start, 3)
+        _state["status"] = "ready"
+    except Exception as e:
+        traceback.print_exc()
+        _state.update(status="failed", error=str(e))
+    return get_readiness()
+
+
+def _warm_up_until_ready():
+    delay = WARMUP_RETRY_SECONDS
+    while warm_up()["status"] != "ready":
+        print(f"Warm-up failed, trying again in {delay:g}s")
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_MAX_RETRY_SECONDS)
+
+
+def start_warmup():
+    """
+    Starts the warm-up in a daemon thread, which tries again until it succeeds. Calling it more than once has no effect.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return
+        _state["status"] = "warming"
+        _warmup_thread = threading.Thread(target=_warm_up_until_ready, daemon=True)
+        _warmup_thread.start()
+
+
+def get_readiness() -> dict:
+    """
+    Returns {"status", "steps": {name: seconds}, "error"} of the warm-up.
+    """
+    return {"status": _state["status"], "steps": dict(_state["steps"]), "error": _state["error"]}
+
+
+if __name__ == "__main__":
+    print(warm_up())
@@ -0,0 +1,205 @@
+"""
+Record / replay cache for model calls of the agno and smolagents experiments, so iterating on instructions does not
+call Gemini or Ollama again for every unchanged step, and runs work offline once recorded.
+
+    from model_cache import cached
+    model = cached(Gemini(id="gemini-2.0-flash"))       # agno Agent / Team model
+    model = cached(LiteLLMModel(model_id="ollama/gemma3"))  # smolagents CodeAgent model
+
+The provider call of the model (agno: invoke / ainvoke and their stream variants, smolagents: generate /
+generate_stream) is looked up by a hash of the model id, messages, tools and parameters. MODEL_CACHE_MODE selects:
+- auto (default): replay recorded responses, call the model and record on a miss
+- record: always call the model and record (refresh)
+- replay: only replay, a miss raises CacheMiss instead of calling the model
+- off: always call the model, nothing is read or written
+Responses are pickled in MODEL_CACHE_DIR (default .model_cache next to this file).
+Replays are deterministic as long as the tools are: a tool result that changes (the current time, a web search)
+changes the next messages, and so the next key.
+"""
+
+import dataclasses
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".model_cache"))
+DEFAULT_MODE = os.getenv("MODEL_CACHE_MODE", "auto")
+MODES = ("auto", "record", "replay", "off")
+
+AGNO_METHODS = ("invoke", "ainvoke", "invoke_stream", "ainvoke_stream")
+SMOLAGENTS_METHODS = ("generate", "generate_stream")
+# Model settings that change the answer, read from the model object on every call.
+PARAMETER_FIELDS = ("temperature", "top_p", "top_k", "max_tokens", "max_output_tokens", "max_completion_tokens", "seed",
+                    "stop", "frequency_penalty", "presence_penalty", "generation_config", "request_params", "kwargs")
+# Fields that change on every run without changing the request: message and tool call ids, timestamps, metrics.
+VOLATILE_FIELDS = {"id", "created_at", "timestamp", "metrics", "token_usage", "timing", "raw", "run_id", "session_id",
+                   "agent_id", "team_id", "parent_run_id", "user_id"}
+# Arguments that are bookkeeping of the framework, not part of the request (agno passes the run it belongs to).
+IGNORED_ARGUMENTS = {"run_response"}
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode for a call that was never recorded."""
+
+
+def _normalize(value):
+    """Turns the arguments of a model call into plain JSON data, without the fields that differ between runs."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items() if key not in VOLATILE_FIELDS}
+    if isinstance(value, (list, tuple, set)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    if isinstance(value, type):
+        # e.g. a pydantic response_format
+        return f"{value.__module__}.{value.__qualname__}"
+    for method in ("to_dict", "model_dump", "dict"):
+        # agno Message / Function, pydantic models, smolagents ChatMessage
+        if callable(getattr(value, method, None)):
+            try:
+                return _normalize(getattr(value, method)())
+            except TypeError:
+                pass
+    if dataclasses.is_dataclass(value):
+        return _normalize(dataclasses.asdict(value))
+    if callable(value):
+        return getattr(value, "__qualname__", repr(value))
+    if hasattr(value, "__dict__"):
+        return _normalize({key: item for key, item in vars(value).items() if not key.startswith("_")})
+    return repr(value)
+
+
+class ResponseCache:
+    """Pickled responses on disk, one file per key."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model_id: str, method: str, parameters: dict, args: tuple, kwargs: dict) -> str:
+        request = {"model": model_id, "method": method, "parameters": _normalize(parameters), "args": _normalize(args),
+                   "kwargs": _normalize(kwargs)}
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def get(self, key: str) -> tuple:
+        """Returns (True, response) or (False, None)."""
+        try:
+            with open(self._path(key), "rb") as cache_file:
+                response = pickle.load(cache_file)
+        except Exception:
+            # Unreadable files and responses pickled from classes that changed since
+            # (AttributeError, ImportError, ...) are re-recorded like any other miss.
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, response
+
+    def put(self, key: str, response):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as cache_file:
+            pickle.dump(response, cache_file)
+        os.replace(temporary_path, path)
+
+    def stats(self) -> str:
+        return f"Model cache: {self.hits} replayed, {self.misses} called"
+
+
+_default_cache = None
+
+
+def _get_default_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+def _wrap(model, name: str, model_id: str, cache: ResponseCache, mode: str):
+    original = getattr(model, name)
+
+    def lookup(args, kwargs):
+        parameters = {field: getattr(model, field) for field in PARAMETER_FIELDS if getattr(model, field, None) is not None}
+        request_kwargs = {key: value for key, value in kwargs.items() if key not in IGNORED_ARGUMENTS}
+        key = cache.key(model_id, name, parameters, args, request_kwargs)
+        found, response = (False, None) if mode == "record" else cache.get(key)
+        if not found and mode == "replay":
+            raise CacheMiss(f"No recorded response for this {name} call of {model_id}, "
+                            f"run once with MODEL_CACHE_MODE=auto or record")
+        return key, found, response
+
+    if inspect.isasyncgenfunction(original):
+        @functools.wraps(original)
+        async def wrapper(*args, **kwargs):
+            key, found, chunks = lookup(args, kwargs)
+            if not found:
+                chunks = []
+                async for chunk in original(*args, **kwargs):
+                    chunks.append(chunk)
+                    yield chunk
+                cache.put(key, chunks)
+                return
+            for chunk in chunks:
+                yield chunk
+    elif inspect.iscoroutinefunction(original):
+        @functools.wraps(original)
+        async def wrapper(*args, **kwargs):
+            key, found, response = lookup(args, kwargs)
+            if not found:
+                response = await original(*args, **kwargs)
+                cache.put(key, response)
+            return response
+    elif inspect.isgeneratorfunction(original):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            key, found, chunks = lookup(args, kwargs)
+            if not found:
+                chunks = []
+                for chunk in original(*args, **kwargs):
+                    chunks.append(chunk)
+                    yield chunk
+                cache.put(key, chunks)
+                return
+            yield from chunks
+    else:
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            key, found, response = lookup(args, kwargs)
+            if not found:
+                response = original(*args, **kwargs)
+                cache.put(key, response)
+            return response
+
+    # Set on the instance, so other instances of the model class are not affected.
+    object.__setattr__(model, name, wrapper)
+
+
+def cached(model, mode: Optional[str] = None, cache: Optional[ResponseCache] = None):
+    """
+    Routes the provider calls of an agno or smolagents model through the response cache. Returns the same model.
+    :param mode: auto, record, replay or off, MODEL_CACHE_MODE by default.
+    :param cache: Where responses are stored, a ResponseCache in MODEL_CACHE_DIR by default.
+    """
+    mode = mode or DEFAULT_MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown model cache mode {mode!r}, use one of {', '.join(MODES)}")
+    if mode == "off":
+        return model
+    cache = cache or _get_default_cache()
+    methods = AGNO_METHODS if hasattr(model, "invoke") else SMOLAGENTS_METHODS
+    model_id = f"{type(model).__name__}:{getattr(model, 'id', None) or getattr(model, 'model_id', None)}"
+    for name in methods:
+        if callable(getattr(model, name, None)):
+            _wrap(model, name, model_id, cache, mode)
+    return model